@@ -0,0 +1,16 @@
+import pytest
+
+from valedger import Ledger, load_journal
+from valedger.synthetic import Profile, write_journal
+
+
+@pytest.fixture(scope="session")
+def synthetic_path(tmp_path_factory):
+    """A synthetic journal of a few thousand postings over three years."""
+    return write_journal(tmp_path_factory.mktemp("synthetic") / "main.journal", Profile(postings=3_000, years=3))
+
+
+@pytest.fixture
+def synthetic(synthetic_path) -> Ledger:
+    """A fresh ledger of the synthetic journal, free to modify."""
+    return load_journal(synthetic_path, workers=1)
@@ -0,0 +1,59 @@
+import pytest
+
+from valedger import AccountTree
+
+
+def test_intern_adds_ancestors():
+    tree = AccountTree()
+    tree.intern("Expenses:Food:Groceries")
+    assert list(tree) == ["Expenses", "Expenses:Food", "Expenses:Food:Groceries"]
+    assert tree.is_ordered
+
+
+def test_renumber_gives_subtree_ranges():
+    tree = AccountTree()
+    for name in ("Expenses:Rent", "Assets:Bank", "Expenses:Food:Groceries", "Expenses:Food", "Assets:Cash"):
+        tree.intern(name)
+    assert not tree.is_ordered
+    with pytest.raises(ValueError):
+        tree.subtree("Expenses")
+    mapping = tree.renumber()
+    assert mapping is not None
+    assert list(tree) == [
+        "Assets",
+        "Assets:Bank",
+        "Assets:Cash",
+        "Expenses",
+        "Expenses:Food",
+        "Expenses:Food:Groceries",
+        "Expenses:Rent",
+    ]
+    assert mapping[0] == tree.id("Expenses")
+    assert tree.subtree("Expenses") == range(3, 7)
+    assert tree.subtree("Expenses:Food") == range(4, 6)
+    assert tree.subtree("Assets:Cash") == range(2, 3)
+    assert tree.subtree("Unknown") == range(0)
+    assert tree.renumber() is None
+
+
+def test_navigation():
+    tree = AccountTree(["Assets", "Assets:Bank", "Assets:Bank:Checking", "Income"])
+    assert tree.children() == [0, 3]
+    assert tree.children(0) == [1]
+    assert tree.parent(2) == 1 and tree.parent(0) is None
+    assert tree.depth(2) == 2
+    assert tree.ancestor_at(1).tolist() == [0, 1, 1, 3]
+
+
+def test_empty_tree():
+    tree = AccountTree()
+    assert tree.is_ordered
+    assert tree.renumber() is None
+    assert tree.children() == []
+
+
+def test_unpacked_tree_checks_its_order():
+    tree = AccountTree(["Assets", "Assets:Bank"])
+    assert AccountTree.unpack(tree.pack(), 2).is_ordered
+    shuffled = AccountTree(["Income", "Assets"])
+    assert not AccountTree.unpack(shuffled.pack(), 2).is_ordered
@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+from valedger import Ledger, Money, aggregate
+from valedger.aggregate import next_period, numpy, period_start, period_starts
+
+BACKENDS = ["array", "numpy"] if numpy is not None else ["array"]
+
+
+def brute(ledger: Ledger, bounds: list[int], accounts: range, owner, start=None, end=None) -> dict:
+    start = bounds[0] if start is None else start.toordinal()
+    end = bounds[-1] if end is None else end.toordinal()
+    columns = ledger.postings.columns
+    totals: dict[tuple[int, int, int], int] = {}
+    rows = zip(columns["date"], columns["account"], columns["commodity"], columns["amount"])
+    for day, account, commodity, amount in rows:
+        if account not in accounts or not start <= day < end:
+            continue
+        column = max(index for index, bound in enumerate(bounds[:-1]) if bound <= day)
+        key = (owner(account), commodity, column)
+        totals[key] = totals.get(key, 0) + amount
+    return {key: value for key, value in totals.items() if value}
+
+
+def cells(matrix) -> dict[tuple[int, int, int], int]:
+    return {
+        (account, commodity, column): value
+        for account in matrix.accounts
+        for commodity in matrix.commodities
+        for column, value in enumerate(matrix.row(account, commodity))
+        if value
+    }
+
+
+def test_periods():
+    day = date(2024, 5, 15)
+    assert period_start(day, "week") == date(2024, 5, 13).toordinal()
+    assert period_start(day, "quarter") == date(2024, 4, 1).toordinal()
+    assert next_period(date(2024, 12, 1).toordinal(), "month") == date(2025, 1, 1).toordinal()
+    assert period_starts(date(2024, 1, 10), date(2024, 3, 1), "month") == [
+        date(2024, 1, 1).toordinal(),
+        date(2024, 2, 1).toordinal(),
+        date(2024, 3, 1).toordinal(),
+    ]
+    with pytest.raises(ValueError):
+        period_start(day, "fortnight")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("period", ["week", "month", "quarter", "year"])
+def test_matches_a_scan(synthetic, backend, period):
+    ledger = synthetic
+    start, end = date(2015, 3, 10), date(2016, 8, 1)
+    matrix = aggregate(ledger, period, start, end, backend=backend)
+    everything = range(len(ledger.accounts))
+    assert cells(matrix) == brute(ledger, matrix.bounds, everything, lambda account: account, start, end)
+    lo, hi = ledger.rows_between(start, end)
+    assert matrix.commodities == sorted(set(ledger.postings.columns["commodity"][lo:hi]))
+    assert all(type(commodity) is int for commodity in matrix.commodities)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_depth_and_scope(synthetic, backend):
+    ledger = synthetic
+    expenses = ledger.account_range("Expenses")
+    matrix = aggregate(ledger, "year", accounts=expenses, depth=1, backend=backend)
+    parents = ledger.accounts.ancestor_at(1)
+    assert cells(matrix) == brute(ledger, matrix.bounds, expenses, parents.__getitem__)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_rollup_adds_subtrees(synthetic, backend):
+    ledger = synthetic
+    matrix = aggregate(ledger, "year", backend=backend).rollup(ledger)
+    root = ledger.accounts.id("Expenses")
+    eur = ledger.commodities.id("EUR")
+    expected = brute(ledger, matrix.bounds, ledger.account_range("Expenses"), lambda account: root)
+    assert matrix.row(root, eur) == [expected.get((root, eur, column), 0) for column in range(matrix.width)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_empty_ranges(backend):
+    assert aggregate(Ledger(), backend=backend).shape == (0, 0, 0)
+    ledger = Ledger()
+    ledger.add_transaction(date(2024, 3, 1), "", [("Assets", Money(1, "EUR")), ("Equity", Money(-1, "EUR"))])
+    matrix = aggregate(ledger, end=date(2024, 1, 1), backend=backend)
+    assert matrix.width == 0 and matrix.columns() == []
+    matrix = aggregate(ledger, start=date(2025, 1, 1), backend=backend)
+    assert matrix.width == 0
+    matrix = aggregate(ledger, start=date(2024, 1, 1), end=date(2024, 3, 1), backend=backend)
+    assert matrix.width == 2 and cells(matrix) == {}
@@ -0,0 +1,93 @@
+from datetime import date
+
+from valedger import BalanceIndex, Ledger, Money
+
+
+def post(ledger: Ledger, day: date, account: str, amount: str, commodity: str = "EUR") -> None:
+    money = Money.parse(amount, commodity)
+    ledger.add_transaction(day, "", [(account, money), ("Equity", -money)])
+
+
+def brute(ledger: Ledger, accounts: range, day: int) -> dict[int, int]:
+    columns = ledger.postings.columns
+    result: dict[int, int] = {}
+    rows = zip(columns["date"], columns["account"], columns["commodity"], columns["amount"])
+    for when, account, commodity, amount in rows:
+        if when <= day and account in accounts:
+            result[commodity] = result.get(commodity, 0) + amount
+    return {commodity: value for commodity, value in result.items() if value}
+
+
+def test_balances_match_a_scan():
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 1), "Assets:Bank", "100.00")
+    post(ledger, date(2024, 1, 1), "Assets:Cash", "20")
+    post(ledger, date(2024, 1, 3), "Assets:Bank", "-30.50")
+    post(ledger, date(2024, 1, 5), "Assets:Bank", "2", "USD")
+    ledger.order_accounts()
+    index = BalanceIndex(ledger)
+    assets = ledger.account_range("Assets")
+    for day in range(date(2023, 12, 31).toordinal(), date(2024, 1, 7).toordinal()):
+        assert index.balances(assets, day) == brute(ledger, assets, day)
+    bank = ledger.accounts.id("Assets:Bank")
+    assert index.balance(bank, ledger.commodities.id("EUR"), date(2024, 1, 4)) == 6950
+    assert index.change(assets, date(2024, 1, 2), date(2024, 1, 6)) == {0: -3050, 1: 2}
+
+
+def test_empty_ledger():
+    index = BalanceIndex(Ledger())
+    assert len(index) == 0
+    assert index.balances(range(0, 10), date(2024, 1, 1)) == {}
+    assert index.balance(0, 0, date(2024, 1, 1)) == 0
+
+
+def test_update_appends():
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 1), "Assets:Bank", "1.00")
+    index = BalanceIndex(ledger)
+    post(ledger, date(2024, 1, 2), "Assets:Bank", "2.00")
+    index.update(ledger)
+    bank = ledger.accounts.id("Assets:Bank")
+    assert index.rows == 4
+    assert index.balance(bank, 0, date(2024, 1, 2)) == 300
+
+
+def test_update_after_back_dated_insert_matches_fresh_build():
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 1), "Assets:Bank", "1.00")
+    post(ledger, date(2024, 1, 3), "Assets:Bank", "2.00")
+    index = BalanceIndex(ledger)
+    post(ledger, date(2024, 1, 2), "Assets:Bank", "4.00")
+    ledger.sort()
+    index.update(ledger)
+    bank = ledger.accounts.id("Assets:Bank")
+    assert index.balance(bank, 0, date(2024, 1, 3)) == 700
+    fresh = BalanceIndex(ledger)
+    for day in range(date(2024, 1, 1).toordinal(), date(2024, 1, 4).toordinal()):
+        assert index.balances(range(len(ledger.accounts)), day) == fresh.balances(range(len(ledger.accounts)), day)
+
+
+def test_update_after_renumbering():
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 1), "Expenses:Rent", "500")
+    index = BalanceIndex(ledger)
+    post(ledger, date(2024, 1, 2), "Assets:Bank", "-500")
+    ledger.order_accounts()
+    index.update(ledger)
+    rent = ledger.accounts.id("Expenses:Rent")
+    assert index.balance(rent, 0, date(2024, 1, 2)) == 500
+    assert index.balances(ledger.account_range("Assets"), date(2024, 1, 2)) == {0: -500}
+
+
+def test_update_adds_a_commodity_to_an_existing_account():
+    ledger = Ledger()
+    ledger.add_transaction(date(2024, 1, 1), "", [("A", Money(5, "EUR")), ("C", Money(-5, "EUR"))])
+    index = BalanceIndex(ledger)
+    ledger.add_transaction(date(2024, 1, 2), "", [("D", Money(5, "EUR")), ("A", Money(-5, "USD"))])
+    index.update(ledger)
+    assert index._keys == sorted(index._keys)
+    a = ledger.accounts.id("A")
+    assert index.balances(a, date(2024, 1, 2)) == {0: 5, 1: -5}
+    fresh = BalanceIndex(ledger)
+    for account in range(len(ledger.accounts)):
+        assert index.balances(account, date(2024, 1, 2)) == fresh.balances(account, date(2024, 1, 2))
@@ -0,0 +1,32 @@
+import json
+
+from valedger.bench import main, parse_size
+from valedger.synthetic import Profile, generate
+
+
+def test_parse_size():
+    assert parse_size("10k") == 10_000
+    assert parse_size("1.5M") == 1_500_000
+    assert parse_size("250") == 250
+
+
+def test_generate_is_deterministic():
+    profile = Profile(postings=500, years=1)
+    assert "".join(generate(profile)) == "".join(generate(profile))
+    assert "".join(generate(profile)) != "".join(generate(Profile(postings=500, years=1, seed=1)))
+
+
+def test_synthetic_journal_loads(synthetic):
+    assert abs(len(synthetic) - 3_000) < 100
+    assert len(synthetic.prices) > 0
+    assert len(synthetic.assertions) > 0
+    assert len(synthetic.annotations) > 0
+
+
+def test_bench_reports_every_operation(tmp_path):
+    output = tmp_path / "results.json"
+    assert main(["--sizes", "300", "--repeat", "1", "--workdir", str(tmp_path), "--output", str(output)]) == 0
+    document = json.loads(output.read_text())
+    operations = {result["operation"] for result in document["results"]}
+    assert {"parse", "load", "load_cached", "balance_index", "balance", "register", "report"} <= operations
+    assert document["environment"]["python"]
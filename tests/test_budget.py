@@ -0,0 +1,191 @@
+from datetime import date
+
+import pytest
+
+from valedger import Budget, Envelope, Ledger, Money
+from valedger.aggregate import next_period, period_start
+from valedger.ledger import to_day
+
+
+def spend(ledger: Ledger, day: date, account: str, amount: str, commodity: str = "EUR") -> None:
+    money = Money.parse(amount, commodity)
+    ledger.add_transaction(day, "", [(account, money), ("Assets:Bank", -money)])
+
+
+def brute(ledger: Ledger, envelopes: list[Envelope], start: date, stop: date, period: str = "month") -> dict:
+    """(carried, budgeted, spent, available) per envelope and period overlapping ``[start, stop)``."""
+    names = [ledger.accounts.name(account) for account in range(len(ledger.accounts))]
+    columns = ledger.postings.columns
+    first = period_start(start, period)
+    bounds = [first]
+    while bounds[-1] < to_day(stop):
+        bounds.append(next_period(bounds[-1], period))
+    result = {}
+    for account in dict.fromkeys(envelope.account for envelope in envelopes):
+        plans = sorted(
+            (envelope for envelope in envelopes if envelope.account == account),
+            key=lambda envelope: first if envelope.start is None else to_day(envelope.start),
+        )
+        commodity = plans[0].amount.commodity
+        scale = ledger.scales[ledger.commodities.id(commodity)] if commodity in ledger.commodities else 0
+        # A posting belongs to the envelope of its closest ancestor that has one.
+        owned = set()
+        for index, name in enumerate(names):
+            owner = max(
+                (other.account for other in envelopes if name == other.account or name.startswith(other.account + ":")),
+                key=len,
+                default=None,
+            )
+            if owner == account:
+                owned.add(index)
+        available = 0
+        for lo, hi in zip(bounds, bounds[1:]):
+            plan = None
+            for envelope in plans:
+                if (first if envelope.start is None else period_start(envelope.start, period)) <= lo:
+                    plan = envelope
+            budgeted = 0 if plan is None else plan.amount.value * 10 ** (scale - plan.amount.scale)
+            spent = sum(
+                amount
+                for day, owner, unit, amount in zip(
+                    columns["date"], columns["account"], columns["commodity"], columns["amount"]
+                )
+                if lo <= day < hi and owner in owned and ledger.commodities.name(unit) == commodity
+            )
+            carried = available if plan is None or plan.rollover else 0
+            available = carried + budgeted - spent
+            values = (carried, budgeted, spent, available)
+            result[account, lo] = tuple(Money(value, commodity, scale) for value in values)
+    return result
+
+
+def statuses(budget: Budget, stop: date) -> dict:
+    result = {}
+    for account in budget.accounts:
+        for status in budget.history(account, None, stop):
+            result[account, status.start] = (status.carried, status.budgeted, status.spent, status.available)
+    return result
+
+
+ENVELOPES = [
+    Envelope("Expenses:Food", Money(40000, "EUR", 2)),
+    Envelope("Expenses:Housing", Money(120000, "EUR", 2), rollover=False),
+    Envelope("Expenses", Money(50000, "EUR", 2)),
+    Envelope("Expenses:Food", Money(45000, "EUR", 2), date(2024, 6, 15)),
+    Envelope("Expenses:Travel", Money(300, "USD")),
+]
+
+
+def test_small_budget():
+    ledger = Ledger()
+    spend(ledger, date(2024, 1, 3), "Expenses:Food:Groceries", "120")
+    spend(ledger, date(2024, 1, 20), "Expenses:Food", "30.50")
+    spend(ledger, date(2024, 1, 21), "Expenses:Fun", "60")
+    spend(ledger, date(2024, 2, 2), "Expenses:Food", "500")
+    spend(ledger, date(2024, 3, 1), "Expenses:Food", "10", "USD")
+    ledger.sort()
+    envelopes = [
+        Envelope("Expenses:Food", Money(200, "EUR")),
+        Envelope("Expenses", Money(100, "EUR")),
+        Envelope("Expenses:Food", Money(300, "EUR"), date(2024, 3, 10)),
+    ]
+    budget = Budget(envelopes, date(2024, 1, 1), ledger=ledger)
+    food = budget.history("Expenses:Food")
+    assert [status.spent for status in food] == [Money(15050, "EUR", 2), Money(50000, "EUR", 2), Money(0, "EUR", 2)]
+    assert [status.available.value for status in food] == [4950, -25050, 4950]
+    assert budget.status("Expenses", date(2024, 1, 31)).available == Money(40, "EUR")
+    assert budget.status("Expenses", date(2024, 5, 1)).available == Money(440, "EUR")
+    assert [status.account for status in budget.report(date(2024, 2, 1))] == ["Expenses:Food", "Expenses"]
+    assert budget.status("Expenses:Food", date(2024, 4, 1)).carried == Money(4950, "EUR", 2)
+
+
+def test_no_rollover_starts_each_period_afresh():
+    ledger = Ledger()
+    spend(ledger, date(2024, 1, 3), "Expenses:Rent", "900")
+    spend(ledger, date(2024, 2, 3), "Expenses:Rent", "1100")
+    ledger.sort()
+    budget = Budget([Envelope("Expenses:Rent", Money(1000, "EUR"), rollover=False)], date(2024, 1, 1), ledger=ledger)
+    history = budget.history("Expenses:Rent", None, date(2024, 4, 1))
+    assert [(status.carried, status.available) for status in history] == [
+        (Money(0, "EUR"), Money(100, "EUR")),
+        (Money(0, "EUR"), Money(-100, "EUR")),
+        (Money(0, "EUR"), Money(1000, "EUR")),
+    ]
+
+
+@pytest.mark.parametrize("period", ["month", "week"])
+def test_matches_a_scan(synthetic, period):
+    dates = synthetic.postings.columns["date"]
+    start, stop = date.fromordinal(dates[len(dates) // 4]), date.fromordinal(dates[-1])
+    budget = Budget(ENVELOPES, start, period, synthetic)
+    assert statuses(budget, stop) == brute(synthetic, ENVELOPES, start, stop, period)
+
+
+def test_update_appends(synthetic):
+    start = date.fromordinal(synthetic.postings.columns["date"][0])
+    budget = Budget(ENVELOPES, start, ledger=synthetic)
+    spend(synthetic, date(2030, 1, 5), "Expenses:Food:Lunch", "12.30")
+    spend(synthetic, date(2030, 1, 6), "Expenses:Travel", "80", "USD")
+    budget.update(synthetic)
+    stop = date(2030, 2, 1)
+    assert statuses(budget, stop) == statuses(Budget(ENVELOPES, start, ledger=synthetic), stop)
+    assert statuses(budget, stop) == brute(synthetic, ENVELOPES, start, stop)
+
+
+def test_update_after_back_dated_insert_matches_fresh_budget(synthetic):
+    dates = synthetic.postings.columns["date"]
+    start, stop = date.fromordinal(dates[0]), date.fromordinal(dates[-1])
+    budget = Budget(ENVELOPES, start, ledger=synthetic)
+    budget.report(stop)
+    spend(synthetic, date.fromordinal(dates[len(dates) // 2]), "Expenses:Food", "77.70")
+    spend(synthetic, date.fromordinal(dates[100]), "Expenses:Unbudgeted", "5")
+    synthetic.sort()
+    budget.update(synthetic)
+    assert statuses(budget, stop) == statuses(Budget(ENVELOPES, start, ledger=synthetic), stop)
+    assert statuses(budget, stop) == brute(synthetic, ENVELOPES, start, stop)
+
+
+def test_wider_precision_and_late_commodity():
+    ledger = Ledger()
+    spend(ledger, date(2024, 1, 3), "Expenses:Food", "10")
+    ledger.sort()
+    envelopes = [Envelope("Expenses:Food", Money(100, "EUR")), Envelope("Expenses:Travel", Money(50, "USD"))]
+    budget = Budget(envelopes, date(2024, 1, 1), ledger=ledger)
+    assert budget.status("Expenses:Travel", date(2024, 1, 1)).available == Money(50, "USD")
+    spend(ledger, date(2024, 2, 3), "Expenses:Food", "0.125")
+    spend(ledger, date(2024, 2, 4), "Expenses:Travel", "20", "USD")
+    budget.update(ledger)
+    stop = date(2024, 3, 1)
+    assert statuses(budget, stop) == brute(ledger, envelopes, date(2024, 1, 1), stop)
+    assert budget.status("Expenses:Food", date(2024, 2, 1)).available == Money(189875, "EUR", 3)
+
+
+def test_empty_ledger():
+    ledger = Ledger()
+    budget = Budget(ENVELOPES, date(2024, 1, 1), ledger=ledger)
+    report = budget.report(date(2024, 3, 15))
+    assert [status.available for status in report] == [
+        Money(120000, "EUR", 2),
+        Money(120000, "EUR", 2),
+        Money(150000, "EUR", 2),
+        Money(900, "USD"),
+    ]
+    assert all(status.spent.value == 0 for status in report)
+    budget.update(ledger)
+    assert budget.rows == 0 and budget.last_day is None
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        mixed = [Envelope("Expenses", Money(1, "EUR")), Envelope("Expenses", Money(1, "USD"), date(2024, 2, 1))]
+        Budget(mixed, date(2024, 1, 1))
+    budget = Budget(ENVELOPES, date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        budget.status("Expenses:Fun", date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        budget.status("Expenses", date(2023, 12, 31))
+    ledger = Ledger()
+    spend(ledger, date(2024, 1, 2), "Expenses", "1")
+    spend(ledger, date(2024, 1, 1), "Expenses", "1")
+    with pytest.raises(ValueError):
+        budget.update(ledger)
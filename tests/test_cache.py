@@ -0,0 +1,156 @@
+import os
+
+from valedger import Cache, ParseStats, load_cached, load_journal
+from valedger import cache as cache_module
+
+SHOP = """\
+{day} Shop
+    Expenses:Food  {amount} EUR
+    Assets:Bank
+"""
+
+
+def shop(day: str, amount: str = "10.00") -> str:
+    return SHOP.format(day=day, amount=amount) + "\n"
+
+
+def same(a, b) -> bool:
+    return all(
+        a.tables[name].columns[column].tolist() == b.tables[name].columns[column].tolist()
+        for name in a.tables
+        for column in a.tables[name].columns
+    ) and list(a.accounts) == list(b.accounts)
+
+
+def touch(path, content: str) -> None:
+    # Force a new modification time even on coarse-grained filesystems.
+    stat = path.stat() if path.exists() else None
+    path.write_text(content)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_warm_load_is_mapped_from_the_snapshot(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text(shop("2024-01-01") + shop("2024-01-02", "5.50"))
+    cache = Cache(tmp_path / "cache")
+    cold = load_cached(journal, workers=1, cache=cache)
+    stats = ParseStats()
+    warm = load_cached(journal, stats, workers=1, cache=cache)
+    assert stats.transactions == 0
+    assert warm.postings.frozen
+    assert same(warm, cold)
+    assert same(warm, load_journal(journal, workers=1))
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text(shop("2024-01-01"))
+    cache = Cache(tmp_path / "cache")
+    load_cached(journal, workers=1, cache=cache)
+    touch(journal, shop("2024-01-01", "12.00"))
+    ledger = load_cached(journal, workers=1, cache=cache)
+    assert same(ledger, load_journal(journal, workers=1))
+
+
+def test_only_changed_includes_are_parsed_again(tmp_path):
+    (tmp_path / "a.journal").write_text(shop("2023-01-01"))
+    (tmp_path / "b.journal").write_text(shop("2023-06-01"))
+    journal = tmp_path / "main.journal"
+    journal.write_text("include a.journal\ninclude b.journal\n")
+    cache = Cache(tmp_path / "cache")
+    load_cached(journal, workers=1, cache=cache)
+    touch(tmp_path / "b.journal", shop("2023-06-01", "1.00"))
+    stats = ParseStats()
+    ledger = load_cached(journal, stats, workers=1, cache=cache)
+    assert stats.files == [str(tmp_path / "b.journal")]
+    assert same(ledger, load_journal(journal, workers=1))
+
+
+def test_new_file_matching_a_glob_include_is_picked_up(tmp_path):
+    years = tmp_path / "y"
+    years.mkdir()
+    (years / "2020.journal").write_text(shop("2020-03-01"))
+    journal = tmp_path / "main.journal"
+    journal.write_text("include y/*.journal\n")
+    cache = Cache(tmp_path / "cache")
+    assert len(load_cached(journal, workers=1, cache=cache)) == 2
+    (years / "2021.journal").write_text(shop("2021-03-01"))
+    ledger = load_cached(journal, workers=1, cache=cache)
+    assert len(ledger) == 4
+    assert same(ledger, load_journal(journal, workers=1))
+    (years / "2020.journal").unlink()
+    assert len(load_cached(journal, workers=1, cache=cache)) == 2
+
+
+def test_empty_journal(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text("")
+    cache = Cache(tmp_path / "cache")
+    assert len(load_cached(journal, workers=1, cache=cache)) == 0
+    assert len(load_cached(journal, workers=1, cache=cache)) == 0
+
+
+def test_corrupt_cache_entry_is_ignored(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text(shop("2024-01-01"))
+    cache = Cache(tmp_path / "cache")
+    load_cached(journal, workers=1, cache=cache)
+    for entry in (tmp_path / "cache").rglob("*.vlc"):
+        entry.write_bytes(b"garbage")
+    assert same(load_cached(journal, workers=1, cache=cache), load_journal(journal, workers=1))
+
+
+def test_appended_lines_are_parsed_alone(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text("".join(shop(f"2024-01-{day:02}") for day in range(1, 21)))
+    cache = Cache(tmp_path / "cache")
+    load_cached(journal, workers=1, cache=cache)
+    with open(journal, "a") as handle:
+        handle.write(shop("2024-02-01", "3.00"))
+    stats = ParseStats()
+    ledger = load_cached(journal, stats, workers=1, cache=cache)
+    # The last entry is parsed again, as appended lines may belong to it.
+    assert stats.transactions == 2
+    assert same(ledger, load_journal(journal, workers=1))
+
+
+def test_appended_posting_extends_the_last_transaction(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text(shop("2024-01-01") + "2024-01-02 Split\n    Expenses:Food  1 EUR\n")
+    cache = Cache(tmp_path / "cache")
+    load_cached(journal, workers=1, cache=cache)
+    with open(journal, "a") as handle:
+        handle.write("    Assets:Bank\n")
+    ledger = load_cached(journal, workers=1, cache=cache)
+    assert len(ledger) == 4
+    assert same(ledger, load_journal(journal, workers=1))
+
+
+def test_edited_prefix_is_parsed_in_full(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text(shop("2024-01-01") + shop("2024-01-02"))
+    cache = Cache(tmp_path / "cache")
+    load_cached(journal, workers=1, cache=cache)
+    touch(journal, shop("2024-01-01", "99.00") + shop("2024-01-02") + shop("2024-01-03"))
+    stats = ParseStats()
+    ledger = load_cached(journal, stats, workers=1, cache=cache)
+    assert stats.transactions == 3
+    assert same(ledger, load_journal(journal, workers=1))
+
+
+def test_file_changed_while_parsed_is_not_cached(tmp_path, monkeypatch):
+    journal = tmp_path / "main.journal"
+    journal.write_text(shop("2024-01-01"))
+    cache = Cache(tmp_path / "cache")
+    parse_chunks = cache_module.parse_chunks
+
+    def edited(*args, **kwargs):
+        chunks = parse_chunks(*args, **kwargs)
+        touch(journal, shop("2024-01-01", "12.00"))
+        return chunks
+
+    monkeypatch.setattr(cache_module, "parse_chunks", edited)
+    load_cached(journal, workers=1, cache=cache)
+    monkeypatch.undo()
+    assert same(load_cached(journal, workers=1, cache=cache), load_journal(journal, workers=1))
@@ -0,0 +1,117 @@
+from datetime import date
+
+import pytest
+
+from valedger import Checkpoints, Ledger, Money
+
+
+def brute(ledger: Ledger, accounts: range, stop: int) -> dict[int, int]:
+    columns = ledger.postings.columns
+    result: dict[int, int] = {}
+    for row in range(stop):
+        if columns["account"][row] in accounts:
+            commodity = columns["commodity"][row]
+            result[commodity] = result.get(commodity, 0) + columns["amount"][row]
+    return {commodity: value for commodity, value in result.items() if value}
+
+
+def state(index: Checkpoints) -> tuple:
+    return tuple(
+        list(values) for values in (index._days, index._rows, index._offsets, index._keys, index._amounts)
+    ) + (bytes(index._digests), index.rows)
+
+
+def spend(ledger: Ledger, day: date, amount: Money, account: str = "Expenses:Food") -> None:
+    ledger.add_transaction(day, "Shop", [(account, amount), ("Assets:Bank:Checking", -amount)])
+
+
+@pytest.mark.parametrize("interval", ["month", "year", 100])
+def test_balances_match_summing_postings(synthetic, interval):
+    synthetic.order_accounts()
+    index = Checkpoints(synthetic, interval)
+    assert len(index) > 1
+    dates = synthetic.postings.columns["date"]
+    for account in ("Assets", "Assets:Bank:Checking", "Expenses:Food", "Liabilities"):
+        accounts = synthetic.account_range(account)
+        for day in range(dates[0] - 1, dates[-1] + 2, 37):
+            stop = synthetic.rows_between(None, day + 1)[1]
+            assert index.balances(synthetic, accounts, day) == brute(synthetic, accounts, stop)
+        for row in range(0, len(synthetic), 211):
+            assert index.before(synthetic, accounts, row) == brute(synthetic, accounts, row)
+
+
+def test_checkpoint_days():
+    ledger = Ledger()
+    for day in (date(2024, 1, 5), date(2024, 1, 20), date(2024, 3, 2), date(2024, 3, 2), date(2024, 3, 9)):
+        spend(ledger, day, Money(1, "EUR"))
+    assert [date.fromordinal(day) for day in Checkpoints(ledger).days()] == [date(2024, 3, 1)]
+    # At least three postings apart, and never between postings of one day.
+    assert [date.fromordinal(day) for day in Checkpoints(ledger, 3).days()] == [date(2024, 3, 2), date(2024, 3, 9)]
+
+
+@pytest.mark.parametrize("interval", ["month", 50])
+def test_update_after_back_dated_insert_matches_fresh_index(synthetic, interval):
+    index = Checkpoints(synthetic, interval)
+    middle = synthetic.postings.columns["date"][len(synthetic) // 2]
+    kept = index.days()[: index.days().index(next(day for day in index.days() if day > middle))]
+    spend(synthetic, date.fromordinal(middle), Money(12345, "EUR", 2))
+    synthetic.sort()
+    index.update(synthetic)
+    assert state(index) == state(Checkpoints(synthetic, interval))
+    assert index.days()[: len(kept)] == kept
+    spend(synthetic, date(2030, 1, 1), Money(1, "EUR"))
+    index.update(synthetic)
+    assert state(index) == state(Checkpoints(synthetic, interval))
+
+
+def test_renumbered_accounts_and_wider_precision(synthetic):
+    index = Checkpoints(synthetic)
+    spend(synthetic, date(2030, 1, 1), Money(1, "EUR"), "Aardvark")
+    synthetic.order_accounts()
+    index.update(synthetic)
+    assert state(index) == state(Checkpoints(synthetic))
+    spend(synthetic, date(2030, 1, 2), Money(1, "EUR", 3))
+    index.update(synthetic)
+    assert state(index) == state(Checkpoints(synthetic))
+
+
+def test_invalidate_drops_later_checkpoints(synthetic):
+    index = Checkpoints(synthetic)
+    days = index.days()
+    index.invalidate(days[5])
+    assert index.days() == days[:6]
+    index.update(synthetic)
+    assert index.days() == days
+
+
+def test_save_and_load(synthetic, tmp_path):
+    index = Checkpoints(synthetic)
+    index.save(tmp_path / "checkpoints.vlx")
+    loaded = Checkpoints.load(tmp_path / "checkpoints.vlx")
+    assert state(loaded) == state(index)
+    accounts = synthetic.account_range("Assets")
+    day = synthetic.postings.columns["date"][len(synthetic) // 3]
+    assert loaded.balances(synthetic, accounts, day) == index.balances(synthetic, accounts, day)
+    spend(synthetic, date(2030, 1, 1), Money(1, "EUR"))
+    loaded.update(synthetic)
+    assert state(loaded) == state(Checkpoints(synthetic))
+    assert len(Checkpoints.load(tmp_path / "checkpoints.vlx", "year")) == 0
+
+
+def test_loaded_checkpoints_of_a_changed_ledger(synthetic, tmp_path):
+    Checkpoints(synthetic).save(tmp_path / "checkpoints.vlx")
+    spend(synthetic, date.fromordinal(synthetic.postings.columns["date"][10]), Money(5, "EUR"))
+    synthetic.sort()
+    loaded = Checkpoints.load(tmp_path / "checkpoints.vlx")
+    loaded.update(synthetic)
+    assert state(loaded) == state(Checkpoints(synthetic))
+
+
+def test_empty_and_invalid():
+    index = Checkpoints(Ledger())
+    assert len(index) == 0 and index.rows == 0
+    assert index.balances(Ledger(), range(0, 10), date(2024, 1, 1)) == {}
+    with pytest.raises(ValueError):
+        Checkpoints(interval="fortnight")
+    with pytest.raises(ValueError):
+        Checkpoints(interval=0)
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+from datetime import date
+
+from valedger import BalanceIndex, Database, Ledger, Money, Register
+from valedger.ledger import INTERNERS
+
+
+def contents(ledger: Ledger) -> tuple:
+    tables = {name: {key: list(data) for key, data in table.columns.items()} for name, table in ledger.tables.items()}
+    names = {kind: list(getattr(ledger, kind).names()) for kind in INTERNERS}
+    return tables, names, list(ledger.scales), ledger.is_sorted
+
+
+def spend(ledger: Ledger, day: date, payee: str, amount: Money) -> None:
+    ledger.add_transaction(day, payee, [("Expenses:Food", amount), ("Assets:Bank", -amount)])
+
+
+def test_round_trip(synthetic, tmp_path):
+    with Database(tmp_path / "ledger.db") as database:
+        database.sync(synthetic)
+        assert len(database) == len(synthetic)
+        assert contents(database.load()) == contents(synthetic)
+    with Database(tmp_path / "ledger.db") as reader:
+        assert contents(reader.load()) == contents(synthetic)
+
+
+def test_sync_appends_only_new_rows(synthetic, tmp_path):
+    with Database(tmp_path / "ledger.db") as database:
+        database.sync(synthetic)
+        statements = []
+        database._connection.set_trace_callback(statements.append)
+        spend(synthetic, date(2030, 1, 1), "New payee", Money(1234, "EUR", 2))
+        database.sync(synthetic)
+        database._connection.set_trace_callback(None)
+        assert not [statement for statement in statements if statement.startswith("DELETE FROM postings")]
+        assert contents(database.load()) == contents(synthetic)
+
+
+def test_sync_after_back_dated_insert_rewrites(synthetic, tmp_path):
+    with Database(tmp_path / "ledger.db") as database:
+        database.sync(synthetic)
+        spend(synthetic, date(2015, 1, 1), "Back-dated", Money(5, "EUR"))
+        synthetic.sort()
+        database.sync(synthetic)
+        loaded = database.load()
+        assert contents(loaded) == contents(synthetic)
+        assert loaded.is_sorted
+
+
+def test_sql_balances_and_register(synthetic, tmp_path):
+    synthetic.order_accounts()
+    index = BalanceIndex(synthetic)
+    bank = synthetic.account_range("Assets:Bank")
+    day = date(2016, 6, 30).toordinal()
+    with Database(tmp_path / "ledger.db") as database:
+        database.sync(synthetic)
+        summed: dict[int, int] = {}
+        for (account, commodity), total in database.balances(day, bank).items():
+            assert account in bank
+            summed[commodity] = summed.get(commodity, 0) + total
+        assert {commodity: total for commodity, total in summed.items() if total} == index.balances(bank, day)
+        assert database.register(bank) == list(Register(synthetic, "Assets:Bank").rows)
+        start, end = date(2016, 1, 1).toordinal(), date(2016, 2, 1).toordinal()
+        assert database.register(bank, start, end) == list(Register(synthetic, "Assets:Bank", start, end).rows)
+
+
+def test_older_format_is_rebuilt(tmp_path):
+    path = tmp_path / "ledger.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    connection.execute("CREATE TABLE balances (id INTEGER PRIMARY KEY, date INTEGER NOT NULL)")
+    connection.execute("INSERT INTO meta VALUES ('state', ?)", (json.dumps({"format": 1, "tables": {}}),))
+    connection.commit()
+    connection.close()
+    ledger = Ledger()
+    spend(ledger, date(2024, 1, 1), "Shop", Money(5, "EUR"))
+    ledger.balances.append(date(2024, 1, 2).toordinal(), 1, 0, -5, 0, 3)
+    with Database(path) as database:
+        assert len(database) == 0
+        database.sync(ledger)
+        assert contents(database.load()) == contents(ledger)
+
+
+def test_empty_ledger(tmp_path):
+    with Database(tmp_path / "ledger.db") as database:
+        assert len(database) == 0
+        assert contents(database.load()) == contents(Ledger())
+        database.sync(Ledger())
+        assert contents(database.load()) == contents(Ledger())
+        assert database.balances() == {}
@@ -0,0 +1,129 @@
+from datetime import date
+
+from valedger import Ledger, Money
+from valedger.importers import FingerprintIndex, Record, dedupe, store
+from valedger.importers.fingerprints import exact_key
+
+
+def record(day: int, amount: str, payee: str, reference: str = "") -> Record:
+    day = date(2024, 1, day).toordinal()
+    return Record(day, Money.parse(amount, "EUR"), payee, "", reference, "Assets:Bank", "Expenses:Food", "s")
+
+
+def ledger_of(*records: Record) -> Ledger:
+    ledger = Ledger()
+    store(ledger, records)
+    ledger.sort()
+    return ledger
+
+
+def kept(index: FingerprintIndex, records, window: int = 0) -> list[Record]:
+    return list(index.filter(records, window, record=False))
+
+
+def test_recorded_postings_are_dropped():
+    ledger = ledger_of(record(1, "-5", "Coffee"), record(2, "-9", "Lunch"))
+    index = FingerprintIndex()
+    index.update(ledger)
+    assert kept(index, [record(1, "-5", "COFFEE"), record(2, "-9", "Lunch"), record(3, "-1", "Tip")]) == [
+        record(3, "-1", "Tip")
+    ]
+
+
+def test_each_posting_matches_one_record():
+    index = FingerprintIndex()
+    index.update(ledger_of(record(1, "-5", "Coffee"), record(1, "-5", "Coffee")))
+    assert len(kept(index, [record(1, "-5", "Coffee")] * 3)) == 1
+
+
+def test_reference_matches_a_posting_without_code():
+    index = FingerprintIndex()
+    index.update(ledger_of(record(1, "-5", "Coffee")))
+    assert kept(index, [record(1, "-5", "Coffee", "REF1")]) == []
+
+
+def test_posting_with_code_matches_by_reference_or_payee():
+    index = FingerprintIndex()
+    index.update(ledger_of(record(1, "-5", "Coffee", "REF1")))
+    assert kept(index, [record(1, "-5", "Cafe Central", "REF1")]) == []
+    assert kept(index, [record(1, "-5", "Coffee")]) == []
+    # The one posting cannot match both.
+    assert len(kept(index, [record(1, "-5", "Coffee", "REF1"), record(1, "-5", "Coffee")])) == 1
+
+
+def test_window_matches_the_closest_posting():
+    index = FingerprintIndex()
+    index.update(ledger_of(record(5, "-5", "Coffee")))
+    assert kept(index, [record(7, "-5", "Espresso bar")], window=3) == []
+    assert len(kept(index, [record(9, "-5", "Espresso bar")], window=3)) == 1
+
+
+def test_imported_records_are_not_counted_twice_once_stored():
+    index = FingerprintIndex()
+    ledger = ledger_of(record(1, "-5", "Coffee"))
+    index.update(ledger)
+    statement = [record(1, "-5", "Coffee"), record(1, "-5", "Coffee"), record(2, "-9", "Lunch", "R2")]
+    new = list(index.filter(statement))
+    assert new == statement[1:]
+    assert list(index.filter(statement)) == []
+    store(ledger, new)
+    ledger.sort()
+    index.update(ledger)
+    assert index.count(exact_key(record(1, "-5", "").date, Money(-5, "EUR"), "Assets:Bank", "Coffee")) == 2
+    assert len(index) == len(ledger)
+    assert list(index.filter(statement + [record(1, "-5", "Coffee")])) == [record(1, "-5", "Coffee")]
+
+
+def test_update_after_back_dated_insert_matches_fresh_build():
+    ledger = ledger_of(record(1, "-5", "Coffee"), record(3, "-7", "Cinema"))
+    index = FingerprintIndex()
+    index.update(ledger)
+    store(ledger, [record(2, "-9", "Lunch")])
+    ledger.sort()
+    index.update(ledger)
+    fresh = FingerprintIndex()
+    fresh.update(ledger)
+    statement = [record(1, "-5", "Coffee"), record(2, "-9", "Lunch"), record(3, "-7", "Cinema")]
+    assert kept(index, statement) == kept(fresh, statement) == []
+    assert len(index) == len(fresh) == len(ledger)
+
+
+def test_save_and_load(tmp_path):
+    ledger = ledger_of(record(1, "-5", "Coffee"))
+    index = FingerprintIndex()
+    index.update(ledger)
+    assert list(index.filter([record(2, "-9", "Lunch")])) == [record(2, "-9", "Lunch")]
+    index.save(tmp_path / "index.vlx")
+    loaded = FingerprintIndex.load(tmp_path / "index.vlx")
+    assert loaded.rows == len(ledger)
+    assert kept(loaded, [record(1, "-5", "Coffee"), record(2, "-9", "Lunch")]) == []
+    loaded.update(ledger)
+    assert loaded.rows == len(ledger) and len(loaded) == len(index)
+    store(ledger, [record(2, "-9", "Lunch")])
+    ledger.sort()
+    loaded.update(ledger)
+    assert len(loaded) == len(ledger)
+
+
+def test_changed_ledger_is_fingerprinted_again(tmp_path):
+    index = FingerprintIndex()
+    index.update(ledger_of(record(1, "-5", "Coffee")))
+    index.save(tmp_path / "index.vlx")
+    loaded = FingerprintIndex.load(tmp_path / "index.vlx")
+    other = ledger_of(record(1, "-6", "Coffee"))
+    loaded.update(other)
+    assert kept(loaded, [record(1, "-5", "Coffee")]) == [record(1, "-5", "Coffee")]
+    assert kept(loaded, [record(1, "-6", "Coffee")]) == []
+
+
+def test_empty_index(tmp_path):
+    index = FingerprintIndex.load(tmp_path / "missing.vlx")
+    index.update(Ledger())
+    assert len(index) == 0
+    assert kept(index, [record(1, "-5", "Coffee")], window=5) == [record(1, "-5", "Coffee")]
+
+
+def test_dedupe_stage_uses_the_index():
+    index = FingerprintIndex()
+    index.update(ledger_of(record(1, "-5", "Coffee")))
+    assert list(dedupe([record(1, "-5", "Coffee"), record(2, "-5", "Coffee")], index)) == [record(2, "-5", "Coffee")]
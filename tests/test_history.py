@@ -0,0 +1,126 @@
+import os
+from datetime import date
+
+import pytest
+
+from valedger import BalanceIndex, Cache, History, load_journal
+from valedger.history import OPENING, year_start
+
+DEPOSIT = """\
+{day} Deposit
+    Assets:Bank  {amount} EUR
+    Income:Salary
+"""
+
+
+def deposit(day: str, amount: str) -> str:
+    return DEPOSIT.format(day=day, amount=amount) + "\n"
+
+
+def touch(path, content: str) -> None:
+    stat = path.stat() if path.exists() else None
+    path.write_text(content)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def bank(history: History, day: date) -> int:
+    ledger = history.ledger
+    return BalanceIndex(ledger).balance(ledger.accounts.id("Assets:Bank"), ledger.commodities.id("EUR"), day)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    path = tmp_path / "main.journal"
+    path.write_text(deposit("2020-03-01", "100") + deposit("2021-03-01", "50"))
+    return path
+
+
+@pytest.mark.parametrize("start", [None, date(2020, 1, 1), date(2021, 6, 1), date(2022, 1, 1), date(2030, 1, 1)])
+def test_window_balances_match_the_journal(journal, tmp_path, start):
+    history = History(journal, start, cache=Cache(tmp_path / "cache"), workers=1)
+    assert bank(history, date(2022, 1, 1)) == 150
+    payees = [history.ledger.payees.name(payee) for payee in history.ledger.transactions.columns["payee"]]
+    assert payees.count(OPENING) == (0 if start is None or start.year == 2020 else 1)
+
+
+
+@pytest.mark.parametrize("start", [date(2021, 6, 1), date(2022, 1, 1)])
+def test_window_opening_in_a_year_without_transactions(tmp_path, start):
+    path = tmp_path / "main.journal"
+    food = "2022-03-01 Shop\n    Expenses:Food  10 EUR\n    Assets:Bank\n\n"
+    path.write_text(deposit("2020-03-01", "100") + food)
+    history = History(path, start, cache=Cache(tmp_path / "cache"), workers=1)
+    assert history.years == [2020, 2022]
+    assert bank(history, date(2022, 12, 31)) == 90
+
+
+def test_window_grows_and_keeps_balances(journal, tmp_path):
+    history = History(journal, date(2021, 1, 1), cache=Cache(tmp_path / "cache"), workers=1)
+    assert history.window == (2021, 2021)
+    assert bank(history, date(2021, 1, 1)) == 100
+    history.load(date(2020, 5, 1))
+    assert history.window == (2020, 2021)
+    assert bank(history, date(2020, 12, 31)) == 100
+    assert bank(history, date(2021, 12, 31)) == 150
+    assert history.rows_between(date(2021, 1, 1), date(2022, 1, 1)) == (2, 4)
+
+
+def test_synthetic_windows_match_the_full_ledger(synthetic_path, tmp_path):
+    full = load_journal(synthetic_path, workers=1)
+    index = BalanceIndex(full)
+    history = History(synthetic_path, cache=Cache(tmp_path / "cache"), workers=1)
+    years = history.years
+    for first in years:
+        window = History(synthetic_path, date(first, 1, 1), cache=Cache(tmp_path / "cache"), workers=1)
+        ledger = window.ledger
+        window_index = BalanceIndex(ledger)
+        day = year_start(years[-1] + 1) - 1
+        for account in ("Assets", "Expenses", "Liabilities"):
+            expected = index.balances(full.account_range(account), day)
+            found = window_index.balances(ledger.account_range(account), day)
+            assert {ledger.commodities.name(key): value for key, value in found.items()} == {
+                full.commodities.name(key): value for key, value in expected.items()
+            }
+
+
+def test_changed_journal_rebuilds_the_history(journal, tmp_path):
+    cache = Cache(tmp_path / "cache")
+    History(journal, cache=cache, workers=1)
+    touch(journal, journal.read_text() + deposit("2022-03-01", "25"))
+    history = History(journal, date(2022, 1, 1), cache=cache, workers=1)
+    assert history.years == [2020, 2021, 2022]
+    assert bank(history, date(2022, 12, 31)) == 175
+
+
+def test_new_file_matching_a_glob_include_rebuilds_the_history(tmp_path):
+    years = tmp_path / "y"
+    years.mkdir()
+    (years / "2020.journal").write_text(deposit("2020-03-01", "100"))
+    journal = tmp_path / "main.journal"
+    journal.write_text("include y/*.journal\n")
+    cache = Cache(tmp_path / "cache")
+    assert History(journal, cache=cache, workers=1).years == [2020]
+    (years / "2021.journal").write_text(deposit("2021-03-01", "50"))
+    history = History(journal, cache=cache, workers=1)
+    assert history.years == [2020, 2021]
+    assert bank(history, date(2021, 12, 31)) == 150
+    (years / "2020.journal").unlink()
+    assert History(journal, cache=cache, workers=1).years == [2021]
+
+
+def test_balance_directives_stay_with_their_year(journal, tmp_path):
+    touch(journal, journal.read_text() + "2021-06-01 balance Assets:Bank  150 EUR\n")
+    history = History(journal, date(2021, 1, 1), cache=Cache(tmp_path / "cache"), workers=1)
+    balances = history.ledger.balances.columns
+    assert balances["date"].tolist() == [date(2021, 6, 1).toordinal()]
+    assert history.ledger.files.name(balances["file"][0]) == str(journal)
+
+
+def test_empty_journal(tmp_path):
+    journal = tmp_path / "main.journal"
+    journal.write_text("")
+    history = History(journal, cache=Cache(tmp_path / "cache"), workers=1)
+    assert history.years == []
+    assert len(history.ledger) == 0
+    assert history.rows_between(date(2024, 1, 1)) == (0, 0)
@@ -0,0 +1,156 @@
+from datetime import date
+from functools import partial
+
+import pytest
+
+from valedger import Ledger, Money, ParseError, parse_journal
+from valedger.importers import (
+    CsvLayout,
+    Record,
+    categorize,
+    decode,
+    dedupe,
+    detect,
+    emit,
+    normalize,
+    normalize_payee,
+    pipeline,
+    read_camt,
+    read_csv,
+    read_ofx,
+    read_qif,
+    store,
+)
+
+CSV = """\
+Date;Payee;Memo;Debit;Credit;Reference
+05/01/2024;ACME  Corp.;invoice 12;1.234,50;;R1
+06/01/2024;Employer;;;3.000,00;R2
+"""
+
+OFX = """\
+OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>EUR
+<BANKACCTFROM><ACCTID>BE68539007547034</BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000.000[-5:EST]<TRNAMT>-12.50<FITID>F1<NAME>Bakery<MEMO>bread</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240106<TRNAMT>100.00<FITID>F2<NAME>Employer</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+QIF = """\
+!Type:Bank
+D01/05'24
+T-12.50
+PBakery
+Mbread
+^
+D01/06/2024
+T100.00
+PEmployer
+^
+"""
+
+CAMT = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+<BkToCstmrStmt><Stmt>
+<Acct><Id><IBAN>BE68539007547034</IBAN></Id></Acct>
+<Ntry><Amt Ccy="EUR">12.50</Amt><CdtDbtInd>DBIT</CdtDbtInd><BookgDt><Dt>2024-01-05</Dt></BookgDt>
+<NtryDtls><TxDtls><Refs><EndToEndId>E1</EndToEndId></Refs>
+<RltdPties><Cdtr><Nm>Bakery</Nm></Cdtr></RltdPties><RmtInf><Ustrd>bread</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>
+<Ntry><Amt Ccy="EUR">100.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><BookgDt><Dt>2024-01-06</Dt></BookgDt>
+<NtryDtls><TxDtls><Refs><EndToEndId>NOTPROVIDED</EndToEndId><AcctSvcrRef>S2</AcctSvcrRef></Refs>
+<RltdPties><Dbtr><Nm>Employer</Nm></Dbtr></RltdPties></TxDtls></NtryDtls></Ntry>
+</Stmt></BkToCstmrStmt></Document>
+"""
+
+
+def write(tmp_path, name: str, text: str):
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def record(day: int, amount: str, payee: str, source: str = "a", reference: str = "") -> Record:
+    day = date(2024, 1, day).toordinal()
+    return Record(day, Money.parse(amount, "EUR"), payee, "", reference, "Assets:Bank", "", source)
+
+
+def test_read_csv(tmp_path):
+    layout = CsvLayout(debit="debit", credit="credit", amount=None, date_format="%d/%m/%Y", delimiter=";", decimal=",")
+    records = list(read_csv(write(tmp_path, "s.csv", CSV), layout, commodity="EUR", account="Assets:Bank"))
+    assert [(r.date, r.amount, r.payee, r.reference, r.line) for r in records] == [
+        (date(2024, 1, 5).toordinal(), Money.parse("-1234.50", "EUR"), "ACME  Corp.", "R1", 2),
+        (date(2024, 1, 6).toordinal(), Money.parse("3000.00", "EUR"), "Employer", "R2", 3),
+    ]
+
+
+def test_read_csv_without_amounts(tmp_path):
+    with pytest.raises(ParseError):
+        list(read_csv(write(tmp_path, "s.csv", "when,who\n2024-01-01,x\n")))
+
+
+
+def test_read_csv_with_an_empty_debit_and_no_credit_column(tmp_path):
+    layout = CsvLayout(debit="debit", amount=None)
+    path = write(tmp_path, "s.csv", "date,payee,debit\n2024-01-01,x,5\n2024-01-02,y,\n")
+    with pytest.raises(ParseError) as raised:
+        list(read_csv(path, layout, commodity="EUR"))
+    assert raised.value.line == 3
+
+
+@pytest.mark.parametrize(
+    "name, text, reader",
+    [("s.ofx", OFX, read_ofx), ("s.qif", QIF, partial(read_qif, commodity="EUR")), ("s.xml", CAMT, read_camt)],
+)
+def test_statement_formats_agree(tmp_path, name, text, reader):
+    records = list(reader(write(tmp_path, name, text)))
+    assert [(r.date, r.amount, r.payee) for r in records] == [
+        (date(2024, 1, 5).toordinal(), Money.parse("-12.50", "EUR"), "Bakery"),
+        (date(2024, 1, 6).toordinal(), Money.parse("100.00", "EUR"), "Employer"),
+    ]
+    assert records[0].memo == "bread"
+
+
+def test_detect(tmp_path):
+    assert detect(write(tmp_path, "a.ofx", OFX)) == "ofx"
+    assert detect(write(tmp_path, "a.txt", QIF)) == "qif"
+    assert detect(write(tmp_path, "a.dat", CAMT)) == "camt"
+    assert detect(write(tmp_path, "a.csv", CSV)) == "csv"
+
+
+def test_camt_references_and_account(tmp_path):
+    records = list(read_camt(write(tmp_path, "s.xml", CAMT)))
+    assert [r.reference for r in records] == ["E1", "S2"]
+    assert {r.account for r in records} == {"BE68539007547034"}
+
+
+def test_pipeline_end_to_end(tmp_path):
+    paths = [write(tmp_path, "a.ofx", OFX), write(tmp_path, "b.xml", CAMT)]
+    accounts = {"BE68 5390 0754 7034": "Assets:Bank"}
+    rules = [lambda r: "Expenses:Food" if r.payee == "Bakery" else None]
+    records = list(pipeline(decode(paths), partial(normalize, accounts=accounts), partial(categorize, rules=rules)))
+    assert {r.account for r in records} == {"Assets:Bank"}
+    assert [r.counter for r in records[:2]] == ["Expenses:Food", "Income:Unknown"]
+    path = write(tmp_path, "out.journal", "".join(emit(records)))
+    assert [entry.payee for entry in parse_journal(path)] == ["Bakery", "Employer"] * 2
+    ledger = Ledger()
+    assert store(ledger, records) == 4
+    assert len(ledger) == 8
+
+
+def test_dedupe_across_statements():
+    first = [record(1, "-5", "Coffee"), record(1, "-5", "Coffee"), record(2, "-9", "Lunch")]
+    second = [record(1, "-5", "coffee!", "b"), record(2, "-9", "Lunch", "b"), record(3, "-1", "Tip", "b")]
+    kept = list(dedupe(first + second))
+    assert [(r.payee, r.source) for r in kept] == [("Coffee", "a"), ("Coffee", "a"), ("Lunch", "a"), ("Tip", "b")]
+
+
+def test_emit_requires_an_account():
+    with pytest.raises(ParseError):
+        list(emit([record(1, "-5", "Coffee")._replace(account="")]))
+
+
+def test_normalize_payee():
+    assert normalize_payee("ACME  Corp.") == "acme corp"
@@ -0,0 +1,120 @@
+import math
+from datetime import date
+
+import pytest
+
+from valedger import Ledger, Money
+from valedger.importers import Categorizer, Record
+from valedger.importers.learning import tokenize
+
+
+def spend(ledger: Ledger, day: int, payee: str, account: str, note: str = "") -> None:
+    amount = Money(500, "EUR", 2)
+    ledger.add_transaction(date(2024, 1, day), payee, [(account, amount), ("Assets:Bank", -amount)], note=note)
+
+
+def make_ledger() -> Ledger:
+    ledger = Ledger()
+    spend(ledger, 1, "Albert Heijn Utrecht", "Expenses:Groceries")
+    spend(ledger, 2, "Albert Heijn Amsterdam", "Expenses:Groceries")
+    spend(ledger, 3, "Jumbo Utrecht", "Expenses:Groceries")
+    spend(ledger, 4, "NS Utrecht Centraal", "Expenses:Transport", "train ticket")
+    spend(ledger, 5, "Shell Utrecht", "Expenses:Transport")
+    ledger.sort()
+    return ledger
+
+
+def brute(model: Categorizer, payee: str, memo: str = "") -> dict[str, float]:
+    """Multinomial naive Bayes written out in full."""
+    vocabulary = len(model._tokens)
+    documents = sum(model._documents.values())
+    tokens = [token for token in tokenize(payee, memo) if token in model._tokens]
+    seen = {account for token in tokens for account in model._tokens[token]}
+    result = {}
+    for account in seen:
+        total = model._totals[account] + model.smoothing * vocabulary
+        score = math.log(model._documents[account] / documents)
+        for token in tokens:
+            score += math.log((model._tokens[token].get(account, 0) + model.smoothing) / total)
+        result[account] = score
+    return result
+
+
+def test_tokenize():
+    assert tokenize("AH 1234 Utrecht", "Pin-betaling") == ["ah", "utrecht", "pin", "betaling"]
+
+
+@pytest.mark.parametrize("payee", ["Albert Heijn", "Utrecht", "Jumbo Utrecht Centraal", "Shell train Heijn"])
+def test_scores_are_naive_bayes(payee):
+    model = Categorizer()
+    model.update(make_ledger())
+    scores = model.scores(payee)
+    assert scores.keys() == brute(model, payee).keys()
+    for account, score in brute(model, payee).items():
+        assert scores[account] == pytest.approx(score)
+
+
+def test_suggest_and_confidence():
+    model = Categorizer(confidence=0.9)
+    model.update(make_ledger())
+    account, probability = model.suggest("ALBERT HEIJN 1102")
+    assert account == "Expenses:Groceries" and probability > 0.9
+    assert model(Record(0, Money(-5, "EUR"), "Albert Heijn")) == "Expenses:Groceries"
+    assert model(Record(0, Money(-5, "EUR"), "Utrecht")) is None
+    assert model.suggest("unknown words") is None
+    assert "Assets:Bank" not in model.scores("Utrecht")
+
+
+def test_learn_and_unlearn():
+    model = Categorizer()
+    model.learn(["coffee"], "Expenses:Coffee")
+    assert model.suggest("coffee") == ("Expenses:Coffee", 1.0)
+    model.learn(["coffee"], "Expenses:Coffee", -1)
+    assert model.suggest("coffee") is None
+
+
+def test_update_after_back_dated_insert_matches_fresh_model():
+    ledger = make_ledger()
+    model = Categorizer()
+    model.update(ledger)
+    spend(ledger, 1, "Etos Utrecht", "Expenses:Drugstore")
+    ledger.sort()
+    model.update(ledger)
+    fresh = Categorizer()
+    fresh.update(ledger)
+    assert model._tokens == fresh._tokens and model._documents == fresh._documents
+    assert model.scores("Etos Utrecht") == fresh.scores("Etos Utrecht")
+
+
+def test_save_and_load(tmp_path):
+    ledger = make_ledger()
+    model = Categorizer()
+    model.update(ledger)
+    model.save(tmp_path / "model.json")
+    loaded = Categorizer.load(tmp_path / "model.json")
+    assert loaded.scores("Albert Heijn") == pytest.approx(model.scores("Albert Heijn"))
+    spend(ledger, 6, "Jumbo Amsterdam", "Expenses:Groceries")
+    loaded.update(ledger)
+    model.update(ledger)
+    assert loaded.transactions == len(ledger.transactions)
+    assert loaded._documents == model._documents
+
+
+def test_loaded_model_relearns_a_changed_ledger(tmp_path):
+    model = Categorizer()
+    model.update(make_ledger())
+    model.save(tmp_path / "model.json")
+    other = Ledger()
+    for day in range(1, 7):
+        spend(other, day, "Bakery", "Expenses:Food")
+    loaded = Categorizer.load(tmp_path / "model.json")
+    loaded.update(other)
+    assert loaded.suggest("Albert Heijn") is None
+    assert loaded.suggest("Bakery")[0] == "Expenses:Food"
+
+
+def test_empty_model(tmp_path):
+    model = Categorizer.load(tmp_path / "missing.json")
+    model.update(Ledger())
+    assert len(model) == 0 and model.transactions == 0
+    assert model.scores("anything") == {}
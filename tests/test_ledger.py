@@ -0,0 +1,138 @@
+from array import array
+from datetime import date
+
+import pytest
+
+from valedger import Ledger, Money
+from valedger.ledger import INTERNERS
+
+
+def transfer(ledger: Ledger, day: date, payee: str, to: str, source: str, amount: Money) -> int:
+    return ledger.add_transaction(day, payee, [(to, amount), (source, -amount)])
+
+
+def make_ledger() -> Ledger:
+    ledger = Ledger()
+    transfer(ledger, date(2024, 1, 5), "Shop", "Expenses:Food", "Assets:Bank", Money(1250, "EUR", 2))
+    transfer(ledger, date(2024, 1, 2), "Salary", "Assets:Bank", "Income:Salary", Money(300000, "EUR", 2))
+    return ledger
+
+
+def test_empty_ledger():
+    ledger = Ledger()
+    assert len(ledger) == 0
+    assert ledger.is_sorted
+    assert ledger.rows_between() == (0, 0)
+    assert ledger.rows_between(date(2024, 1, 1), date(2025, 1, 1)) == (0, 0)
+    with ledger.date_range() as view:
+        assert len(view) == 0
+
+
+def test_add_transaction_interns_and_scales():
+    ledger = make_ledger()
+    assert len(ledger) == 4
+    assert len(ledger.transactions) == 2
+    assert ledger.postings.columns["amount"].tolist() == [1250, -1250, 300000, -300000]
+    assert ledger.money(ledger.commodities.id("EUR"), 1250) == Money(1250, "EUR", 2)
+
+
+def test_wider_scale_rescales_existing_postings():
+    ledger = make_ledger()
+    transfer(ledger, date(2024, 1, 6), "Fuel", "Expenses:Car", "Assets:Bank", Money(1005, "EUR", 3))
+    assert ledger.scales[ledger.commodities.id("EUR")] == 3
+    assert ledger.postings.columns["amount"][:2].tolist() == [12500, -12500]
+
+
+def test_sort_is_stable_and_remaps_references():
+    ledger = make_ledger()
+    assert not ledger.is_sorted
+    with pytest.raises(ValueError):
+        ledger.rows_between()
+    ledger.sort()
+    assert ledger.is_sorted
+    columns = ledger.postings.columns
+    assert columns["date"].tolist() == [date(2024, 1, 2).toordinal()] * 2 + [date(2024, 1, 5).toordinal()] * 2
+    assert columns["txn"].tolist() == [0, 0, 1, 1]
+    assert ledger.payees.name(ledger.transactions.columns["payee"][0]) == "Salary"
+    assert ledger.transaction_rows(1) == range(2, 4)
+
+
+def test_rows_between():
+    ledger = make_ledger()
+    ledger.sort()
+    assert ledger.rows_between(date(2024, 1, 3)) == (2, 4)
+    assert ledger.rows_between(None, date(2024, 1, 5)) == (0, 2)
+    assert ledger.rows_between(date(2024, 2, 1)) == (4, 4)
+
+
+def test_extend_translates_ids():
+    ledger = make_ledger()
+    other = Ledger()
+    transfer(other, date(2024, 1, 9), "Refund", "Assets:Bank", "Expenses:Food", Money(5, "EUR"))
+    ledger.extend(other)
+    assert len(ledger) == 6
+    assert ledger.accounts.name(ledger.postings.columns["account"][4]) == "Assets:Bank"
+    assert ledger.postings.columns["amount"][4:].tolist() == [500, -500]
+    assert ledger.transactions.columns["first"][-1] == 4
+
+
+def test_view_is_zero_copy():
+    ledger = make_ledger()
+    with ledger.view(1, 3) as view:
+        assert len(view) == 2
+        assert view.amount.tolist() == [-1250, 300000]
+    assert isinstance(ledger.postings.columns["amount"], array)
+
+
+def test_truncate_restores_sort_state():
+    ledger = Ledger()
+    transfer(ledger, date(2024, 1, 5), "Shop", "Expenses:Food", "Assets:Bank", Money(1, "EUR"))
+    mark = ledger.mark()
+    transfer(ledger, date(2024, 1, 1), "Back-dated", "Expenses:Food", "Assets:Bank", Money(1, "EUR"))
+    assert not ledger.is_sorted
+    ledger.truncate(mark)
+    assert ledger.is_sorted
+    assert ledger.rows_between() == (0, 2)
+
+
+def test_append_thaws_restored_ledger():
+    ledger = make_ledger()
+    ledger.sort()
+    columns = {
+        name: {key: memoryview(column) for key, column in table.columns.items()} for name, table in ledger.tables.items()
+    }
+    interners = {name: getattr(ledger, name) for name in INTERNERS}
+    restored = Ledger.restore(interners, memoryview(ledger.scales), columns, True)
+    txn = restored.transactions.append(date(2024, 2, 1).toordinal(), 0, 0, 0, len(restored), 0, 0)
+    restored.append(date(2024, 2, 1).toordinal(), txn, 0, 0, 7)
+    assert restored.postings.columns["amount"][-1] == 7
+    assert len(ledger) == 4
+
+
+def test_generation_changes_when_rows_are_rewritten():
+    ledger = make_ledger()
+    generation = ledger.generation
+    transfer(ledger, date(2024, 1, 9), "Shop", "Expenses:Food", "Assets:Bank", Money(1, "EUR", 2))
+    assert ledger.generation == generation
+    ledger.sort()
+    assert ledger.generation != generation
+    generation = ledger.generation
+    ledger.order_accounts()
+    assert ledger.generation != generation
+    generation = ledger.generation
+    ledger.order_accounts()
+    assert ledger.generation == generation
+    ledger.truncate(ledger.mark())
+    assert ledger.generation != generation
+    assert Ledger().generation != Ledger().generation
+
+
+def test_digest_covers_prefix():
+    ledger = make_ledger()
+    ledger.sort()
+    before = ledger.digest(2)
+    transfer(ledger, date(2024, 1, 9), "Shop", "Expenses:Food", "Assets:Bank", Money(1, "EUR", 2))
+    assert ledger.digest(2) == before
+    transfer(ledger, date(2023, 12, 31), "Back-dated", "Expenses:Food", "Assets:Bank", Money(1, "EUR", 2))
+    ledger.sort()
+    assert ledger.digest(2) != before
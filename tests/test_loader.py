@@ -0,0 +1,103 @@
+from datetime import date
+
+import pytest
+
+from valedger import Money, ParseError, ParseStats, load_journal
+
+MAIN = """\
+2024-03-01 Shop
+    Expenses:Food  10.00 EUR
+    Assets:Bank
+
+include 2023.journal
+
+2024-01-15 Broker
+    Assets:Broker  2 AAPL @ 150 USD
+    Assets:Bank  -300 USD
+"""
+
+YEAR = """\
+2023-06-01 Salary
+    Assets:Bank  2000 EUR
+    Income:Salary
+"""
+
+
+def test_load_journal_follows_includes_and_sorts(tmp_path):
+    (tmp_path / "2023.journal").write_text(YEAR)
+    (tmp_path / "main.journal").write_text(MAIN)
+    stats = ParseStats()
+    ledger = load_journal(tmp_path / "main.journal", stats, workers=1)
+    assert ledger.is_sorted
+    assert len(ledger) == 6
+    dates = ledger.postings.columns["date"]
+    assert dates[0] == date(2023, 6, 1).toordinal()
+    assert dates[-1] == date(2024, 3, 1).toordinal()
+    assert ledger.accounts.is_ordered
+    assert len(stats.files) == 2
+    assert len(ledger.annotations) == 1
+
+
+def test_elided_amount_is_inferred(tmp_path):
+    (tmp_path / "main.journal").write_text(MAIN.replace("include 2023.journal", ""))
+    ledger = load_journal(tmp_path / "main.journal", workers=1)
+    columns = ledger.postings.columns
+    postings = [
+        (ledger.accounts.name(account), ledger.money(commodity, amount))
+        for account, commodity, amount in zip(columns["account"], columns["commodity"], columns["amount"])
+    ]
+    assert postings == [
+        ("Assets:Broker", Money(2, "AAPL")),
+        ("Assets:Bank", Money(-300, "USD")),
+        ("Expenses:Food", Money(1000, "EUR", 2)),
+        ("Assets:Bank", Money(-1000, "EUR", 2)),
+    ]
+
+
+def test_empty_journal(tmp_path):
+    (tmp_path / "main.journal").write_text("; nothing yet\n")
+    ledger = load_journal(tmp_path / "main.journal", workers=1)
+    assert len(ledger) == 0 and ledger.is_sorted
+
+
+def test_missing_include(tmp_path):
+    (tmp_path / "main.journal").write_text("include missing/*.journal\n")
+    with pytest.raises(ParseError):
+        load_journal(tmp_path / "main.journal", workers=1)
+
+
+def test_include_cycle(tmp_path):
+    (tmp_path / "a.journal").write_text("include b.journal\n")
+    (tmp_path / "b.journal").write_text("include a.journal\n")
+    with pytest.raises(ParseError):
+        load_journal(tmp_path / "a.journal", workers=1)
+
+
+def write_years(tmp_path, years):
+    lines = []
+    for year in years:
+        (tmp_path / f"{year}.journal").write_text(YEAR.replace("2023", str(year)))
+        lines.append(f"include {year}.journal\n")
+    (tmp_path / "main.journal").write_text("".join(lines) + MAIN.replace("include 2023.journal", ""))
+    return tmp_path / "main.journal"
+
+
+def columns(ledger):
+    # Interned ids other than accounts follow the order files were parsed in.
+    payees = [ledger.payees.name(payee) for payee in ledger.transactions.columns["payee"]]
+    return ledger.postings.columns, ledger.annotations.columns, list(ledger.accounts), payees
+
+
+def test_parallel_load_matches_sequential(tmp_path):
+    path = write_years(tmp_path, range(2015, 2023))
+    assert columns(load_journal(path, workers=3)) == columns(load_journal(path, workers=1))
+
+
+def test_pool_is_not_started_for_fewer_than_two_files(tmp_path, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("process pool started")
+
+    monkeypatch.setattr("valedger.loader.ProcessPoolExecutor", refuse)
+    (tmp_path / "single.journal").write_text(MAIN.replace("include 2023.journal", ""))
+    assert len(load_journal(tmp_path / "single.journal", workers=4)) == 4
+    assert len(load_journal(write_years(tmp_path, [2022]), workers=4)) == 6
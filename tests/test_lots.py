@@ -0,0 +1,129 @@
+import pytest
+
+from valedger import Inventory, Ledger, Money, load_journal, parse_journal
+from valedger.loader import add_entries
+
+JOURNAL = """\
+2024-01-02 Buy
+  Assets:Broker  10 ACME {100 EUR}
+  Assets:Cash
+2024-02-01 Buy
+  Assets:Broker  10 ACME {120 EUR}
+  Assets:Cash
+2024-03-01 Sell
+  Assets:Broker  -15 ACME @ 130 EUR
+  Assets:Cash
+2024-03-05 Buy
+  Assets:Fund  5 FUND @ 20 EUR
+  Assets:Cash
+"""
+
+
+def journal(tmp_path, text: str, name: str = "main.journal") -> str:
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def eur(value: int) -> Money:
+    return Money(value, "EUR")
+
+
+def test_fifo_and_lifo(tmp_path):
+    ledger = load_journal(journal(tmp_path, JOURNAL), workers=1)
+    broker, acme = ledger.accounts.id("Assets:Broker"), ledger.commodities.id("ACME")
+    fifo = Inventory(ledger)
+    assert [(d.quantity, d.cost, d.proceeds, d.gain) for d in fifo.disposals] == [
+        (10, eur(1000), eur(1300), eur(300)),
+        (5, eur(600), eur(650), eur(50)),
+    ]
+    assert fifo.holding(broker, acme) == (5, eur(600))
+    lifo = Inventory(ledger, methods={"Assets": "lifo"})
+    assert [(d.quantity, d.cost) for d in lifo.disposals] == [(10, eur(1200)), (5, eur(500))]
+    assert lifo.holding(broker, acme) == (5, eur(500))
+
+
+def test_average_and_price_as_cost(tmp_path):
+    ledger = load_journal(journal(tmp_path, JOURNAL), workers=1)
+    inventory = Inventory(ledger, method="average", price_as_cost=True)
+    assert [(d.quantity, d.cost) for d in inventory.disposals] == [(15, eur(1650))]
+    assert inventory.holding(ledger.accounts.id("Assets:Broker"), ledger.commodities.id("ACME")) == (5, eur(550))
+    assert len(inventory.lots(ledger.accounts.id("Assets:Fund"))) == 1
+    assert len(Inventory(ledger).lots(ledger.accounts.id("Assets:Fund"))) == 0
+
+
+def test_average_keeps_cost_of_costless_units_apart():
+    inventory = Inventory(method="average")
+    inventory.add(1, 0, 0, 10, eur(1000))
+    inventory.add(2, 0, 0, 5, None)
+    inventory.add(3, 0, 0, 10, eur(1400))
+    assert inventory.holding(0, 0) == (25, eur(2400))
+    assert [(lot.quantity, lot.cost) for lot in inventory.lots(0)] == [(20, eur(2400)), (5, None)]
+    disposals = inventory.reduce(4, 0, 0, 22)
+    assert [(d.quantity, d.cost) for d in disposals] == [(20, eur(2400)), (2, None)]
+
+
+def test_partial_reductions_add_up_to_the_lot_cost():
+    inventory = Inventory()
+    inventory.add(1, 0, 0, 3, eur(100))
+    costs = [inventory.reduce(day, 0, 0, 1)[0].cost for day in (2, 3, 4)]
+    assert costs == [eur(33), eur(34), eur(33)]
+    assert sum(cost.value for cost in costs) == 100
+
+
+def test_specific_identification():
+    inventory = Inventory(method="specific")
+    first = inventory.add(1, 0, 0, 10, eur(1000))
+    second = inventory.add(2, 0, 0, 10, eur(1500))
+    inventory.add(3, 0, 0, 10, eur(1000))
+    (disposal,) = inventory.reduce(4, 0, 0, 4, cost=eur(600))
+    assert (disposal.lot, disposal.cost) == (second.id, eur(600))
+    (disposal,) = inventory.reduce(5, 0, 0, 2, lot=first.id)
+    assert disposal.lot == first.id
+    oversold = inventory.reduce(6, 0, 0, 30)
+    assert oversold[-1].lot == -1 and oversold[-1].quantity == 6
+    with pytest.raises(ValueError):
+        inventory.reduce(7, 0, 0, 1, lot=first.id)
+    with pytest.raises(ValueError):
+        Inventory(method="hifo")
+
+
+def same(a: Inventory, b: Inventory) -> bool:
+    lots = [(lot.account, lot.commodity, lot.acquired, lot.quantity, lot.cost) for lot in a._lots.values()]
+    other = [(lot.account, lot.commodity, lot.acquired, lot.quantity, lot.cost) for lot in b._lots.values()]
+    strip = [disposal._replace(lot=0) for disposal in a.disposals]
+    return lots == other and strip == [disposal._replace(lot=0) for disposal in b.disposals]
+
+
+def test_update_after_back_dated_insert_matches_fresh_inventory(tmp_path):
+    ledger = load_journal(journal(tmp_path, JOURNAL), workers=1)
+    inventory = Inventory(ledger)
+    late = "2024-03-10 Sell\n  Assets:Broker  -2 ACME @ 140 EUR\n  Assets:Cash\n"
+    add_entries(ledger, parse_journal(journal(tmp_path, late, "late.journal")), "late.journal")
+    ledger.sort()
+    inventory.update(ledger)
+    assert same(inventory, Inventory(ledger))
+    early = "2024-01-01 Buy\n  Assets:Broker  1 ACME {90 EUR}\n  Assets:Cash\n"
+    add_entries(ledger, parse_journal(journal(tmp_path, early, "early.journal")), "early.journal")
+    ledger.sort()
+    inventory.update(ledger)
+    fresh = Inventory(ledger)
+    assert same(inventory, fresh)
+    assert inventory.disposals[0].cost == eur(90)
+
+
+def test_update_after_account_renumbering(tmp_path):
+    ledger = load_journal(journal(tmp_path, JOURNAL), workers=1)
+    inventory = Inventory(ledger)
+    text = "2024-04-01 Buy\n  Assets:Aardvark  1 ACME {90 EUR}\n  Assets:Cash\n"
+    add_entries(ledger, parse_journal(journal(tmp_path, text, "more.journal")), "more.journal")
+    ledger.order_accounts()
+    inventory.update(ledger)
+    assert same(inventory, Inventory(ledger))
+    assert inventory.lots(ledger.accounts.id("Assets:Aardvark"))[0].cost == eur(90)
+
+
+def test_empty_inventory():
+    inventory = Inventory(Ledger())
+    assert len(inventory) == 0 and inventory.disposals == []
+    assert inventory.holding(0, 0) == (0, None)
@@ -0,0 +1,59 @@
+from array import array
+from decimal import Decimal
+
+import pytest
+
+from valedger import Money
+from valedger.money import compare, format_number, parse_number, rescale, round_div, select, total
+
+
+def test_parse_number():
+    assert parse_number("-1,234.50") == (-123450, 2)
+    assert parse_number("+7") == (7, 0)
+    with pytest.raises(ValueError):
+        parse_number("1.2.3")
+
+
+def test_rescale_is_exact():
+    assert rescale(125, 2, 4) == 12500
+    assert rescale(12500, 4, 2) == 125
+    with pytest.raises(ValueError):
+        rescale(125, 2, 1)
+
+
+def test_round_div_rounds_half_to_even():
+    assert [round_div(n, 2) for n in (1, 3, 5, -1, -3)] == [0, 2, 2, 0, -2]
+    assert round_div(10, -4) == -2
+
+
+def test_format_number():
+    assert format_number(-5, 2) == "-0.05"
+    assert format_number(123456789, 2, ",") == "1,234,567.89"
+    assert format_number(42, 0) == "42"
+
+
+def test_arithmetic_aligns_scales():
+    added = Money.parse("1.5", "EUR") + Money.parse("0.25", "EUR")
+    assert (added.value, added.scale) == (175, 2)
+    assert Money.parse("1.50", "EUR") == Money.parse("1.5", "EUR")
+    assert hash(Money.parse("1.50", "EUR")) == hash(Money.parse("1.5", "EUR"))
+    assert 3 * Money(5, "EUR", 1) == Money(15, "EUR", 1)
+    assert Money(1, "EUR") < Money(101, "EUR", 2)
+    with pytest.raises(ValueError):
+        Money(1, "EUR") + Money(1, "USD")
+
+
+def test_decimal_round_trip():
+    amount = Money.from_decimal(Decimal("-12.340"), "USD")
+    assert (amount.value, amount.scale) == (-12340, 3)
+    assert amount.to_decimal() == Decimal("-12.34")
+    assert str(Money.from_decimal(Decimal("1E+2"), "USD")) == "100 USD"
+
+
+def test_column_operations():
+    values = array("q", [5, -3, 10, 0])
+    assert total(memoryview(values)) == 12
+    assert list(compare(values, ">", 0)) == [True, False, True, False]
+    assert select(values, "<=", 0, offset=10).tolist() == [11, 13]
+    with pytest.raises(ValueError):
+        select(values, "<>", 0)
@@ -0,0 +1,77 @@
+from datetime import date
+
+import pytest
+
+from valedger import Money, ParseError, ParseStats, parse_journal
+from valedger.parser import Balance, CommodityDecl, Include, Price, Transaction, parse_amount, parse_posting
+
+JOURNAL = """\
+include other.journal
+commodity 1,000.00 EUR
+P 2024-01-05 EUR 1.09 USD
+
+2024-01-05 * (1234) Grocer | weekly shopping  ; food:, receipt:scanned
+    Expenses:Food            42.10 EUR
+    Assets:Bank:Checking    -42.10 EUR = 1000.00 EUR
+
+2024-01-06 * "Broker" "Buy shares" #invest
+  Assets:Broker  10 AAPL {150.00 USD}
+  Assets:Cash
+
+2024-02-01 balance Assets:Bank:Checking  950.00 EUR
+2024-02-01 open Assets:Savings
+"""
+
+
+def test_parse_journal(tmp_path):
+    path = tmp_path / "main.journal"
+    path.write_text(JOURNAL)
+    stats = ParseStats()
+    entries = list(parse_journal(path, stats))
+    assert [type(entry) for entry in entries] == [Include, CommodityDecl, Price, Transaction, Transaction, Balance]
+    include, commodity, price, grocer, broker, balance = entries
+    assert include == Include("other.journal", 1)
+    assert commodity.scale == 2
+    assert price.price == Money(109, "USD", 2)
+    assert (grocer.payee, grocer.note, grocer.code, grocer.tags, grocer.line) == (
+        "Grocer",
+        "weekly shopping",
+        "1234",
+        ("food", "receipt"),
+        5,
+    )
+    assert grocer.postings[1].assertion == Money(100000, "EUR", 2)
+    assert (broker.payee, broker.note, broker.tags) == ("Broker", "Buy shares", ("invest",))
+    assert broker.postings[0].cost == Money(150000, "USD", 2)
+    assert broker.postings[1].amount is None
+    assert balance == Balance(date(2024, 2, 1).toordinal(), "Assets:Bank:Checking", Money(95000, "EUR", 2), 13)
+    assert stats.transactions == 2 and stats.postings == 4
+    assert stats.bytes == len(JOURNAL.encode())
+
+
+def test_parse_amount_forms():
+    assert parse_amount("-42.10 EUR") == Money(-4210, "EUR", 2)
+    assert parse_amount("$5") == Money(5, "$")
+    assert parse_amount("EUR -1,000.5") == Money(-10005, "EUR", 1)
+    with pytest.raises(ValueError):
+        parse_amount("EUR")
+
+
+def test_parse_posting_prices():
+    posting = parse_posting("Assets:Cash  -2 AAPL @ 160 USD")
+    assert posting.price == Money(320, "USD")
+    assert parse_posting("Assets:Cash  -2 AAPL @@ 300 USD").price == Money(300, "USD")
+
+
+def test_parse_error_has_location(tmp_path):
+    path = tmp_path / "bad.journal"
+    path.write_text("2024-01-01 Shop\n    Expenses:Food  12.x EUR\n")
+    with pytest.raises(ParseError) as error:
+        list(parse_journal(path))
+    assert (error.value.path, error.value.line) == (str(path), 2)
+
+
+def test_empty_journal(tmp_path):
+    path = tmp_path / "empty.journal"
+    path.write_text("")
+    assert list(parse_journal(path)) == []
@@ -0,0 +1,190 @@
+from datetime import date
+from fractions import Fraction
+
+from valedger import Ledger, PriceIndex
+
+
+def price(ledger: Ledger, day: date, commodity: str, value: int, scale: int, quote: str) -> None:
+    ledger.prices.append(day.toordinal(), ledger.commodity(commodity), ledger.commodity(quote), value, scale)
+
+
+def make_ledger() -> Ledger:
+    ledger = Ledger()
+    price(ledger, date(2024, 1, 5), "EUR", 109, 2, "USD")
+    price(ledger, date(2024, 1, 1), "EUR", 108, 2, "USD")
+    price(ledger, date(2024, 1, 9), "EUR", 110, 2, "USD")
+    price(ledger, date(2024, 1, 9), "EUR", 111, 2, "USD")
+    return ledger
+
+
+def brute(ledger: Ledger, commodity: int, quote: int, day: date) -> Fraction | None:
+    """Scan every price directive, as valuation did before the index."""
+    found = None
+    columns = ledger.prices.columns
+    for row in range(len(ledger.prices)):
+        if columns["date"][row] > day.toordinal():
+            continue
+        pair = columns["commodity"][row], columns["quote"][row]
+        if pair in ((commodity, quote), (quote, commodity)) and (found is None or columns["date"][row] >= found[0]):
+            rate = Fraction(columns["price"][row], 10 ** columns["scale"][row])
+            found = columns["date"][row], rate if pair == (commodity, quote) else 1 / rate
+    return None if found is None else found[1]
+
+
+def test_as_of_lookup():
+    ledger = make_ledger()
+    index = PriceIndex(ledger)
+    eur, usd = ledger.commodities.id("EUR"), ledger.commodities.id("USD")
+    assert len(index) == 1
+    assert index.price(eur, usd, date(2023, 12, 31)) is None
+    assert index.price(eur, usd, date(2024, 1, 4)) == Fraction(108, 100)
+    assert index.price(eur, usd, date(2024, 1, 5)) == Fraction(109, 100)
+    assert index.price(eur, usd, date(2024, 2, 1)) == Fraction(111, 100)
+    assert index.price_date(eur, usd, date(2024, 2, 1)) == date(2024, 1, 9).toordinal()
+    assert index.price(usd, eur, date(2024, 1, 6)) == Fraction(100, 109)
+    assert index.price(eur, eur, date(2000, 1, 1)) == 1
+
+
+def test_matches_scanning_the_directives():
+    ledger = make_ledger()
+    price(ledger, date(2024, 1, 7), "USD", 92, 2, "EUR")
+    index = PriceIndex(ledger)
+    eur, usd = ledger.commodities.id("EUR"), ledger.commodities.id("USD")
+    for day in range(date(2023, 12, 30).toordinal(), date(2024, 1, 12).toordinal()):
+        day = date.fromordinal(day)
+        assert index.price(eur, usd, day) == brute(ledger, eur, usd, day)
+        assert index.price(usd, eur, day) == brute(ledger, usd, eur, day)
+
+
+def test_convert_rounds_half_to_even():
+    ledger = Ledger()
+    price(ledger, date(2024, 1, 1), "EUR", 15, 1, "USD")
+    index = PriceIndex(ledger)
+    eur, usd = ledger.commodities.id("EUR"), ledger.commodities.id("USD")
+    assert index.convert(1, 2, eur, usd, date(2024, 1, 1), 2) == 2
+    assert index.convert(3, 2, eur, usd, date(2024, 1, 1), 2) == 4
+    assert index.convert(1000, 2, eur, usd, date(2024, 1, 1), 0) == 15
+    assert index.convert(1000, 2, eur, usd, date(2023, 1, 1), 0) is None
+
+
+def test_update_takes_in_new_prices():
+    ledger = make_ledger()
+    index = PriceIndex(ledger)
+    eur, usd = ledger.commodities.id("EUR"), ledger.commodities.id("USD")
+    assert index.price(eur, usd, date(2024, 1, 3)) == Fraction(108, 100)
+    price(ledger, date(2024, 1, 2), "EUR", 120, 2, "USD")
+    index.update(ledger)
+    assert index.price(eur, usd, date(2024, 1, 3)) == Fraction(120, 100)
+    assert index.rows == len(ledger.prices)
+
+
+def test_update_after_truncate_matches_fresh_index():
+    ledger = make_ledger()
+    mark = ledger.mark()
+    price(ledger, date(2024, 1, 2), "EUR", 120, 2, "USD")
+    index = PriceIndex(ledger)
+    ledger.truncate(mark)
+    price(ledger, date(2024, 1, 2), "EUR", 130, 2, "USD")
+    index.update(ledger)
+    fresh = PriceIndex(ledger)
+    eur, usd = ledger.commodities.id("EUR"), ledger.commodities.id("USD")
+    assert index.price(eur, usd, date(2024, 1, 3)) == fresh.price(eur, usd, date(2024, 1, 3)) == Fraction(130, 100)
+
+
+def test_empty_index():
+    index = PriceIndex(Ledger())
+    assert len(index) == 0
+    assert index.price(0, 1, date(2024, 1, 1)) is None
+    assert index.price_date(0, 1, date(2024, 1, 1)) is None
+
+
+def chain() -> Ledger:
+    ledger = Ledger()
+    price(ledger, date(2024, 1, 1), "CHF", 1, 0, "EUR")
+    price(ledger, date(2024, 1, 1), "EUR", 160, 0, "JPY")
+    return ledger
+
+
+def ids(ledger: Ledger, *names: str) -> tuple[int, ...]:
+    return tuple(ledger.commodities.id(name) for name in names)
+
+
+def test_cross_rate_through_the_graph():
+    ledger = chain()
+    price(ledger, date(2024, 1, 3), "JPY", 1, 3, "KRW")
+    index = PriceIndex(ledger)
+    chf, eur, jpy, krw = ids(ledger, "CHF", "EUR", "JPY", "KRW")
+    assert index.path(chf, jpy, date(2024, 1, 2)) == (chf, eur, jpy)
+    assert index.price(chf, jpy, date(2024, 1, 2)) == 160
+    assert index.price(jpy, chf, date(2024, 1, 2)) == Fraction(1, 160)
+    assert index.price(chf, krw, date(2024, 1, 2)) is None
+    assert index.price(chf, krw, date(2024, 1, 3)) == Fraction(160, 1000)
+    assert index.price_date(chf, krw, date(2024, 1, 5)) == date(2024, 1, 1).toordinal()
+
+
+
+def test_zero_price_has_no_inverse():
+    ledger = Ledger()
+    price(ledger, date(2024, 1, 1), "XYZ", 5, 0, "USD")
+    price(ledger, date(2024, 1, 10), "XYZ", 0, 0, "USD")
+    price(ledger, date(2024, 1, 1), "EUR", 108, 2, "USD")
+    index = PriceIndex(ledger)
+    xyz, usd, eur = ids(ledger, "XYZ", "USD", "EUR")
+    assert index.price(usd, xyz, date(2024, 1, 5)) == Fraction(1, 5)
+    assert index.price(xyz, usd, date(2024, 1, 12)) == 0
+    assert index.price(usd, xyz, date(2024, 1, 12)) is None
+    assert index.price(xyz, eur, date(2024, 1, 12)) == 0
+    assert index.price(eur, xyz, date(2024, 1, 12)) is None
+    assert index.price(eur, xyz, date(2024, 1, 5)) == Fraction(108, 500)
+
+
+def test_direct_price_wins_over_a_cached_chain():
+    ledger = chain()
+    price(ledger, date(2024, 1, 10), "CHF", 170, 0, "JPY")
+    index = PriceIndex(ledger)
+    chf, eur, jpy = ids(ledger, "CHF", "EUR", "JPY")
+    assert index.price(chf, jpy, date(2024, 1, 5)) == 160
+    assert index.price(chf, jpy, date(2024, 1, 12)) == 170
+    assert index.path(chf, jpy, date(2024, 1, 12)) == (chf, jpy)
+    assert index.path(chf, jpy, date(2024, 1, 6)) == (chf, eur, jpy)
+
+
+def test_shorter_chain_opening_later_in_the_bucket():
+    ledger = chain()
+    price(ledger, date(2024, 1, 1), "JPY", 1, 3, "KRW")
+    price(ledger, date(2024, 1, 10), "EUR", 1500, 0, "KRW")
+    index = PriceIndex(ledger)
+    chf, eur, jpy, krw = ids(ledger, "CHF", "EUR", "JPY", "KRW")
+    assert index.path(chf, krw, date(2024, 1, 5)) == (chf, eur, jpy, krw)
+    assert index.path(chf, krw, date(2024, 1, 12)) == (chf, eur, krw)
+    assert index.price(chf, krw, date(2024, 1, 12)) == 1500
+
+
+def test_adding_prices_invalidates_cached_rates_and_paths():
+    ledger = chain()
+    index = PriceIndex(ledger)
+    chf, jpy = ids(ledger, "CHF", "JPY")
+    assert index.price(chf, jpy, date(2024, 1, 5)) == 160
+    price(ledger, date(2024, 1, 4), "CHF", 170, 0, "JPY")
+    index.update(ledger)
+    assert index.price(chf, jpy, date(2024, 1, 5)) == 170
+    price(ledger, date(2024, 1, 5), "EUR", 150, 0, "JPY")
+    price(ledger, date(2024, 1, 5), "JPY", 1, 2, "CHF")
+    index.update(ledger)
+    assert index.price(chf, jpy, date(2024, 1, 5)) == 100
+
+
+def test_cached_lookups_match_a_fresh_index():
+    ledger = Ledger()
+    names = ["CHF", "EUR", "GBP", "JPY", "USD"]
+    for step, (first, second) in enumerate([(0, 1), (1, 3), (2, 4), (4, 3), (0, 3), (1, 2), (2, 3)]):
+        for day in range(step * 4 + 1, 29, 6):
+            price(ledger, date(2024, 1, day), names[first], 100 + 7 * step + day, 2, names[second])
+    index = PriceIndex(ledger, bucket=16)
+    days = range(date(2024, 1, 1).toordinal(), date(2024, 2, 1).toordinal())
+    for day in [*days, *reversed(days)]:
+        for commodity in range(len(names)):
+            for quote in range(len(names)):
+                fresh = PriceIndex(ledger)
+                assert index.price(commodity, quote, day) == fresh.price(commodity, quote, day)
+                assert index.path(commodity, quote, day) == fresh.path(commodity, quote, day)
@@ -0,0 +1,155 @@
+import re
+from datetime import date
+from fractions import Fraction
+
+import pytest
+
+from valedger import Ledger, Money, TextIndex, compile_query, parse_query
+from valedger.query import And, Not, Or, Term, _period, select
+from valedger.search import tokenize
+
+
+def test_parse_query():
+    assert parse_query("") == And(())
+    assert parse_query("expenses:food amt:>100") == And((Term("account", "expenses:food"), Term("amount", ">100")))
+    assert parse_query('(payee:amazon or payee:"bol com") -tag:refund') == And(
+        (Or((Term("payee", "amazon"), Term("payee", "bol com"))), Not(Term("tag", "refund")))
+    )
+    assert parse_query("a or b and c") == Or((Term("account", "a"), And((Term("account", "b"), Term("account", "c")))))
+    assert parse_query("amt:-5") == Term("amount", "-5")
+    for invalid in ("(a", "a )", "not", "a or"):
+        with pytest.raises(ValueError):
+            parse_query(invalid)
+
+
+def test_period():
+    assert _period("2024") == (date(2024, 1, 1).toordinal(), date(2025, 1, 1).toordinal())
+    assert _period("2024-12") == (date(2024, 12, 1).toordinal(), date(2025, 1, 1).toordinal())
+    assert _period("2024/03/05") == (date(2024, 3, 5).toordinal(), date(2024, 3, 6).toordinal())
+    with pytest.raises(ValueError):
+        _period("2024-xx")
+
+
+def holds(ledger: Ledger, node, row: int) -> bool:
+    """Evaluate *node* on posting *row* straight from the columns."""
+    if isinstance(node, And):
+        return all(holds(ledger, item, row) for item in node.items)
+    if isinstance(node, Or):
+        return any(holds(ledger, item, row) for item in node.items)
+    if isinstance(node, Not):
+        return not holds(ledger, node.item, row)
+    columns = ledger.postings.columns
+    txn = columns["txn"][row]
+    field, value = node
+    if field == "account":
+        name = ledger.accounts.name(columns["account"][row])
+        if value in ledger.accounts:
+            return name == value or name.startswith(value + ":")
+        return re.search(value, name, re.IGNORECASE) is not None
+    if field == "date":
+        first, dots, last = value.partition("..")
+        day = columns["date"][row]
+        return (not first or day >= _period(first)[0]) and (
+            (not last and dots) or day < (_period(last)[0] if dots else _period(first)[1])
+        )
+    if field == "amount":
+        prefix = re.match(r"(<=|>=|<|>|=)?", value)[0]
+        operator, threshold = prefix or "=", Fraction(value[len(prefix) :])
+        amount = Fraction(columns["amount"][row], 10 ** ledger.scales[columns["commodity"][row]])
+        return {
+            "<": amount < threshold,
+            "<=": amount <= threshold,
+            ">": amount > threshold,
+            ">=": amount >= threshold,
+            "=": amount == threshold,
+        }[operator]
+    if field == "commodity":
+        return ledger.commodities.name(columns["commodity"][row]) == value
+    if field == "tag":
+        tags = ledger.tag_rows.columns
+        return any(
+            txn == tagged and ledger.tags.name(tag).casefold() == value.casefold()
+            for tagged, tag in zip(tags["txn"], tags["tag"])
+        )
+    transactions = ledger.transactions.columns
+    texts = []
+    if field in ("payee", "text"):
+        texts.append(ledger.payees.name(transactions["payee"][txn]))
+    if field in ("note", "text"):
+        texts.append(ledger.notes.name(transactions["note"][txn]))
+    words = tokenize(value)
+    have = {word for text in texts for word in tokenize(text)}
+    return bool(words) and all(word in have for word in words[:-1]) and any(word.startswith(words[-1]) for word in have)
+
+
+QUERIES = [
+    "expenses:food",
+    "expenses",
+    "^assets:bank:(usd|gbp)$",
+    "date:2016",
+    "date:2016-02..2016-05",
+    "date:..2015-03 cur:USD",
+    "date:2017-06..",
+    "amt:>100 amt:<=250.5",
+    "amt:-21.40",
+    "amt:>=0.005",
+    "cur:GBP or cur:CHF",
+    "payee:power",
+    "payee:power comp",
+    "note:purch",
+    "text:broker initech",
+    "tag:batch",
+    "not tag:batch -expenses",
+    "(payee:cinema or payee:bakery) expenses:housing date:2016..2017",
+    "payee:nobody",
+    "cur:XYZ",
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_select_matches_evaluating_every_row(synthetic, query):
+    synthetic.order_accounts()
+    expected = [row for row in range(len(synthetic)) if holds(synthetic, parse_query(query), row)]
+    assert select(synthetic, query).tolist() == expected
+    assert select(synthetic, query, TextIndex(synthetic)).tolist() == expected
+
+
+def test_explain_orders_index_steps_first(synthetic):
+    plan = compile_query(synthetic, "amt:>100 payee:power date:2016", TextIndex(synthetic))
+    lines = plan.explain().splitlines()
+    assert lines[1].strip() == "all of"
+    assert lines[2].strip().startswith("index") and lines[3].strip().startswith("index")
+    assert lines[4].strip().startswith("filter amount")
+    assert "scan" in compile_query(synthetic, "payee:power").explain()
+
+
+def test_invalid_terms(synthetic):
+    with pytest.raises(ValueError):
+        select(synthetic, "amt:>abc")
+    with pytest.raises(ValueError):
+        select(synthetic, "acct:(")
+    with pytest.raises(ValueError):
+        select(synthetic, "date:tomorrow")
+    unsorted = Ledger()
+    for day in (5, 1):
+        unsorted.add_transaction(date(2024, 1, day), "Shop", [("Expenses:Food", Money(1, "EUR"))])
+    with pytest.raises(ValueError):
+        select(unsorted, "expenses")
+
+
+def test_index_updated_after_back_dated_insert(synthetic):
+    index = TextIndex(synthetic)
+    amount = Money(999, "EUR", 2)
+    synthetic.add_transaction(date(2015, 1, 2), "Zoo", [("Expenses:Gifts", amount), ("Assets:Bank:Checking", -amount)])
+    synthetic.sort()
+    index.update(synthetic)
+    for query in ("payee:zoo", "payee:cinema date:2015-01", "text:purchase amt:>200"):
+        synthetic.order_accounts()
+        expected = [row for row in range(len(synthetic)) if holds(synthetic, parse_query(query), row)]
+        assert select(synthetic, query, index).tolist() == expected
+
+
+def test_empty_ledger():
+    ledger = Ledger()
+    assert select(ledger, "").tolist() == []
+    assert select(ledger, "expenses date:2024 amt:>5 payee:shop", TextIndex(ledger)).tolist() == []
@@ -0,0 +1,159 @@
+from datetime import date
+
+import pytest
+
+from valedger import BalanceIndex, Checkpoints, Ledger, Money, Register
+
+
+def post(ledger: Ledger, day: date, account: str, amount: str, commodity: str = "EUR") -> None:
+    money = Money.parse(amount, commodity)
+    ledger.add_transaction(day, "", [(account, money), ("Equity", -money)])
+
+
+def brute(ledger: Ledger, accounts: range, start: int | None = None, end: int | None = None) -> list[tuple]:
+    """Every posting of *accounts* dated in ``[start, end)`` and the balance after it."""
+    columns = ledger.postings.columns
+    running: dict[int, int] = {}
+    lines = []
+    for row, (day, account, commodity, amount) in enumerate(
+        zip(columns["date"], columns["account"], columns["commodity"], columns["amount"])
+    ):
+        if account not in accounts or (end is not None and day >= end):
+            continue
+        running[commodity] = running.get(commodity, 0) + amount
+        if start is None or day >= start:
+            lines.append((row, day, account, commodity, amount, running[commodity]))
+    return lines
+
+
+def shape(lines) -> list[tuple]:
+    return [(line.row, line.day, line.account, line.commodity, line.amount, line.balance) for line in lines]
+
+
+@pytest.fixture(params=["balances", "checkpoints"])
+def index(request, synthetic):
+    synthetic.order_accounts()
+    return BalanceIndex(synthetic) if request.param == "balances" else Checkpoints(synthetic, 50)
+
+
+@pytest.mark.parametrize("account", ["Assets", "Assets:Bank:Checking", "Expenses:Food"])
+def test_running_balances_match_a_scan(synthetic, index, account):
+    register = Register(synthetic, account, index=index)
+    expected = brute(synthetic, synthetic.account_range(account))
+    assert len(register) == len(expected)
+    assert shape(register) == expected
+    for position in range(0, len(register), 97):
+        assert shape(register.lines(position, position + 5)) == expected[position : position + 5]
+
+
+def test_windows_open_with_the_balance_before_them(synthetic, index):
+    dates = synthetic.postings.columns["date"]
+    accounts = synthetic.account_range("Assets")
+    windows = ((dates[100], dates[900]), (dates[len(dates) // 2], None), (None, dates[50]), (dates[7], dates[7]))
+    for start, end in windows:
+        register = Register(synthetic, "Assets", start, end, index)
+        assert shape(register) == brute(synthetic, accounts, start, end)
+        if len(register):
+            assert shape(register.page(1, 10)) == brute(synthetic, accounts, start, end)[10:20]
+
+
+def test_same_day_postings_of_the_first_page():
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 1), "Assets:Bank", "10")
+    post(ledger, date(2024, 1, 2), "Assets:Bank", "1")
+    post(ledger, date(2024, 1, 2), "Assets:Cash", "5")
+    post(ledger, date(2024, 1, 2), "Assets:Bank", "2")
+    post(ledger, date(2024, 1, 3), "Assets:Bank", "4")
+    ledger.sort()
+    bank = ledger.account_range("Assets:Bank")
+    for index in (BalanceIndex(ledger), Checkpoints(ledger, 1)):
+        register = Register(ledger, "Assets:Bank", date(2024, 1, 2), index=index)
+        assert [line.balance for line in register] == [11, 13, 17]
+        assert register.balances(1) == {0: 11}
+        assert register.balances(len(register)) == {0: 17}
+        assert shape(register[1:]) == brute(ledger, bank, date(2024, 1, 2).toordinal())[1:]
+
+
+def test_pages_slices_and_positions(synthetic, index):
+    register = Register(synthetic, "Assets", index=index)
+    expected = shape(register)
+    assert shape(register.page(2, 50)) == expected[100:150]
+    assert register.page(len(register), 50) == []
+    assert shape(register[10:40:3]) == expected[10:40:3]
+    assert shape(register[-5:]) == expected[-5:]
+    assert register[::-1] and shape(register[::-1]) == expected[::-1]
+    assert shape([register[-1]]) == expected[-1:]
+    assert shape([register[3]]) == expected[3:4]
+    with pytest.raises(IndexError):
+        register[len(register)]
+    with pytest.raises(IndexError):
+        register[-len(register) - 1]
+
+
+def test_seek(synthetic, index):
+    register = Register(synthetic, "Expenses:Food", index=index)
+    dates = synthetic.postings.columns["date"]
+    for day in range(dates[0] - 1, dates[-1] + 2, 29):
+        position = register.seek(date.fromordinal(day))
+        assert all(line.day < day for line in register[:position])
+        assert all(line.day >= day for line in register[position:])
+
+
+
+class Counted:
+    """A column that counts the values read from it."""
+
+    def __init__(self, column) -> None:
+        self.column = column
+        self.reads = 0
+
+    def __len__(self) -> int:
+        return len(self.column)
+
+    def __getitem__(self, position):
+        found = self.column[position]
+        self.reads += len(found) if isinstance(position, slice) else 1
+        return found
+
+
+def test_a_page_reads_only_its_own_postings(synthetic):
+    synthetic.order_accounts()
+    index = BalanceIndex(synthetic)
+    expected = shape(Register(synthetic, "Assets", index=index).page(5, 20))
+    columns = synthetic.postings.columns
+    counted = columns["account"] = Counted(columns["account"])
+    register = Register(synthetic, "Assets", index=index)
+    assert shape(register.page(5, 20)) == expected
+    assert register.seek(date.fromordinal(expected[0][1])) <= 100
+    assert counted.reads == 20
+
+
+def test_back_dated_insert(synthetic, index):
+    post(synthetic, date.fromordinal(synthetic.postings.columns["date"][300]), "Assets:Bank:Checking", "123.45")
+    synthetic.sort()
+    index.update(synthetic)
+    register = Register(synthetic, "Assets", index=index)
+    assert shape(register) == shape(Register(synthetic, "Assets"))
+    assert shape(register) == brute(synthetic, synthetic.account_range("Assets"))
+
+
+def test_empty():
+    ledger = Ledger()
+    for index in (None, Checkpoints(ledger)):
+        register = Register(ledger, range(0, 10), index=index)
+        assert len(register) == 0
+        assert list(register) == [] and register.page(0) == [] and register[:] == []
+        assert register.balances(0) == {}
+        assert register.seek(date(2024, 1, 1)) == 0
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 1), "Assets:Bank", "1")
+    register = Register(ledger, "Assets:Bank", date(2025, 1, 1))
+    assert len(register) == 0 and register.balances(0) == {0: 1}
+
+
+def test_unsorted_ledger():
+    ledger = Ledger()
+    post(ledger, date(2024, 1, 2), "Assets:Bank", "1")
+    post(ledger, date(2024, 1, 1), "Assets:Bank", "1")
+    with pytest.raises(ValueError):
+        Register(ledger, "Assets:Bank")
@@ -0,0 +1,108 @@
+import pytest
+
+from valedger.errors import ParseError
+from valedger.importers import CategoryRule, Record, RuleSet, parse_rules
+from valedger.importers.rules import Automaton, required_literal
+from valedger.money import Money
+
+
+@pytest.mark.parametrize(
+    "pattern, literal",
+    [
+        (r"^albert heijn\b", "albert heijn"),
+        (r"shop\.nl", "shop.nl"),
+        (r"ab?cdef", "cdef"),
+        (r"netflix|spotify", ""),
+        (r"\x41mazon", "mazon"),
+        (r"café central", "café central"),
+        (r"\N{EURO SIGN}shop", "shop"),
+        (r"order \d+ was paid", " was paid"),
+        (r"(?:refund\.)?amazon", "amazon"),
+        (r"[\]x]prime", "prime"),
+        (r"(?x) a b c d", ""),
+        (r"ab{2}cdef", "cdef"),
+    ],
+)
+def test_required_literal(pattern, literal):
+    assert required_literal(pattern) == literal
+
+
+def test_automaton_finds_overlapping_words():
+    automaton = Automaton([("he", 2), ("she", 1), ("hers", 0)])
+    assert automaton.find_all("ushers") == {0, 1, 2}
+    assert automaton.search("ushers") == 0
+    assert automaton.search("nothing") == -1
+
+
+def brute(rules: list[CategoryRule], payee: str, memo: str = "") -> CategoryRule | None:
+    import re
+
+    for rule in rules:
+        text = payee if rule.field == "payee" else memo if rule.field == "memo" else f"{payee}\n{memo}"
+        if rule.literal and rule.pattern.casefold() in text.casefold():
+            return rule
+        if not rule.literal and re.search(rule.pattern, text, re.IGNORECASE):
+            return rule
+    return None
+
+
+RULES = [
+    CategoryRule(r"(ab)c\1", "Expenses:Backreference"),
+    CategoryRule(r"(?P<word>xy)z(?P=word)", "Expenses:Named"),
+    CategoryRule(r"(?P<r0>q)", "Expenses:Clash"),
+    CategoryRule(r"^albert heijn\b", "Expenses:Groceries", payee="Albert Heijn"),
+    CategoryRule("netflix", "Expenses:Subscriptions", "memo", literal=True),
+    CategoryRule(r"\x41mazon", "Expenses:Shopping"),
+    CategoryRule(r"^(ah|jumbo)\b", "Expenses:Groceries"),
+    CategoryRule(r"\d{4}", "Expenses:Numbered", "text"),
+]
+
+
+@pytest.mark.parametrize(
+    "payee, memo",
+    [
+        ("abcab", ""),
+        ("abcac", ""),
+        ("xyzxy", ""),
+        ("xyzyx", ""),
+        ("Q", ""),
+        ("Albert Heijn 1234", ""),
+        ("Store", "NETFLIX.COM"),
+        ("amazon", ""),
+        ("Amazon EU", ""),
+        ("AH to go", ""),
+        ("Card", "ref 2024"),
+        ("Nothing", "here"),
+    ],
+)
+def test_ruleset_matches_like_trying_each_rule(payee, memo):
+    assert RuleSet(RULES).match(payee, memo) == brute(RULES, payee, memo)
+
+
+def test_apply_sets_counter_and_payee():
+    record = Record(0, Money(-5, "EUR"), "ALBERT HEIJN 1234", account="Assets:Bank")
+    (result,) = RuleSet(RULES[3:]).apply([record])
+    assert (result.counter, result.payee) == ("Expenses:Groceries", "Albert Heijn")
+    (kept,) = RuleSet(RULES[3:]).apply([record._replace(counter="Expenses:Other")])
+    assert kept.counter == "Expenses:Other"
+
+
+def test_parse_rules():
+    rules = parse_rules(
+        [
+            "# field operator pattern -> account = payee",
+            r"payee ~ ^albert heijn\b -> Expenses:Groceries = Albert Heijn",
+            "memo contains netflix -> Expenses:Subscriptions",
+        ]
+    )
+    assert len(rules) == 2
+    assert rules.match("Albert Heijn 12").payee == "Albert Heijn"
+    assert rules.match("Card", "Netflix").account == "Expenses:Subscriptions"
+    with pytest.raises(ParseError):
+        parse_rules(["amount ~ 5 -> Expenses:Other"])
+    with pytest.raises(ParseError):
+        parse_rules(["payee ~ ( -> Expenses:Other"])
+
+
+def test_empty_ruleset():
+    assert RuleSet().match("anything") is None
@@ -0,0 +1,131 @@
+from datetime import date
+
+import pytest
+
+from valedger import Ledger, Money, TextIndex
+from valedger.search import intersect, tokenize, union
+
+
+def buy(ledger: Ledger, day: int, payee: str, note: str = "", tags: tuple[str, ...] = ()) -> None:
+    amount = Money(100, "EUR", 2)
+    txn = ledger.add_transaction(date(2024, 1, day), payee, [("Expenses:Shop", amount), ("Assets:Bank", -amount)], note)
+    for tag in tags:
+        ledger.tag_rows.append(txn, ledger.tags.intern(tag))
+
+
+def make_ledger() -> Ledger:
+    ledger = Ledger()
+    buy(ledger, 1, "Amazon EU", "books", ("online",))
+    buy(ledger, 2, "bol.com", "Amazon gift card")
+    buy(ledger, 3, "Bol.com", "lamp", ("online", "home"))
+    ledger.sort()
+    return ledger
+
+
+def brute(ledger: Ledger, field: str, text: str) -> list[int]:
+    """Rows whose *field* has every word of *text*, the last one as a prefix, by scanning."""
+    words = tokenize(text)
+    columns = ledger.transactions.columns
+    found = []
+    for txn in range(len(ledger.transactions)):
+        texts = []
+        if field in ("payee", "text"):
+            texts.append(ledger.payees.name(columns["payee"][txn]))
+        if field in ("note", "text"):
+            texts.append(ledger.notes.name(columns["note"][txn]))
+        have = {word for text in texts for word in tokenize(text)}
+        if all(word in have for word in words[:-1]) and any(word.startswith(words[-1]) for word in have):
+            found.extend(ledger.transaction_rows(txn))
+    return found
+
+
+def test_sorted_row_lists():
+    assert intersect([[1, 3, 5, 7], [3, 7, 9], [0, 3, 7]]).tolist() == [3, 7]
+    assert intersect([]).tolist() == []
+    assert union([[5, 1], [1, 3]]).tolist() == [1, 3, 5]
+
+
+@pytest.mark.parametrize(
+    "field, text", [("payee", "bol"), ("payee", "amazon eu"), ("note", "am"), ("text", "amazon"), ("text", "bol lamp")]
+)
+def test_match_like_a_scan(field, text):
+    ledger = make_ledger()
+    assert TextIndex(ledger).match(field, text).tolist() == brute(ledger, field, text)
+
+
+def test_lookup_and_tags():
+    index = TextIndex(make_ledger())
+    assert index.lookup("payee", "COM").tolist() == [2, 3, 4, 5]
+    assert index.match("tag", "Online").tolist() == [0, 1, 4, 5]
+    assert index.match("payee", "  ").tolist() == []
+    assert index.lookup("note", "missing").tolist() == []
+
+
+def test_update_after_back_dated_insert_matches_fresh_index():
+    ledger = make_ledger()
+    index = TextIndex(ledger)
+    buy(ledger, 1, "Zalando", tags=("clothes",))
+    ledger.sort()
+    index.update(ledger)
+    fresh = TextIndex(ledger)
+    assert index.match("payee", "bol").tolist() == fresh.match("payee", "bol").tolist() == [4, 5, 6, 7]
+    assert index.match("tag", "clothes").tolist() == [2, 3]
+    buy(ledger, 9, "bol.com")
+    index.update(ledger)
+    assert index.match("payee", "bol").tolist() == [4, 5, 6, 7, 8, 9]
+
+
+
+def test_update_takes_tags_of_new_and_continued_transactions():
+    ledger = make_ledger()
+    buy(ledger, 1, "Zalando", tags=("clothes",))
+    ledger.sort()
+    # Sorted, the tags table is no longer in transaction order.
+    assert ledger.tag_rows.columns["txn"].tolist() != sorted(ledger.tag_rows.columns["txn"])
+    index = TextIndex(ledger)
+    buy(ledger, 9, "Ikea", tags=("home",))
+    index.update(ledger)
+    txn = len(ledger.transactions) - 1
+    ledger.append(date(2024, 1, 9).toordinal(), txn, ledger.accounts.intern("Expenses:Fees"), 0, 5)
+    index.update(ledger)
+    fresh = TextIndex(ledger)
+    for tag in ("home", "online", "clothes"):
+        assert index.match("tag", tag).tolist() == fresh.match("tag", tag).tolist()
+    assert index.match("tag", "home").tolist() == [6, 7, 8, 9, 10]
+
+
+def test_save_and_load(tmp_path):
+    ledger = make_ledger()
+    index = TextIndex(ledger)
+    index.save(tmp_path / "text.vlx")
+    buy(ledger, 4, "Amazon EU")
+    loaded = TextIndex.load(tmp_path / "text.vlx", ledger)
+    assert loaded.match("payee", "amazon").tolist() == [0, 1, 6, 7]
+    loaded.save(tmp_path / "text.vlx")
+    again = TextIndex.load(tmp_path / "text.vlx")
+    assert (again.rows, again.last_day) == (len(ledger), date(2024, 1, 4).toordinal())
+    assert again.match("text", "amazon").tolist() == brute(ledger, "text", "amazon")
+
+
+def test_load_rebuilds_for_changed_postings(tmp_path):
+    ledger = make_ledger()
+    TextIndex(ledger).save(tmp_path / "text.vlx")
+    buy(ledger, 1, "Zalando")
+    ledger.sort()
+    loaded = TextIndex.load(tmp_path / "text.vlx", ledger)
+    assert loaded.match("payee", "bol").tolist() == brute(ledger, "payee", "bol")
+    other = Ledger()
+    buy(other, 1, "Bakery")
+    buy(other, 2, "Bakery")
+    buy(other, 3, "Bakery")
+    loaded = TextIndex.load(tmp_path / "text.vlx", other)
+    assert loaded.match("payee", "bol").tolist() == []
+    assert loaded.match("payee", "bakery").tolist() == [0, 1, 2, 3, 4, 5]
+
+
+def test_empty_index(tmp_path):
+    index = TextIndex.load(tmp_path / "missing.vlx", Ledger())
+    assert len(index) == 0 and index.rows == 0
+    assert index.match("text", "anything").tolist() == []
+    index.save(tmp_path / "empty.vlx")
+    assert len(TextIndex.load(tmp_path / "empty.vlx")) == 0
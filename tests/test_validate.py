@@ -0,0 +1,85 @@
+from datetime import date
+
+from valedger import BalanceIndex, Cache, Ledger, Money, load_cached, load_journal, parse_journal, validate
+from valedger.loader import add_entries
+
+JOURNAL = """\
+2024-01-01 Salary
+  Assets:Bank  1000.00 EUR
+  Income:Salary  -1000.00 EUR
+
+2024-01-02 Shop
+  Expenses:Food  12.50 EUR
+  Assets:Bank  -12.50 EUR = 987.50 EUR
+
+2024-01-03 Broker
+  Assets:Broker  3 ACME {33.33 EUR}
+  Assets:Bank  -99.99 EUR
+
+2024-01-04 balance Assets:Bank  887.51 EUR
+2024-01-05 balance Assets:Broker  3 ACME
+"""
+
+
+def write(tmp_path, text: str, name: str = "main.journal") -> str:
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_valid_journal(tmp_path):
+    assert validate(load_journal(write(tmp_path, JOURNAL), workers=1)) == []
+
+
+def test_problems_carry_their_location(tmp_path):
+    text = JOURNAL.replace("-12.50 EUR = 987.50", "-12.50 EUR = 990.00").replace("887.51 EUR", "800.00 EUR")
+    text += "\n2024-01-06 Typo\n  Expenses:Food  5.00 EUR\n  Assets:Bank  -4.00 EUR\n"
+    path = write(tmp_path, text)
+    problems = validate(load_journal(path, workers=1))
+    assert [(problem.kind, problem.account, problem.path, problem.line) for problem in problems] == [
+        ("assertion", "Assets:Bank", path, 5),
+        ("balance", "Assets:Bank", path, 13),
+        ("unbalanced", "", path, 16),
+    ]
+    assertion, balance, unbalanced = problems
+    assert (assertion.expected, assertion.actual) == (Money(99000, "EUR", 2), Money(98750, "EUR", 2))
+    assert (balance.expected, balance.actual) == (Money(80000, "EUR", 2), Money(88751, "EUR", 2))
+    assert unbalanced.actual == Money(100, "EUR", 2)
+    assert str(balance) == (
+        f"{path}:13: balance assertion failed for Assets:Bank on 2024-01-04: expected 800.00 EUR, found 887.51 EUR"
+    )
+
+
+def test_balance_locations_survive_the_cache(tmp_path):
+    path = write(tmp_path, JOURNAL.replace("balance Assets:Broker  3 ACME", "balance Assets:Broker  2 ACME"))
+    cache = Cache(tmp_path / "cache")
+    load_cached(path, workers=1, cache=cache)
+    (problem,) = validate(load_cached(path, workers=1, cache=cache))
+    assert (problem.kind, problem.path, problem.line) == ("balance", path, 14)
+
+
+def test_included_file_locations(tmp_path):
+    other = write(tmp_path, "2024-02-01 balance Assets:Bank  1.00 EUR\n", "other.journal")
+    path = write(tmp_path, JOURNAL + "include other.journal\n")
+    (problem,) = validate(load_journal(path, workers=1))
+    assert (problem.path, problem.line) == (other, 1)
+
+
+def test_revalidate_after_back_dated_insert(tmp_path):
+    ledger = load_journal(write(tmp_path, JOURNAL), workers=1)
+    index = BalanceIndex()
+    assert validate(ledger, index) == []
+    late = "2024-01-01 Refund\n  Assets:Bank  1.00 EUR\n  Income:Refunds  -1.00 EUR\n"
+    add_entries(ledger, parse_journal(write(tmp_path, late, "late.journal")), "late.journal")
+    ledger.sort()
+    problems = validate(ledger, index)
+    assert problems == validate(ledger)
+    assert [problem.kind for problem in problems] == ["assertion", "balance"]
+
+
+def test_empty_ledger():
+    assert validate(Ledger()) == []
+    ledger = Ledger()
+    ledger.add_transaction(date(2024, 1, 1), "Gift", [("Assets:Cash", Money(5, "EUR"))])
+    (problem,) = validate(ledger)
+    assert (problem.kind, problem.path, problem.line) == ("unbalanced", None, None)
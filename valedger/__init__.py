@@ -0,0 +1,61 @@
+"""valedger: yet another personal finance manager."""
+
+from valedger.accounts import AccountTree
+from valedger.aggregate import Matrix, aggregate
+from valedger.balances import BalanceIndex
+from valedger.budget import Budget, Envelope
+from valedger.cache import Cache, load_cached
+from valedger.checkpoints import Checkpoints
+from valedger.database import Database
+from valedger.errors import ParseError, ValedgerError
+from valedger.history import History
+from valedger.interning import Interner
+from valedger.ledger import Column, Day, Ledger, Table, View, from_day, to_day
+from valedger.loader import load_journal
+from valedger.lots import Disposal, Inventory, Lot
+from valedger.money import Money
+from valedger.parser import ParseStats, parse_journal
+from valedger.prices import PriceIndex
+from valedger.query import Plan, compile_query, parse_query
+from valedger.register import Register
+from valedger.search import TextIndex
+from valedger.validate import Problem, validate
+
+__all__ = [
+    "AccountTree",
+    "BalanceIndex",
+    "Budget",
+    "Cache",
+    "Checkpoints",
+    "Column",
+    "Database",
+    "Day",
+    "Disposal",
+    "Envelope",
+    "History",
+    "Interner",
+    "Inventory",
+    "Ledger",
+    "Lot",
+    "Matrix",
+    "Money",
+    "ParseError",
+    "ParseStats",
+    "Plan",
+    "PriceIndex",
+    "Problem",
+    "Register",
+    "Table",
+    "TextIndex",
+    "ValedgerError",
+    "View",
+    "aggregate",
+    "compile_query",
+    "from_day",
+    "load_cached",
+    "load_journal",
+    "parse_journal",
+    "parse_query",
+    "to_day",
+    "validate",
+]
@@ -0,0 +1,156 @@
+"""Account hierarchy with tree-ordered ids.
+
+Account names are colon-separated paths (``Assets:Bank:Checking``).  The
+:class:`AccountTree` interns every name together with all of its
+ancestors, and :meth:`AccountTree.renumber` assigns ids in depth-first
+pre-order with siblings sorted by name.  Every subtree then owns a
+contiguous id range, so "Expenses:Food and all its children" is a range
+test on the integer account column instead of a string prefix match per
+posting.
+"""
+
+from array import array
+from collections.abc import Iterable
+
+from valedger.interning import Interner
+
+SEPARATOR = ":"
+
+
+def _key(name: str) -> list[str]:
+    return name.split(SEPARATOR)
+
+
+def parent_name(name: str) -> str:
+    """Return the name of the parent of account *name* (``""`` for a root)."""
+    return name.rpartition(SEPARATOR)[0]
+
+
+class AccountTree(Interner):
+    """Interner of account names that keeps their hierarchy.
+
+    New accounts keep the tree order as long as they arrive in it, which is
+    the case when loading a cache or extending a ledger with new rows; an
+    account that arrives out of order marks the ids as unordered until the
+    next :meth:`renumber`.
+    """
+
+    __slots__ = ("_ordered", "_ends")
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._ordered: bool | None = True
+        self._ends: array | None = None
+        super().__init__(names)
+
+    @classmethod
+    def unpack(cls, packed: bytes | memoryview, count: int) -> "AccountTree":
+        tree = super().unpack(packed, count)
+        tree._ordered = None
+        return tree
+
+    def intern(self, name: str) -> int:
+        """Return the id of account *name*, interning it and its ancestors."""
+        try:
+            return self._ids[name]  # type: ignore[index]
+        except (KeyError, TypeError):
+            ident = self._index().get(name)
+            if ident is not None:
+                return ident
+            parent = parent_name(name)
+            if parent:
+                self.intern(parent)
+            return self._add(name)
+
+    def _add(self, name: str) -> int:
+        names = self._all()
+        if self._ordered and names and _key(name) < _key(names[-1]):
+            self._ordered = False
+        self._ends = None
+        return super()._add(name)
+
+    @property
+    def is_ordered(self) -> bool:
+        """Whether ids currently follow the tree order."""
+        if self._ordered is None:
+            keys = [_key(name) for name in self._all()]
+            self._ordered = all(a < b for a, b in zip(keys, keys[1:]))
+        return self._ordered
+
+    def renumber(self) -> list[int] | None:
+        """Reassign ids in tree order.
+
+        Returns the list mapping every old id to its new id, for remapping
+        columns that store account ids, or ``None`` if nothing changed.
+        """
+        if self.is_ordered:
+            return None
+        names = self._all()
+        order = sorted(range(len(names)), key=lambda ident: _key(names[ident]))
+        mapping = [0] * len(names)
+        for new, old in enumerate(order):
+            mapping[old] = new
+        self._names = [names[old] for old in order]
+        self._ids = None
+        self._ordered = True
+        self._ends = None
+        return mapping
+
+    def _subtree_ends(self) -> array:
+        if self._ends is None:
+            names = self._all()
+            ends = array("i", bytes(4 * len(names)))
+            open_nodes: list[tuple[int, int]] = []
+            for ident, name in enumerate(names):
+                depth = name.count(SEPARATOR)
+                while open_nodes and open_nodes[-1][1] >= depth:
+                    ends[open_nodes.pop()[0]] = ident
+                open_nodes.append((ident, depth))
+            for ident, _ in open_nodes:
+                ends[ident] = len(names)
+            self._ends = ends
+        return self._ends
+
+    def subtree(self, account: str | int) -> range:
+        """Return the id range of *account* and all its descendants.
+
+        Unknown account names give an empty range.
+        """
+        if not self.is_ordered:
+            raise ValueError("account ids are not in tree order; call renumber() first")
+        if isinstance(account, str):
+            ident = self.get(account)
+            if ident is None:
+                return range(0)
+        else:
+            ident = account
+        return range(ident, self._subtree_ends()[ident])
+
+    def parent(self, ident: int) -> int | None:
+        parent = parent_name(self.name(ident))
+        return self.id(parent) if parent else None
+
+    def depth(self, ident: int) -> int:
+        """Number of ancestors of account *ident* (0 for a root)."""
+        return self.name(ident).count(SEPARATOR)
+
+    def children(self, ident: int | None = None) -> list[int]:
+        """Direct children of account *ident*, or the roots if ``None``."""
+        ends = self._subtree_ends()
+        child, stop = (0, len(ends)) if ident is None else (ident + 1, ends[ident])
+        result = []
+        while child < stop:
+            result.append(child)
+            child = ends[child]
+        return result
+
+    def ancestor_at(self, depth: int) -> array:
+        """Map every account id to its ancestor at *depth* (or itself if shallower)."""
+        names = self._all()
+        ids = self._index()
+        return array(
+            "i",
+            (
+                ids[SEPARATOR.join(_key(name)[: depth + 1])] if name.count(SEPARATOR) > depth else ident
+                for ident, name in enumerate(names)
+            ),
+        )
@@ -0,0 +1,261 @@
+"""Period aggregation of postings into dense matrices.
+
+:func:`aggregate` buckets postings by period (day, week, month, quarter or
+year) and by account in a single pass over the date-sorted columns and
+returns a :class:`Matrix` of totals with one plane per commodity, one row
+per account and one column per period.  Because postings are in date
+order, every period is a contiguous slice of rows, so the column of a
+posting never has to be computed per row.
+
+With the optional ``numpy`` extra installed the pass runs inside NumPy on
+zero-copy views of the columns; otherwise a pure-Python loop over
+:mod:`array` columns produces the same integers.
+"""
+
+from array import array
+from collections.abc import Sequence
+from datetime import date
+
+from valedger.ledger import Day, Ledger, from_day, to_day
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional extra
+    numpy = None
+
+PERIODS = ("day", "week", "month", "quarter", "year")
+BACKENDS = ("numpy", "array")
+
+
+def period_start(day: Day, period: str) -> int:
+    """Return the first day of the *period* containing *day*.
+
+    Weeks start on Monday.
+    """
+    day = to_day(day)
+    if period == "day":
+        return day
+    if period == "week":
+        return day - from_day(day).weekday()
+    value = from_day(day)
+    if period == "month":
+        return date(value.year, value.month, 1).toordinal()
+    if period == "quarter":
+        return date(value.year, value.month - (value.month - 1) % 3, 1).toordinal()
+    if period == "year":
+        return date(value.year, 1, 1).toordinal()
+    raise ValueError(f"unknown period {period!r}; expected one of {', '.join(PERIODS)}")
+
+
+def next_period(start: int, period: str) -> int:
+    """Return the first day of the period following the one starting on *start*."""
+    if period == "day":
+        return start + 1
+    if period == "week":
+        return start + 7
+    value = from_day(start)
+    months = {"month": 1, "quarter": 3, "year": 12}.get(period)
+    if months is None:
+        raise ValueError(f"unknown period {period!r}; expected one of {', '.join(PERIODS)}")
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1).toordinal()
+
+
+def period_starts(start: Day, end: Day, period: str) -> list[int]:
+    """Return the period boundaries covering ``[start, end)``, including the final end."""
+    day, end = period_start(start, period), to_day(end)
+    bounds = [day]
+    while day < end:
+        day = next_period(day, period)
+        bounds.append(day)
+    return bounds
+
+
+class Matrix:
+    """Totals by commodity, account row and period column.
+
+    *values* is flat (``array('q')`` or a NumPy ``int64`` array) and holds
+    ``len(commodities)`` planes of ``len(accounts)`` rows by
+    ``len(bounds) - 1`` columns; column ``j`` covers the days
+    ``[bounds[j], bounds[j + 1])``.
+    """
+
+    __slots__ = ("accounts", "commodities", "bounds", "values", "_rows", "_planes")
+
+    def __init__(self, accounts: Sequence[int], commodities: Sequence[int], bounds: Sequence[int], values) -> None:
+        self.accounts = accounts
+        self.commodities = commodities
+        self.bounds = bounds
+        self.values = values
+        self._rows = {account: row for row, account in enumerate(accounts)}
+        self._planes = {commodity: plane for plane, commodity in enumerate(commodities)}
+
+    @property
+    def width(self) -> int:
+        return max(len(self.bounds) - 1, 0)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return len(self.commodities), len(self.accounts), self.width
+
+    def __repr__(self) -> str:
+        return "Matrix({} commodities x {} accounts x {} periods)".format(*self.shape)
+
+    def columns(self) -> list[tuple[date, date]]:
+        """Return the first and last date of every period column."""
+        return [(from_day(lo), from_day(hi - 1)) for lo, hi in zip(self.bounds, self.bounds[1:])]
+
+    def _offset(self, commodity: int, account: int) -> int | None:
+        plane = self._planes.get(commodity)
+        row = self._rows.get(account)
+        if plane is None or row is None:
+            return None
+        return (plane * len(self.accounts) + row) * self.width
+
+    def row(self, account: int, commodity: int) -> list[int]:
+        """Totals of *account* in *commodity* for every period."""
+        offset = self._offset(commodity, account)
+        if offset is None:
+            return [0] * self.width
+        return [int(value) for value in self.values[offset : offset + self.width]]
+
+    def value(self, account: int, commodity: int, column: int) -> int:
+        offset = self._offset(commodity, account)
+        return 0 if offset is None else int(self.values[offset + column])
+
+    def rollup(self, ledger: Ledger) -> "Matrix":
+        """Return a matrix whose rows also include the totals of their sub-accounts.
+
+        Rows are added to the closest ancestor that has a row of its own;
+        ancestors without one are given one, so every level of the
+        hierarchy above the rows shows its subtree total.
+        """
+        tree = ledger.accounts
+        accounts = set(self.accounts)
+        for account in self.accounts:
+            parent = tree.parent(account)
+            while parent is not None and parent not in accounts:
+                accounts.add(parent)
+                parent = tree.parent(parent)
+        accounts = sorted(accounts)
+        rows = {account: row for row, account in enumerate(accounts)}
+        width, height = self.width, len(accounts)
+        if numpy is not None and isinstance(self.values, numpy.ndarray):
+            source = self.values.reshape(len(self.commodities), len(self.accounts), width)
+            values = numpy.zeros((len(self.commodities), height, width), dtype=numpy.int64)
+            values[:, [rows[account] for account in self.accounts], :] = source
+            for account in reversed(accounts):
+                parent = tree.parent(account)
+                if parent is not None:
+                    values[:, rows[parent], :] += values[:, rows[account], :]
+            return Matrix(accounts, self.commodities, self.bounds, values.reshape(-1))
+        values = array("q", bytes(8 * len(self.commodities) * height * width))
+        for plane in range(len(self.commodities)):
+            for row, account in enumerate(self.accounts):
+                source = (plane * len(self.accounts) + row) * width
+                target = (plane * height + rows[account]) * width
+                values[target : target + width] = self.values[source : source + width]
+            for account in reversed(accounts):
+                parent = tree.parent(account)
+                if parent is None:
+                    continue
+                source = (plane * height + rows[account]) * width
+                target = (plane * height + rows[parent]) * width
+                for column in range(width):
+                    values[target + column] += values[source + column]
+        return Matrix(accounts, self.commodities, self.bounds, values)
+
+
+def aggregate(
+    ledger: Ledger,
+    period: str = "month",
+    start: Day | None = None,
+    end: Day | None = None,
+    accounts: range | None = None,
+    depth: int | None = None,
+    backend: str | None = None,
+) -> Matrix:
+    """Total the postings of *ledger* by period and account.
+
+    Only postings dated in ``[start, end)`` (by default all of them) and
+    booked to an account id in *accounts* (by default every account) are
+    counted.  With *depth*, accounts deeper than *depth* are counted
+    towards their ancestor at that depth.  *backend* is ``"numpy"`` or
+    ``"array"``; the default is NumPy when it is installed.
+
+    Without *start*, the periods begin with the first posting counted; if
+    there is none, they begin at *end*, and without *end* either the
+    matrix has no periods at all.
+    """
+    if backend is None:
+        backend = "numpy" if numpy is not None else "array"
+    elif backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    elif backend == "numpy" and numpy is None:
+        raise ValueError("the numpy backend requires numpy; install valedger with the numpy extra")
+    ledger.order_accounts()
+    lo, hi = ledger.rows_between(start, end)
+    dates = ledger.postings.columns["date"]
+    if start is None:
+        if lo < hi:
+            start = dates[lo]
+        elif end is not None:
+            start = end
+        else:
+            return Matrix([], [], [], array("q"))
+    if end is None:
+        end = dates[hi - 1] + 1 if lo < hi else to_day(start)
+    bounds = period_starts(start, end, period)
+    edges = [min(max(lo, ledger.rows_between(day)[0]), hi) for day in bounds[1:-1]]
+    slices = list(zip([lo, *edges], [*edges, hi]))[: len(bounds) - 1]
+
+    # Map every account id to its row, or -1 when out of scope.
+    scope = range(len(ledger.accounts)) if accounts is None else accounts
+    targets = ledger.accounts.ancestor_at(depth) if depth is not None else None
+    owners = array("i", [-1]) * len(ledger.accounts)
+    for account in scope:
+        owners[account] = targets[account] if targets is not None else account
+    rows = sorted(set(owners) - {-1})
+    position = {account: row for row, account in enumerate(rows)}
+    width = len(bounds) - 1
+    row_of = array("q", [-1 if owner < 0 else position[owner] * width for owner in owners])
+
+    with ledger.view(lo, hi) as view:
+        if backend == "numpy":
+            commodities = numpy.unique(numpy.frombuffer(view.commodity, dtype=numpy.int32)).tolist()
+        else:
+            commodities = sorted(set(view.commodity))
+        plane_size = len(rows) * width
+        plane_of = array("q", [0]) * len(ledger.commodities)
+        for plane, commodity in enumerate(commodities):
+            plane_of[commodity] = plane * plane_size
+        if backend == "numpy":
+            values = _aggregate_numpy(view, lo, slices, row_of, plane_of, len(commodities) * plane_size)
+        else:
+            values = _aggregate_array(view, lo, slices, row_of, plane_of, len(commodities) * plane_size)
+    return Matrix(rows, commodities, bounds, values)
+
+
+def _aggregate_array(view, lo: int, slices, row_of: array, plane_of: array, size: int) -> array:
+    values = array("q", bytes(8 * size))
+    accounts, commodities, amounts = view.account, view.commodity, view.amount
+    for column, (a, b) in enumerate(slices):
+        a, b = a - lo, b - lo
+        for account, commodity, amount in zip(accounts[a:b], commodities[a:b], amounts[a:b]):
+            row = row_of[account]
+            if row >= 0:
+                values[plane_of[commodity] + row + column] += amount
+    return values
+
+
+def _aggregate_numpy(view, lo: int, slices, row_of: array, plane_of: array, size: int):
+    accounts = numpy.frombuffer(view.account, dtype=numpy.int32)
+    commodities = numpy.frombuffer(view.commodity, dtype=numpy.int32)
+    amounts = numpy.frombuffer(view.amount, dtype=numpy.int64)
+    columns = numpy.repeat(numpy.arange(len(slices), dtype=numpy.int64), [b - a for a, b in slices])
+    rows = numpy.frombuffer(row_of, dtype=numpy.int64)[accounts]
+    keep = rows >= 0
+    index = numpy.frombuffer(plane_of, dtype=numpy.int64)[commodities] + rows + columns
+    values = numpy.zeros(size, dtype=numpy.int64)
+    numpy.add.at(values, index[keep], amounts[keep])
+    return values
@@ -0,0 +1,176 @@
+"""Running balances by account and commodity.
+
+A :class:`BalanceIndex` stores, for every (account, commodity) pair, the
+days on which the pair has postings and the cumulative balance at the end
+of each of those days.  The balance of an account on any date is then one
+binary search over that pair's days and one lookup, instead of a scan over
+every posting up to the date.  Balances of a whole subtree of accounts sum
+the few pairs whose account id lies in the subtree's id range (see
+:meth:`~valedger.ledger.Ledger.account_range`).  The rows of every pair's
+postings are kept too, so the postings of an account are found without
+scanning the ledger (see :class:`~valedger.register.Register`).
+
+The index is built from a date-sorted ledger and can be brought up to date
+cheaply when postings are appended at its end, for example after a
+journal file was extended.  When the ledger's rows were rewritten since
+(see :attr:`~valedger.ledger.Ledger.generation`), a digest of the postings
+indexed so far tells whether they are still the same; a back-dated
+posting sorted in among them, or renumbered accounts, rebuild the index.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from valedger.ledger import Day, Ledger, to_day
+
+# Pair keys sort by account first, so the pairs of an account id range are
+# contiguous in the sorted key list.
+_SHIFT = 32
+
+
+def _key(account: int, commodity: int) -> int:
+    return account << _SHIFT | commodity
+
+
+class BalanceIndex:
+    """Prefix sums of posting amounts per account and commodity."""
+
+    __slots__ = (
+        "rows",
+        "last_day",
+        "generation",
+        "_digest",
+        "_scales",
+        "_keys",
+        "_series",
+        "_days",
+        "_sums",
+        "_postings",
+    )
+
+    def __init__(self, ledger: Ledger | None = None) -> None:
+        self.clear()
+        if ledger is not None:
+            self.update(ledger)
+
+    def clear(self) -> None:
+        self.rows = 0
+        self.last_day: int | None = None
+        self.generation = -1
+        self._digest = b""
+        self._scales = array("b")
+        self._keys: list[int] = []
+        self._series: dict[int, int] = {}
+        self._days: list[array] = []
+        self._sums: list[array] = []
+        self._postings: list[array] = []
+
+    def __len__(self) -> int:
+        """Number of (account, commodity) pairs."""
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"BalanceIndex({self.rows} postings, {len(self)} series)"
+
+    def update(self, ledger: Ledger) -> None:
+        """Index the postings appended to *ledger* since the last update.
+
+        The index is rebuilt from scratch if the ledger shrank, a commodity
+        precision was widened or the postings already indexed changed.
+        """
+        if not ledger.is_sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        postings = ledger.postings
+        scales = ledger.scales
+        stale = len(postings) < self.rows or any(a != b for a, b in zip(self._scales, scales))
+        if not stale and self.rows and ledger.generation != self.generation:
+            stale = ledger.digest(self.rows) != self._digest
+        if stale:
+            self.clear()
+        self._scales = array("b", scales)
+        self.generation = ledger.generation
+        if self.rows == len(postings):
+            return
+        series, days, sums, posted = self._series, self._days, self._sums, self._postings
+        new_keys = []
+        with ledger.view(self.rows) as view:
+            rows = range(self.rows, len(postings))
+            for row, day, account, commodity, amount in zip(rows, view.date, view.account, view.commodity, view.amount):
+                key = account << _SHIFT | commodity
+                index = series.get(key)
+                if index is None:
+                    index = series[key] = len(days)
+                    days.append(array("i", (day,)))
+                    sums.append(array("q", (amount,)))
+                    posted.append(array("i", (row,)))
+                    new_keys.append(key)
+                    continue
+                posted[index].append(row)
+                totals = sums[index]
+                if days[index][-1] == day:
+                    totals[-1] += amount
+                else:
+                    days[index].append(day)
+                    totals.append(totals[-1] + amount)
+            self.last_day = view.date[-1]
+        self.rows = len(postings)
+        self._digest = ledger.digest(self.rows)
+        if new_keys:
+            new_keys.sort()
+            merge = self._keys and new_keys[0] < self._keys[-1]
+            self._keys.extend(new_keys)
+            if merge:
+                # Two sorted runs: the sort merges them in one linear pass.
+                self._keys.sort()
+
+    def series(self, account: int, commodity: int) -> tuple[array, array]:
+        """Return the posting days of a pair and its balance at the end of each."""
+        index = self._series.get(_key(account, commodity))
+        if index is None:
+            return array("i"), array("q")
+        return self._days[index], self._sums[index]
+
+    def postings(self, accounts: int | range) -> list[array]:
+        """Posting rows of every pair of *accounts*, each in ledger order."""
+        return [self._postings[self._series[key]] for key in self._pairs(accounts)]
+
+    def _pairs(self, accounts: int | range) -> list[int]:
+        """Keys of the pairs of an account id or a range of ids."""
+        if isinstance(accounts, int):
+            accounts = range(accounts, accounts + 1)
+        keys = self._keys
+        lo = bisect_left(keys, accounts.start << _SHIFT)
+        return keys[lo : bisect_left(keys, accounts.stop << _SHIFT, lo)]
+
+    def _at(self, index: int, day: int) -> int:
+        position = bisect_right(self._days[index], day)
+        return self._sums[index][position - 1] if position else 0
+
+    def balance(self, account: int, commodity: int, day: Day) -> int:
+        """Scaled balance of one account in one commodity at the end of *day*."""
+        index = self._series.get(_key(account, commodity))
+        return 0 if index is None else self._at(index, to_day(day))
+
+    def balances(self, accounts: int | range, day: Day) -> dict[int, int]:
+        """Balances at the end of *day* by commodity id, summed over *accounts*.
+
+        *accounts* is an account id or a range of ids such as a subtree.
+        Commodities whose balance is zero are left out.
+        """
+        day = to_day(day)
+        result: dict[int, int] = {}
+        mask = (1 << _SHIFT) - 1
+        for key in self._pairs(accounts):
+            value = self._at(self._series[key], day)
+            if value:
+                commodity = key & mask
+                result[commodity] = result.get(commodity, 0) + value
+        return {commodity: value for commodity, value in result.items() if value}
+
+    def change(self, accounts: int | range, start: Day, end: Day) -> dict[int, int]:
+        """Net change by commodity id of *accounts* over the days ``[start, end)``."""
+        before = self.balances(accounts, to_day(start) - 1)
+        after = self.balances(accounts, to_day(end) - 1)
+        for commodity, value in before.items():
+            after[commodity] = after.get(commodity, 0) - value
+        return {commodity: value for commodity, value in after.items() if value}
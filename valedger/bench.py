@@ -0,0 +1,160 @@
+"""Benchmarks on synthetic journals.
+
+Run ``python -m valedger.bench`` to time parsing, loading, point-in-time
+balances, an account register and a monthly report on synthetic journals
+of 10k, 1M and 10M postings (see :mod:`valedger.synthetic`) and print the
+results as JSON::
+
+    python -m valedger.bench --sizes 10k,1m --repeat 3 --output results.json
+
+Generated journals are kept in the work directory and reused by later
+runs with the same profile.  Every timing is the best of ``--repeat`` runs.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from importlib import metadata
+from itertools import compress
+from pathlib import Path
+from typing import Any
+
+from valedger.aggregate import aggregate, numpy
+from valedger.balances import BalanceIndex
+from valedger.cache import Cache, load_cached
+from valedger.ledger import Ledger
+from valedger.loader import available_cpus, load_journal
+from valedger.parser import ParseStats, parse_journal
+from valedger.synthetic import Profile, write_journal
+
+SIZES = ("10k", "1m", "10m")
+QUERIES = 1_000
+
+
+def parse_size(text: str) -> int:
+    """Parse a posting count such as ``10k`` or ``1m``."""
+    text = text.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def best(function: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Return the shortest wall time of *repeat* calls and the last result."""
+    seconds = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, result
+
+
+def register(ledger: Ledger, account: int) -> list[tuple[int, int, int]]:
+    """Rows of *account* with the running total after each, as ``(row, amount, total)``."""
+    postings = ledger.postings.columns
+    rows = compress(range(len(ledger)), map(account.__eq__, postings["account"]))
+    amounts = postings["amount"]
+    total = 0
+    result = []
+    for row in rows:
+        total += amounts[row]
+        result.append((row, amounts[row], total))
+    return result
+
+
+def run_size(postings: int, workdir: Path, repeat: int, seed: int = 0) -> list[dict[str, Any]]:
+    """Time every operation on a synthetic journal of about *postings* postings."""
+    profile = Profile(postings=postings, seed=seed)
+    path = workdir / f"{profile.name}.journal"
+    if not path.exists():
+        write_journal(path, profile)
+    results = []
+
+    def record(operation: str, seconds: float, count: int, **extra: Any) -> None:
+        results.append(
+            {"postings": postings, "operation": operation, "seconds": seconds, "count": count, **extra}
+        )
+
+    def parse() -> ParseStats:
+        stats = ParseStats()
+        for _ in parse_journal(path, stats):
+            pass
+        return stats
+
+    seconds, stats = best(parse, repeat)
+    record("parse", seconds, stats.postings, bytes=stats.bytes)
+    seconds, ledger = best(lambda: load_journal(path, workers=1), repeat)
+    record("load", seconds, len(ledger))
+    cache = Cache(workdir / "cache")
+    load_cached(path, cache=cache)
+    seconds, _ = best(lambda: load_cached(path, cache=cache), repeat)
+    record("load_cached", seconds, len(ledger))
+
+    seconds, index = best(lambda: BalanceIndex(ledger), repeat)
+    record("balance_index", seconds, len(ledger))
+    rng = random.Random(seed)
+    dates = ledger.postings.columns["date"]
+    names = ledger.accounts.names()
+    queries = [(ledger.account_range(rng.choice(names)), rng.randint(dates[0], dates[-1])) for _ in range(QUERIES)]
+    seconds, _ = best(lambda: [index.balances(accounts, day) for accounts, day in queries], repeat)
+    record("balance", seconds / QUERIES, QUERIES)
+
+    checking = ledger.accounts.id("Assets:Bank:Checking")
+    seconds, rows = best(lambda: register(ledger, checking), repeat)
+    record("register", seconds, len(rows))
+
+    for backend in ("array", "numpy") if numpy is not None else ("array",):
+        seconds, matrix = best(
+            lambda: aggregate(ledger, "month", depth=2, backend=backend).rollup(ledger), repeat
+        )
+        record("report", seconds, len(ledger), backend=backend, shape=list(matrix.shape))
+    return results
+
+
+def environment() -> dict[str, Any]:
+    try:
+        version = metadata.version("valedger")
+    except metadata.PackageNotFoundError:
+        version = None
+    return {
+        "valedger": version,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": available_cpus(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m valedger.bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated posting counts (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, the best is kept (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic journals (default: %(default)s)")
+    parser.add_argument("--workdir", type=Path, help="where to keep generated journals (default: a temporary directory)")
+    parser.add_argument("--output", type=Path, help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="valedger-bench-") as temporary:
+        workdir = args.workdir or Path(temporary)
+        results = []
+        for size in args.sizes.split(","):
+            results.extend(run_size(parse_size(size), workdir, args.repeat, args.seed))
+    document = json.dumps({"environment": environment(), "results": results}, indent=2)
+    if args.output is None:
+        print(document)
+    else:
+        args.output.write_text(document + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
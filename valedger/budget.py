@@ -0,0 +1,301 @@
+"""Envelope budgets with rollover.
+
+A :class:`Budget` funds envelopes, one per spending category, with an
+amount every period (a month by default).  What an envelope does not spend
+in a period rolls over to the next, and overspending is taken out of it,
+so the amount available in an envelope is its budgets minus its spending
+since the budget started.  Postings count towards the envelope of their
+account or of its closest ancestor that has one.
+
+Spending per envelope and period comes out of the period aggregation
+matrix (see :func:`~valedger.aggregate.aggregate`), and the rollover chain
+of every envelope, its available amount at the end of each period, is
+cached.  :meth:`Budget.update` adds the postings appended to the ledger
+since the last update to the spending of their envelope and period, and
+marks the envelope's chain stale from that period on.  When the postings
+counted last time changed, for example a back-dated transaction was
+sorted in among them (a digest of their columns tells), spending is
+aggregated again and compared: only the envelopes whose spending
+differs are marked, from the first period that differs.  Stale chains
+are brought up to date when they are next read.
+"""
+
+import hashlib
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from valedger.aggregate import aggregate, next_period, period_start
+from valedger.ledger import Day, Ledger, to_day
+from valedger.money import Money, round_div
+
+
+def _digest(ledger: Ledger, rows: int) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    columns = ledger.postings.columns
+    for name in ("date", "account", "commodity", "amount"):
+        digest.update(memoryview(columns[name])[:rows])
+    return digest.digest()
+
+
+class Envelope(NamedTuple):
+    """A budget of *amount* per period for *account* and its subaccounts.
+
+    Several envelopes of one account change its budget over time: each
+    applies from the period containing its *start* until the next one's.
+    Without *rollover*, the envelope starts those periods afresh.
+    """
+
+    account: str
+    amount: Money
+    start: Day | None = None
+    rollover: bool = True
+
+
+class Status(NamedTuple):
+    """One period of an envelope, starting on day *start*.
+
+    *available* is *carried* (the rollover from the previous period) plus
+    *budgeted* minus *spent*.
+    """
+
+    account: str
+    start: int
+    carried: Money
+    budgeted: Money
+    spent: Money
+    available: Money
+
+
+class Budget:
+    """Envelopes funded every *period* from the period containing *start*."""
+
+    __slots__ = (
+        "period",
+        "start",
+        "rows",
+        "last_day",
+        "_digest",
+        "_accounts",
+        "_plans",
+        "_owners",
+        "_units",
+        "_scales",
+        "_bounds",
+        "_budgets",
+        "_rollover",
+        "_spent",
+        "_available",
+        "_stale",
+    )
+
+    def __init__(
+        self, envelopes: Iterable[Envelope], start: Day, period: str = "month", ledger: Ledger | None = None
+    ) -> None:
+        self.period = period
+        self.start = period_start(start, period)
+        plans: dict[str, list[Envelope]] = {}
+        for envelope in envelopes:
+            plans.setdefault(envelope.account, []).append(envelope)
+        for account, entries in plans.items():
+            if len({entry.amount.commodity for entry in entries}) > 1:
+                raise ValueError(f"envelope {account} is budgeted in more than one commodity")
+            entries.sort(key=lambda entry: self.start if entry.start is None else to_day(entry.start))
+        self._accounts = list(plans)
+        self._plans = list(plans.values())
+        self.clear()
+        if ledger is not None:
+            self.update(ledger)
+
+    def clear(self) -> None:
+        count = len(self._accounts)
+        self.rows = 0
+        self.last_day: int | None = None
+        self._digest = b""
+        self._owners = array("i")
+        # Commodity id (-1 while the ledger has none) and scale per envelope.
+        self._units: list[tuple[int, int]] = [(-1, entries[0].amount.scale) for entries in self._plans]
+        self._scales = array("b")
+        self._bounds = [self.start]
+        self._budgets = [array("q") for _ in range(count)]
+        self._rollover = [bytearray() for _ in range(count)]
+        self._spent = [array("q") for _ in range(count)]
+        self._available = [array("q") for _ in range(count)]
+        # First period of every envelope whose available amount is stale.
+        self._stale = [0] * count
+
+    def __len__(self) -> int:
+        """Number of envelopes."""
+        return len(self._accounts)
+
+    def __repr__(self) -> str:
+        return f"Budget({len(self)} envelopes, {len(self._bounds) - 1} periods)"
+
+    @property
+    def accounts(self) -> list[str]:
+        return list(self._accounts)
+
+    def update(self, ledger: Ledger) -> None:
+        """Take in the changes of the date-sorted *ledger* since the last update."""
+        if not ledger.is_sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        postings = ledger.postings
+        # Postings sorted in before the end, or edited, leave the rows
+        # counted last time different; one hash over them tells.
+        stale = len(postings) < self.rows or not self.rows or _digest(ledger, self.rows) != self._digest
+        if any(a != b for a, b in zip(self._scales, ledger.scales)):
+            self.clear()
+            stale = True
+        self._scales = array("b", ledger.scales)
+        self._resolve(ledger)
+        if len(postings):
+            self._extend(postings.columns["date"][-1])
+        if stale:
+            self._aggregate(ledger)
+        elif self.rows < len(postings):
+            self._append(ledger)
+        self.rows = len(postings)
+        self.last_day = postings.columns["date"][-1] if len(postings) else None
+        self._digest = _digest(ledger, self.rows)
+
+    def _resolve(self, ledger: Ledger) -> None:
+        """Map account ids to envelopes and budgets to the ledger's commodities."""
+        ledger.order_accounts()
+        owners = array("i", [-1]) * len(ledger.accounts)
+        ranges = [ledger.accounts.subtree(account) for account in self._accounts]
+        # Larger subtrees first, so subaccounts with envelopes of their own
+        # take their postings back.
+        for envelope in sorted(range(len(ranges)), key=lambda index: -len(ranges[index])):
+            for account in ranges[envelope]:
+                owners[account] = envelope
+        self._owners = owners
+        for envelope, entries in enumerate(self._plans):
+            commodity = ledger.commodities.get(entries[0].amount.commodity, -1)
+            unit = (commodity, self._scales[commodity] if commodity >= 0 else entries[0].amount.scale)
+            if unit != self._units[envelope]:
+                self._units[envelope] = unit
+                periods = len(self._bounds) - 1
+                del self._budgets[envelope][:], self._rollover[envelope][:]
+                for bound in self._bounds[:periods]:
+                    self._fund(envelope, bound)
+                self._stale[envelope] = 0
+
+    def _fund(self, envelope: int, bound: int) -> None:
+        """Append the budget of the period starting on *bound*."""
+        entries = self._plans[envelope]
+        scale = self._units[envelope][1]
+        starts = [self.start if entry.start is None else period_start(entry.start, self.period) for entry in entries]
+        index = bisect_right(starts, bound) - 1
+        if index < 0:
+            self._budgets[envelope].append(0)
+            self._rollover[envelope].append(1)
+            return
+        amount = entries[index].amount
+        if scale >= amount.scale:
+            value = amount.value * 10 ** (scale - amount.scale)
+        else:
+            value = round_div(amount.value, 10 ** (amount.scale - scale))
+        self._budgets[envelope].append(value)
+        self._rollover[envelope].append(entries[index].rollover)
+
+    def _extend(self, day: int) -> None:
+        """Add periods until one contains *day*."""
+        bounds = self._bounds
+        periods = len(bounds) - 1
+        while day >= bounds[-1]:
+            for envelope in range(len(self._accounts)):
+                self._fund(envelope, bounds[-1])
+                self._spent[envelope].append(0)
+                self._available[envelope].append(0)
+            bounds.append(next_period(bounds[-1], self.period))
+        for envelope in range(len(self._accounts)):
+            self._stale[envelope] = min(self._stale[envelope], periods)
+
+    def _aggregate(self, ledger: Ledger) -> None:
+        """Recount spending from the aggregation matrix and mark what changed."""
+        bounds = self._bounds
+        width = len(bounds) - 1
+        spent = [array("q", bytes(8 * width)) for _ in self._accounts]
+        if width:
+            matrix = aggregate(ledger, self.period, bounds[0], bounds[-1])
+            for account in matrix.accounts:
+                envelope = self._owners[account]
+                if envelope < 0 or self._units[envelope][0] < 0:
+                    continue
+                totals = spent[envelope]
+                for column, value in enumerate(matrix.row(account, self._units[envelope][0])):
+                    totals[column] += value
+        for envelope, totals in enumerate(spent):
+            before = self._spent[envelope]
+            changed = next((column for column in range(width) if totals[column] != before[column]), width)
+            self._stale[envelope] = min(self._stale[envelope], changed)
+            self._spent[envelope] = totals
+
+    def _append(self, ledger: Ledger) -> None:
+        bounds, owners, units = self._bounds, self._owners, self._units
+        with ledger.view(self.rows) as view:
+            for day, account, commodity, amount in zip(view.date, view.account, view.commodity, view.amount):
+                envelope = owners[account]
+                if envelope < 0 or commodity != units[envelope][0] or day < bounds[0]:
+                    continue
+                column = bisect_right(bounds, day) - 1
+                self._spent[envelope][column] += amount
+                if column < self._stale[envelope]:
+                    self._stale[envelope] = column
+
+    def _chain(self, envelope: int) -> array:
+        """The available amounts of *envelope*, recomputed from its first stale period."""
+        available = self._available[envelope]
+        first = self._stale[envelope]
+        if first < len(available):
+            budgets, rollover, spent = self._budgets[envelope], self._rollover[envelope], self._spent[envelope]
+            carried = available[first - 1] if first else 0
+            for column in range(first, len(available)):
+                carried = (carried if rollover[column] else 0) + budgets[column] - spent[column]
+                available[column] = carried
+            self._stale[envelope] = len(available)
+        return available
+
+    def _status(self, envelope: int, column: int) -> Status:
+        available = self._chain(envelope)
+        commodity = self._plans[envelope][0].amount.commodity
+        scale = self._units[envelope][1]
+        carried = available[column - 1] if column and self._rollover[envelope][column] else 0
+        return Status(
+            self._accounts[envelope],
+            self._bounds[column],
+            Money(carried, commodity, scale),
+            Money(self._budgets[envelope][column], commodity, scale),
+            Money(self._spent[envelope][column], commodity, scale),
+            Money(available[column], commodity, scale),
+        )
+
+    def _column(self, day: Day) -> int:
+        day = to_day(day)
+        if day < self._bounds[0]:
+            raise ValueError("day is before the start of the budget")
+        self._extend(day)
+        return bisect_right(self._bounds, day) - 1
+
+    def _envelope(self, account: str) -> int:
+        try:
+            return self._accounts.index(account)
+        except ValueError:
+            raise ValueError(f"no envelope for {account}") from None
+
+    def status(self, account: str, day: Day) -> Status:
+        """The envelope of *account* in the period containing *day*."""
+        return self._status(self._envelope(account), self._column(day))
+
+    def report(self, day: Day) -> list[Status]:
+        """Every envelope in the period containing *day*."""
+        column = self._column(day)
+        return [self._status(envelope, column) for envelope in range(len(self._accounts))]
+
+    def history(self, account: str, start: Day | None = None, end: Day | None = None) -> list[Status]:
+        """The periods of the envelope of *account* overlapping the days ``[start, end)``."""
+        envelope = self._envelope(account)
+        first = 0 if start is None else self._column(max(to_day(start), self._bounds[0]))
+        stop = len(self._bounds) - 1 if end is None else self._column(to_day(end) - 1) + 1
+        return [self._status(envelope, column) for column in range(first, stop)]
@@ -0,0 +1,360 @@
+"""Persistent binary cache of parsed journals.
+
+A parsed ledger is written as one file: a small JSON header followed by
+the raw bytes of every column and interner, each aligned to eight bytes.
+Loading maps the file with :mod:`mmap` and casts memoryviews over it, so a
+warm start neither parses nor copies anything until a report reads (or a
+command modifies) the data.
+
+Two kinds of entries live under the cache directory:
+
+* one *chunk* per journal file, holding the rows of that file alone and
+  the positions of its includes (see :class:`~valedger.loader.Chunk`);
+* one *snapshot* per root journal, holding the spliced and sorted ledger
+  together with a manifest of every file it was built from.
+
+A file is considered unchanged when its size and modification time match
+the manifest, or, failing that, when its content hash still does.  Glob
+includes are expanded again and must match the same files, so a journal
+added to an included directory is picked up.  When
+any file changed, only the changed files are parsed again and the
+snapshot is rebuilt from the chunks.  A file that was only appended to,
+typically after importing the day's bank statements, is not parsed again
+either: its chunk is cut back to the file's last entry and only that
+entry and the new lines are parsed.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from os import PathLike
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from valedger.ledger import INTERNER_TYPES, INTERNERS, Interner, Ledger, to_array
+from valedger.loader import Chunk, Resume, available_cpus, expand_glob, parse_chunk, parse_chunks, splice
+from valedger.parser import ParseStats
+
+MAGIC = b"VLDGR\0"
+FORMAT = 4
+_ALIGN = 8
+
+
+def default_cache_dir() -> Path:
+    """Return ``$VALEDGER_CACHE_DIR``, else ``$XDG_CACHE_HOME/valedger``, else ``~/.cache/valedger``."""
+    if "VALEDGER_CACHE_DIR" in os.environ:
+        return Path(os.environ["VALEDGER_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "valedger"
+
+
+class FileState(NamedTuple):
+    """Identity of a journal file at the time it was parsed."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    digest: str
+
+    @classmethod
+    def of(cls, path: str) -> "FileState":
+        info = os.stat(path)
+        return cls(path, info.st_size, info.st_mtime_ns, file_digest(path))
+
+    def is_current(self) -> bool:
+        """Whether the file still has the content it had when recorded."""
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if info.st_size != self.size:
+            return False
+        return info.st_mtime_ns == self.mtime_ns or file_digest(self.path) == self.digest
+
+
+def globs_current(globs: list[list[Any]]) -> bool:
+    """Whether every ``[pattern, paths]`` glob include still matches exactly *paths*."""
+    return all(expand_glob(pattern) == paths for pattern, paths in globs)
+
+
+def file_digest(path: str) -> str:
+    """BLAKE2b digest of the content of *path*."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size:
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+    return digest.hexdigest()
+
+
+def appended(state: FileState, resume: Resume) -> tuple[int, FileState] | None:
+    """Check whether *state*'s file has only grown since it was recorded.
+
+    If so, return the byte offset of line ``resume.line``, where parsing
+    has to restart, and the new state of the file; otherwise ``None``.
+    Only the old prefix is hashed and compared; the digest of the new
+    content is obtained by feeding the appended bytes to the same hash.
+    """
+    try:
+        handle = open(state.path, "rb")
+    except FileNotFoundError:
+        return None
+    with handle:
+        info = os.fstat(handle.fileno())
+        if info.st_size <= state.size:
+            return None
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as data:
+            digest = hashlib.blake2b(data[: state.size], digest_size=20)
+            if digest.hexdigest() != state.digest:
+                return None
+            # Line L starts right after the (L-1)-th newline, which is the
+            # (newlines - L + 2)-th newline counting back from the old end.
+            position = state.size
+            for _ in range(resume.newlines - resume.line + 2):
+                position = mapped.rfind(b"\n", 0, position)
+                if position < 0:
+                    break
+            digest.update(data[state.size :])
+    return position + 1, FileState(state.path, info.st_size, info.st_mtime_ns, digest.hexdigest())
+
+
+def write_ledger(path: Path, ledger: Ledger, meta: dict[str, Any]) -> None:
+    """Serialise *ledger* and the JSON-able *meta* to *path* atomically."""
+    blobs: list[bytes | array] = []
+    layout: dict[str, Any] = {}
+    offset = 0
+
+    def place(blob: bytes | array) -> list[int]:
+        nonlocal offset
+        size = len(blob) * (blob.itemsize if isinstance(blob, array) else 1)
+        padding = -size % _ALIGN
+        blobs.append(blob)
+        blobs.append(b"\0" * padding)
+        position = offset
+        offset += size + padding
+        return [position, size]
+
+    layout["interners"] = {name: place(getattr(ledger, name).pack()) + [len(getattr(ledger, name))] for name in INTERNERS}
+    layout["scales"] = place(to_array("b", ledger.scales))
+    layout["tables"] = {
+        name: {column.name: place(to_array(column.typecode, table.columns[column.name])) for column in table.schema}
+        for name, table in ledger.tables.items()
+    }
+    header = json.dumps(
+        {
+            "format": FORMAT,
+            "byteorder": sys.byteorder,
+            "itemsizes": {code: array(code).itemsize for code in "bilq"},
+            "sorted": ledger.is_sorted,
+            "layout": layout,
+            "meta": meta,
+        }
+    ).encode()
+    start = len(MAGIC) + 4 + len(header)
+    start += -start % _ALIGN
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temporary, "wb") as handle:
+        handle.write(MAGIC)
+        handle.write(len(header).to_bytes(4, "little"))
+        handle.write(header)
+        handle.write(b"\0" * (start - len(MAGIC) - 4 - len(header)))
+        for blob in blobs:
+            handle.write(blob)
+    os.replace(temporary, path)
+
+
+def read_ledger(path: Path) -> tuple[Ledger, dict[str, Any]] | None:
+    """Map the cache file at *path*; ``None`` if it is missing or unusable."""
+    try:
+        with open(path, "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    if mapped[: len(MAGIC)] != MAGIC:
+        return None
+    length = int.from_bytes(mapped[len(MAGIC) : len(MAGIC) + 4], "little")
+    try:
+        header = json.loads(mapped[len(MAGIC) + 4 : len(MAGIC) + 4 + length])
+    except ValueError:
+        return None
+    expected = {code: array(code).itemsize for code in "bilq"}
+    if header.get("format") != FORMAT or header["byteorder"] != sys.byteorder or header["itemsizes"] != expected:
+        return None
+    start = len(MAGIC) + 4 + length
+    start += -start % _ALIGN
+    data = memoryview(mapped)[start:]
+    layout = header["layout"]
+
+    def view(entry: list[int], typecode: str | None = None) -> memoryview:
+        position, size = entry[:2]
+        blob = data[position : position + size]
+        return blob.cast(typecode) if typecode else blob
+
+    interners = {
+        name: INTERNER_TYPES.get(name, Interner).unpack(view(entry), entry[2])
+        for name, entry in layout["interners"].items()
+    }
+    columns = {
+        name: {column.name: view(layout["tables"][name][column.name], column.typecode) for column in table.schema}
+        for name, table in Ledger().tables.items()
+    }
+    ledger = Ledger.restore(interners, view(layout["scales"], "b"), columns, header["sorted"])
+    return ledger, header["meta"]
+
+
+class Cache:
+    """On-disk cache of parsed journals under *directory*."""
+
+    def __init__(self, directory: str | PathLike[str] | None = None) -> None:
+        self.directory = Path(directory) if directory is not None else default_cache_dir()
+
+    def _entry(self, kind: str, path: str, suffix: str = ".vlc") -> Path:
+        key = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=16).hexdigest()
+        return self.directory / kind / f"{key}{suffix}"
+
+    def index_path(self, kind: str, root: str | PathLike[str]) -> Path:
+        """Where to keep an index of *kind* built for the journal *root*."""
+        return self._entry(kind, str(root), ".vlx")
+
+    def load_snapshot(self, root: str) -> Ledger | None:
+        """Return the cached ledger of *root* if none of its files changed."""
+        found = read_ledger(self._entry("snapshots", root))
+        if found is None:
+            return None
+        ledger, meta = found
+        if meta.get("root") != os.path.abspath(root):
+            return None
+        if not all(FileState(*state).is_current() for state in meta["files"]):
+            return None
+        if not globs_current(meta["globs"]):
+            return None
+        return ledger
+
+    def store_snapshot(
+        self, root: str, ledger: Ledger, files: list[FileState], globs: list[list[Any]] | None = None
+    ) -> None:
+        """Store the ledger of *root*, built from *files* and the ``[pattern, paths]`` *globs*."""
+        meta = {"root": os.path.abspath(root), "files": [list(state) for state in files], "globs": globs or []}
+        write_ledger(self._entry("snapshots", root), ledger, meta)
+
+    def snapshot_files(self, root: str) -> list[FileState]:
+        """States of the files the snapshot of *root* was built from; empty if there is none."""
+        found = read_ledger(self._entry("snapshots", root))
+        if found is None or found[1].get("root") != os.path.abspath(root):
+            return []
+        return [FileState(*state) for state in found[1]["files"]]
+
+    def snapshot_globs(self, root: str) -> list[list[Any]]:
+        """The ``[pattern, paths]`` glob includes the snapshot of *root* was built from."""
+        found = read_ledger(self._entry("snapshots", root))
+        if found is None or found[1].get("root") != os.path.abspath(root):
+            return []
+        return found[1]["globs"]
+
+    def history_path(self, root: str, year: int | None = None) -> Path:
+        """Where to keep the year manifest of *root*, or the rows of one *year*.
+
+        See :mod:`valedger.history`.
+        """
+        if year is None:
+            return self._entry("history", root)
+        return self._entry("years", f"{root}#{year}")
+
+    def load_chunk(self, path: str) -> tuple[Chunk, FileState] | None:
+        """Return the cached chunk of *path* and the state of the file.
+
+        A chunk is returned as is if the file is unchanged.  If lines were
+        only appended to the file, the chunk is extended by parsing just
+        its last entry and the new lines, and stored again.  A chunk whose
+        glob includes match other files than before is not returned.
+        """
+        found = read_ledger(self._entry("chunks", path))
+        if found is None:
+            return None
+        ledger, meta = found
+        state = FileState(*meta["state"])
+        if state.path != path:
+            return None
+        includes = [(paths, tuple(mark), pattern) for paths, mark, pattern in meta["includes"]]
+        if not globs_current([[pattern, paths] for paths, _, pattern in includes if pattern]):
+            return None
+        line, mark, count, newlines = meta["resume"]
+        chunk = Chunk(path, ledger, includes, ParseStats(), Resume(line, tuple(mark), count, newlines))
+        if state.is_current():
+            return chunk, state
+        grown = appended(state, chunk.resume)
+        if grown is None:
+            return None
+        offset, state = grown
+        chunk = parse_chunk(path, chunk, offset)
+        self.store_chunk(chunk, state)
+        return chunk, state
+
+    def store_chunk(self, chunk: Chunk, state: FileState) -> None:
+        meta = {
+            "state": list(state),
+            "includes": [[paths, list(mark), pattern] for paths, mark, pattern in chunk.includes],
+            "resume": [chunk.resume.line, list(chunk.resume.mark), chunk.resume.includes, chunk.resume.newlines],
+        }
+        write_ledger(self._entry("chunks", chunk.path), chunk.ledger, meta)
+
+
+def load_cached(
+    path: str | PathLike[str],
+    stats: ParseStats | None = None,
+    workers: int | None = None,
+    cache: Cache | None = None,
+) -> Ledger:
+    """Load the journal at *path* through the cache.
+
+    An up-to-date snapshot is memory-mapped and returned directly.
+    Otherwise unchanged files are taken from their cached chunks, changed
+    files are parsed (in parallel, see :func:`~valedger.loader.load_journal`)
+    and the new chunks and snapshot are written back.
+    """
+    root = os.path.abspath(path)
+    cache = Cache() if cache is None else cache
+    stats = ParseStats() if stats is None else stats
+    ledger = cache.load_snapshot(root)
+    if ledger is not None:
+        return ledger
+    states: dict[str, FileState] = {}
+    # States of the files to parse, taken before they are parsed.
+    before: dict[str, FileState] = {}
+
+    def cached(file: str) -> Chunk | None:
+        found = cache.load_chunk(file)
+        if found is None:
+            try:
+                before[file] = FileState.of(file)
+            except FileNotFoundError:
+                pass
+            return None
+        chunk, states[file] = found
+        return chunk
+
+    chunks = parse_chunks(root, available_cpus() if workers is None else workers, cached)
+    changed = False
+    for file, chunk in chunks.items():
+        stats.add(chunk.stats)
+        if file not in states:
+            state = before.get(file)
+            if state is None or not state.is_current():
+                # The file changed while it was parsed: caching the chunk
+                # would pass the old rows off as the new content.
+                changed = True
+                continue
+            states[file] = state
+            cache.store_chunk(chunk, state)
+    ledger = Ledger()
+    splice(ledger, chunks, root)
+    ledger.sort()
+    ledger.order_accounts()
+    globs = [[pattern, paths] for chunk in chunks.values() for paths, _, pattern in chunk.includes if pattern]
+    if not changed:
+        cache.store_snapshot(root, ledger, list(states.values()), globs)
+    return ledger
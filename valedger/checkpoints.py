@@ -0,0 +1,278 @@
+"""Periodic balance checkpoints.
+
+A :class:`Checkpoints` index records the balance of every account in every
+commodity at regular points of a date-sorted ledger: at the start of each
+month (or other period of :mod:`valedger.aggregate`), or at the first day
+boundary after every *N* postings.  A balance, or the running balance a
+register starts from, is then the nearest earlier checkpoint plus the
+postings after it, at most one interval of them whatever the length of
+the journal.
+
+Checkpoints are saved next to the journal cache (see
+:meth:`~valedger.cache.Cache.index_path`) and mapped back with :mod:`mmap`.
+Each one also keeps a BLAKE2b digest of the posting columns since the
+previous one.  :meth:`Checkpoints.update` compares the digests with the
+ledger, which costs one hash over the columns rather than a pass in
+Python, and recomputes from the first checkpoint whose postings changed:
+a back-dated edit invalidates the checkpoints after its date and no
+others.  Renumbered accounts and widened commodity precisions change
+every posting, and so every checkpoint.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from os import PathLike
+from pathlib import Path
+
+from valedger.aggregate import PERIODS, next_period, period_start
+from valedger.ledger import Day, Ledger, to_array, to_day
+
+MAGIC = b"VLCKP\0"
+FORMAT = 1
+
+# Balances are keyed like the pairs of a BalanceIndex, account first, so
+# the pairs of an account id range are contiguous within a checkpoint.
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+_DIGEST = 16
+_HASHED = ("date", "account", "commodity", "amount")
+
+
+def _digest(ledger: Ledger, start: int, stop: int) -> bytes:
+    digest = hashlib.blake2b(digest_size=_DIGEST)
+    columns = ledger.postings.columns
+    for name in _HASHED:
+        digest.update(memoryview(columns[name])[start:stop])
+    return digest.digest()
+
+
+class Checkpoints:
+    """Balances of every account and commodity at regular points of a ledger.
+
+    *interval* is a period name (``month`` by default) or a number of
+    postings.  Queries take the ledger the index was last updated with.
+    """
+
+    __slots__ = ("interval", "rows", "_scales", "_days", "_rows", "_digests", "_offsets", "_keys", "_amounts")
+
+    def __init__(self, ledger: Ledger | None = None, interval: int | str = "month") -> None:
+        if isinstance(interval, str) and interval not in PERIODS:
+            raise ValueError(f"unknown period {interval!r}; expected one of {', '.join(PERIODS)}")
+        if isinstance(interval, int) and interval < 1:
+            raise ValueError("checkpoint interval must be at least one posting")
+        self.interval = interval
+        self.clear()
+        if ledger is not None:
+            self.update(ledger)
+
+    def clear(self) -> None:
+        self.rows = 0
+        self._scales = array("b")
+        # Checkpoint i holds the balances of the postings before row
+        # _rows[i], which are those dated before _days[i].
+        self._days: array | memoryview = array("i")
+        self._rows: array | memoryview = array("q")
+        self._digests: bytearray | memoryview = bytearray()
+        self._offsets: array | memoryview = array("q", (0,))
+        self._keys: array | memoryview = array("q")
+        self._amounts: array | memoryview = array("q")
+
+    def __len__(self) -> int:
+        """Number of checkpoints."""
+        return len(self._days)
+
+    def __repr__(self) -> str:
+        return f"Checkpoints({self.rows} postings, {len(self)} checkpoints)"
+
+    def days(self) -> list[int]:
+        """Days of the checkpoints; each holds the balances before its day."""
+        return list(self._days)
+
+    def update(self, ledger: Ledger) -> None:
+        """Bring the checkpoints up to date with the date-sorted *ledger*.
+
+        Checkpoints are kept up to the first one whose postings differ from
+        the ledger's; the later ones are computed again from it.
+        """
+        if not ledger.is_sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        if any(a != b for a, b in zip(self._scales, ledger.scales)):
+            self.clear()
+        self._scales = array("b", ledger.scales)
+        dates = ledger.postings.columns["date"]
+        valid = start = 0
+        for index, (day, stop) in enumerate(zip(self._days, self._rows)):
+            if stop > len(dates) or bisect_left(dates, day) != stop:
+                break
+            if _digest(ledger, start, stop) != self._digests[index * _DIGEST : (index + 1) * _DIGEST]:
+                break
+            valid, start = index + 1, stop
+        self._truncate(valid)
+        self._extend(ledger)
+
+    def invalidate(self, day: Day) -> None:
+        """Drop the checkpoints an edit of the postings of *day* makes stale.
+
+        The next :meth:`update` computes them again.
+        """
+        self._truncate(bisect_right(self._days, to_day(day)))
+
+    def _truncate(self, count: int) -> None:
+        if count == len(self._days) and type(self._days) is array:
+            self.rows = self._rows[-1] if count else 0
+            return
+        entries = self._offsets[count]
+        self._days = to_array("i", self._days[:count])
+        self._rows = to_array("q", self._rows[:count])
+        self._digests = bytearray(self._digests[: count * _DIGEST])
+        self._offsets = to_array("q", self._offsets[: count + 1])
+        self._keys = to_array("q", self._keys[:entries])
+        self._amounts = to_array("q", self._amounts[:entries])
+        self.rows = self._rows[-1] if count else 0
+
+    def _extend(self, ledger: Ledger) -> None:
+        """Add the checkpoints after the last one, which must be current."""
+        count = len(self._days)
+        last = self._rows[-1] if count else 0
+        lo, hi = self._offsets[count - 1], self._offsets[count]
+        running = dict(zip(self._keys[lo:hi], self._amounts[lo:hi])) if count else {}
+        period = self.interval if isinstance(self.interval, str) else None
+        every = self.interval if isinstance(self.interval, int) else 0
+        boundary = next_period(self._days[-1], period) if count and period else None
+        previous = None
+        with ledger.view(last) as view:
+            for row, (day, account, commodity, amount) in enumerate(
+                zip(view.date, view.account, view.commodity, view.amount), last
+            ):
+                if period is not None:
+                    if boundary is None:
+                        boundary = next_period(period_start(day, period), period)
+                    elif day >= boundary:
+                        start = period_start(day, period)
+                        self._checkpoint(ledger, start, last, row, running)
+                        last, boundary = row, next_period(start, period)
+                elif row - last >= every and day != previous:
+                    self._checkpoint(ledger, day, last, row, running)
+                    last = row
+                previous = day
+                key = account << _SHIFT | commodity
+                running[key] = running.get(key, 0) + amount
+        self.rows = len(ledger.postings)
+
+    def _checkpoint(self, ledger: Ledger, day: int, start: int, row: int, running: dict[int, int]) -> None:
+        self._days.append(day)
+        self._rows.append(row)
+        self._digests += _digest(ledger, start, row)
+        for key in sorted(running):
+            if running[key]:
+                self._keys.append(key)
+                self._amounts.append(running[key])
+        self._offsets.append(len(self._keys))
+
+    def _sum(self, ledger: Ledger, accounts: int | range, index: int, stop: int) -> dict[int, int]:
+        """Balances by commodity of *accounts* before posting row *stop*, from checkpoint *index*."""
+        if isinstance(accounts, int):
+            accounts = range(accounts, accounts + 1)
+        result: dict[int, int] = {}
+        start = 0
+        if index >= 0:
+            lo, hi = self._offsets[index], self._offsets[index + 1]
+            lo = bisect_left(self._keys, accounts.start << _SHIFT, lo, hi)
+            hi = bisect_left(self._keys, accounts.stop << _SHIFT, lo, hi)
+            for key, amount in zip(self._keys[lo:hi], self._amounts[lo:hi]):
+                result[key & _MASK] = result.get(key & _MASK, 0) + amount
+            start = self._rows[index]
+        columns = ledger.postings.columns
+        for account, commodity, amount in zip(
+            columns["account"][start:stop], columns["commodity"][start:stop], columns["amount"][start:stop]
+        ):
+            if account in accounts:
+                result[commodity] = result.get(commodity, 0) + amount
+        return {commodity: value for commodity, value in result.items() if value}
+
+    def balances(self, ledger: Ledger, accounts: int | range, day: Day) -> dict[int, int]:
+        """Balances at the end of *day* by commodity id, summed over *accounts*.
+
+        *accounts* is an account id or a range of ids such as a subtree.
+        """
+        day = to_day(day)
+        stop = ledger.rows_between(None, day + 1)[1]
+        return self._sum(ledger, accounts, bisect_right(self._days, day + 1) - 1, stop)
+
+    def balance(self, ledger: Ledger, account: int, commodity: int, day: Day) -> int:
+        """Scaled balance of one account in one commodity at the end of *day*."""
+        return self.balances(ledger, account, day).get(commodity, 0)
+
+    def before(self, ledger: Ledger, accounts: int | range, row: int) -> dict[int, int]:
+        """Balances by commodity of *accounts* just before posting *row*.
+
+        This is where the running balance of a register starting at *row*
+        begins.
+        """
+        return self._sum(ledger, accounts, bisect_right(self._rows, row) - 1, row)
+
+    def save(self, path: str | PathLike[str]) -> None:
+        """Write the checkpoints to *path* atomically."""
+        header = json.dumps(
+            {
+                "format": FORMAT,
+                "interval": self.interval,
+                "rows": self.rows,
+                "scales": list(self._scales),
+                "count": len(self._days),
+                "entries": len(self._keys),
+            }
+        ).encode()
+        start = len(MAGIC) + 4 + len(header)
+        padding = -start % 8
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "wb") as handle:
+            handle.write(MAGIC)
+            handle.write(len(header).to_bytes(4, "little"))
+            handle.write(header)
+            handle.write(b"\0" * padding)
+            # Eight-byte columns first keep every column aligned.
+            for values in (self._rows, self._offsets, self._keys, self._amounts, self._days):
+                handle.write(memoryview(values).cast("B"))
+            handle.write(self._digests)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str | PathLike[str], interval: int | str = "month") -> "Checkpoints":
+        """Map the checkpoints saved at *path*.
+
+        An empty index with *interval* is returned if there are none, or
+        they were saved with another interval.
+        """
+        index = cls(interval=interval)
+        try:
+            with open(path, "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return index
+        if mapped[: len(MAGIC)] != MAGIC:
+            return index
+        length = int.from_bytes(mapped[len(MAGIC) : len(MAGIC) + 4], "little")
+        header = json.loads(mapped[len(MAGIC) + 4 : len(MAGIC) + 4 + length])
+        if header.get("format") != FORMAT or header["interval"] != interval:
+            return index
+        start = len(MAGIC) + 4 + length
+        start += -start % 8
+        data = memoryview(mapped)[start:]
+        count, entries = header["count"], header["entries"]
+        views = []
+        for typecode, size, width in (("q", count, 8), ("q", count + 1, 8), ("q", entries, 8), ("q", entries, 8)):
+            views.append(data[: size * width].cast(typecode))
+            data = data[size * width :]
+        index._rows, index._offsets, index._keys, index._amounts = views
+        index._days = data[: count * 4].cast("i")
+        index._digests = data[count * 4 : count * (4 + _DIGEST)]
+        index._scales = array("b", header["scales"])
+        index.rows = header["rows"]
+        return index
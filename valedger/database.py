@@ -0,0 +1,210 @@
+"""SQLite storage for ledgers shared between processes.
+
+The binary cache (:mod:`valedger.cache`) serves a single user re-reading
+journal files.  When several processes need the same ledger, for example
+an importer, a web interface and scheduled reports, a :class:`Database`
+keeps it in one SQLite file that all of them read concurrently.
+
+Every table of the columnar store becomes an SQL table with the row
+index as its ``id`` primary key, and every interner a set of rows of
+``names``.  The database runs in WAL mode, so readers never block the writer nor
+each other.  Postings have covering indexes on (account, date) and
+(date), so balances and registers can also be computed in SQL without
+loading the ledger.
+
+:meth:`Database.sync` writes a ledger back incrementally.  A BLAKE2b
+digest of every table and interner, as stored, is kept in the database.
+When the ledger's first rows still have that digest, only the rows after
+them are inserted.  Any other table or interner is rewritten.  All
+changes go in one transaction, with ``executemany`` over the column
+arrays.
+"""
+
+import hashlib
+import json
+import sqlite3
+from array import array
+from collections.abc import Iterator
+from contextlib import contextmanager
+from os import PathLike
+from typing import Any
+
+from valedger.ledger import INTERNER_TYPES, INTERNERS, SCHEMAS, Interner, Ledger
+
+FORMAT = 2
+_CHUNK = 50_000
+
+
+def _digest_rows(columns: list[array | memoryview], count: int) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for column in columns:
+        digest.update(memoryview(column)[:count])
+    return digest.hexdigest()
+
+
+def _digest_names(names: list[str], count: int) -> str:
+    return hashlib.blake2b("\0".join(names[:count]).encode(), digest_size=16).hexdigest()
+
+
+def _quote(name: str) -> str:
+    return f'"{name}"'
+
+
+class Database:
+    """A ledger stored in the SQLite file at *path*."""
+
+    __slots__ = ("path", "_connection")
+
+    def __init__(self, path: str | PathLike[str], timeout: float = 30.0) -> None:
+        self.path = str(path)
+        self._connection = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, cached_statements=256)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._create()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "Database":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"Database({self.path!r})"
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _create(self) -> None:
+        with self._transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            found = connection.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+            if found and json.loads(found[0]).get("format") != FORMAT:
+                # Tables of an older format may lack columns; start over.
+                for table in ("names", "scales", *SCHEMAS):
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+                connection.execute("DELETE FROM meta WHERE key = 'state'")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS names"
+                " (kind TEXT NOT NULL, id INTEGER NOT NULL, name TEXT NOT NULL, PRIMARY KEY (kind, id)) WITHOUT ROWID"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS scales (id INTEGER PRIMARY KEY, scale INTEGER NOT NULL)")
+            for table, schema in SCHEMAS.items():
+                columns = ", ".join(f"{_quote(column.name)} INTEGER NOT NULL" for column in schema)
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {columns})")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS postings_account_date ON postings (account, date, commodity, amount)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS postings_date ON postings (date, account, commodity, amount)")
+
+    def _meta(self) -> dict[str, Any]:
+        found = self._connection.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+        state = json.loads(found[0]) if found else {}
+        return state if state.get("format") == FORMAT else {}
+
+    def __len__(self) -> int:
+        """Number of postings stored."""
+        return self._meta().get("tables", {}).get("postings", [0])[0]
+
+    def sync(self, ledger: Ledger) -> None:
+        """Bring the stored ledger up to date with *ledger*, in one transaction."""
+        with self._transaction() as connection:
+            state = self._meta()
+            stored_names = state.get("interners", {})
+            stored_tables = state.get("tables", {})
+            interners: dict[str, list] = {}
+            for kind in INTERNERS:
+                names = getattr(ledger, kind).names()
+                count, digest = stored_names.get(kind, (0, None))
+                if count > len(names) or (count and _digest_names(names, count) != digest):
+                    connection.execute("DELETE FROM names WHERE kind = ?", (kind,))
+                    count = 0
+                connection.executemany(
+                    "INSERT INTO names (kind, id, name) VALUES (?, ?, ?)",
+                    ((kind, ident, names[ident]) for ident in range(count, len(names))),
+                )
+                interners[kind] = [len(names), _digest_names(names, len(names))]
+            connection.execute("DELETE FROM scales")
+            connection.executemany("INSERT INTO scales (id, scale) VALUES (?, ?)", enumerate(ledger.scales))
+            tables: dict[str, list] = {}
+            for name, table in ledger.tables.items():
+                columns = [table.columns[column.name] for column in table.schema]
+                count, digest = stored_tables.get(name, (0, None))
+                if count > len(table) or (count and _digest_rows(columns, count) != digest):
+                    connection.execute(f"DELETE FROM {name}")
+                    count = 0
+                fields = ", ".join(_quote(column.name) for column in table.schema)
+                marks = ", ".join("?" * (len(columns) + 1))
+                insert = f"INSERT INTO {name} (id, {fields}) VALUES ({marks})"
+                for start in range(count, len(table), _CHUNK):
+                    stop = min(start + _CHUNK, len(table))
+                    connection.executemany(insert, zip(range(start, stop), *(column[start:stop] for column in columns)))
+                tables[name] = [len(table), _digest_rows(columns, len(table))]
+            state = {"format": FORMAT, "sorted": ledger.is_sorted, "interners": interners, "tables": tables}
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)", (json.dumps(state),))
+
+    def load(self) -> Ledger:
+        """Read the stored ledger into a new columnar :class:`~valedger.ledger.Ledger`."""
+        connection = self._connection
+        # A read transaction gives a consistent snapshot while a writer syncs.
+        connection.execute("BEGIN")
+        try:
+            state = self._meta()
+            if not state:
+                # Nothing synced yet: a new ledger, with its empty names.
+                return Ledger()
+            interners = {}
+            for kind in INTERNERS:
+                rows = connection.execute("SELECT name FROM names WHERE kind = ? ORDER BY id", (kind,))
+                names = [name for (name,) in rows]
+                interners[kind] = INTERNER_TYPES.get(kind, Interner).unpack("\0".join(names).encode(), len(names))
+            scales = array("b", [scale for (scale,) in connection.execute("SELECT scale FROM scales ORDER BY id")])
+            columns = {}
+            for name, schema in SCHEMAS.items():
+                arrays = [array(column.typecode) for column in schema]
+                fields = ", ".join(_quote(column.name) for column in schema)
+                cursor = connection.execute(f"SELECT {fields} FROM {name} ORDER BY id")
+                while batch := cursor.fetchmany(_CHUNK):
+                    for target, values in zip(arrays, zip(*batch)):
+                        target.extend(values)
+                columns[name] = {column.name: values for column, values in zip(schema, arrays)}
+        finally:
+            connection.execute("COMMIT")
+        return Ledger.restore(interners, scales, columns, state.get("sorted", True))
+
+    def balances(self, day: int | None = None, accounts: range | None = None) -> dict[tuple[int, int], int]:
+        """Scaled balances by (account id, commodity id) at the end of *day*.
+
+        Computed in SQL over the covering indexes; *accounts* limits the
+        result to a range of account ids such as a subtree.
+        """
+        query = "SELECT account, commodity, SUM(amount) FROM postings WHERE date <= ?"
+        parameters: list[int] = [2**31 - 1 if day is None else day]
+        if accounts is not None:
+            query += " AND account >= ? AND account < ?"
+            parameters += [accounts.start, accounts.stop]
+        query += " GROUP BY account, commodity"
+        return {
+            (account, commodity): total
+            for account, commodity, total in self._connection.execute(query, parameters)
+            if total
+        }
+
+    def register(self, accounts: range, start: int | None = None, end: int | None = None) -> list[int]:
+        """Rows of the postings of *accounts* dated in ``[start, end)``, by date."""
+        rows = self._connection.execute(
+            "SELECT id FROM postings WHERE account >= ? AND account < ? AND date >= ? AND date < ? ORDER BY date, id",
+            (accounts.start, accounts.stop, -(2**31) if start is None else start, 2**31 - 1 if end is None else end),
+        )
+        return [row for (row,) in rows]
+
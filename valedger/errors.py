@@ -0,0 +1,19 @@
+"""Exception hierarchy shared by all valedger modules."""
+
+
+class ValedgerError(Exception):
+    """Base class for errors raised by valedger."""
+
+
+class ParseError(ValedgerError):
+    """A journal could not be parsed.
+
+    *path* and *line* locate the offending input when known.
+    """
+
+    def __init__(self, message: str, path: str | None = None, line: int | None = None) -> None:
+        self.message = message
+        self.path = path
+        self.line = line
+        location = ":".join(str(part) for part in (path, line) if part is not None)
+        super().__init__(f"{location}: {message}" if location else message)
@@ -0,0 +1,304 @@
+"""Journal history loaded a few years at a time.
+
+Most sessions look at recent activity: this month's spending, this year's
+budget.  A :class:`History` opens a window of calendar years of a journal
+instead of the whole ledger, and reads older (or newer) years from the
+cache only when a query reaches them, so memory grows with the window
+being viewed rather than with the length of the journal.
+
+:func:`store_history` splits a date-sorted ledger into cache entries:
+
+* one file per year with that year's transactions, postings, annotations,
+  assertions, tags and balance directives.  Its interners are empty: ids
+  refer to the names in the manifest, so the rows are copied into a
+  window without translating them;
+* a manifest with every interner, commodity precision and price, and a
+  checkpoint at the start of every year: the balance of each account in
+  each commodity, kept in the manifest's ``balances`` table.
+
+The ledger of a window starts with one opening transaction carrying the
+checkpoint at the window's first day, followed by the rows of its years,
+so balances, registers and assertions within the window are those of the
+full ledger.  Commodities whose balances do not add up to zero, as after
+purchases at a cost, are balanced against an equity account.
+"""
+
+import hashlib
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from os import PathLike
+from typing import Any
+
+from valedger.cache import Cache, FileState, globs_current, load_cached, read_ledger, write_ledger
+from valedger.ledger import INTERNERS, SCHEMAS, Day, Ledger, from_day, to_array, to_day
+from valedger.parser import ParseStats
+
+OPENING = "Opening balances"
+
+# Tables split by year; prices stay in the manifest, as conversions at the
+# start of a window need the prices of earlier years.
+_YEARLY = ("postings", "transactions", "annotations", "assertions", "balances", "tags")
+
+
+def year_start(year: int) -> int:
+    """Day number of January 1st of *year*."""
+    return date(year, 1, 1).toordinal()
+
+
+def _years(ledger: Ledger) -> list[int]:
+    """Years with transactions or balance directives, in order."""
+    found = {from_day(day).year for day in ledger.balances.columns["date"]}
+    dates = ledger.transactions.columns["date"]
+    position = 0
+    while position < len(dates):
+        year = from_day(dates[position]).year
+        found.add(year)
+        position = bisect_left(dates, year_start(year + 1), position)
+    return sorted(found)
+
+
+def _slice(ledger: Ledger, start: int, end: int) -> dict[str, dict[str, array]]:
+    """Columns of the rows of *ledger* dated in ``[start, end)``, references rebased."""
+    dates = ledger.transactions.columns["date"]
+    first = bisect_left(dates, start)
+    lo, hi = ledger.rows_between(start, end)
+    offsets = {"postings": lo, "transactions": first}
+    limits = {"postings": hi, "transactions": bisect_left(dates, end, first)}
+    columns: dict[str, dict[str, array]] = {}
+    for name, schema in SCHEMAS.items():
+        source = ledger.tables[name].columns
+        if name in offsets:
+            rows: range | list[int] = range(offsets[name], limits[name])
+        elif name == "balances":
+            rows = [row for row, day in enumerate(source["date"]) if start <= day < end]
+        elif name in _YEARLY:
+            # Side tables follow the posting or transaction they refer to.
+            key = next(column for column in schema if column.ref in offsets)
+            lo, hi = offsets[key.ref], limits[key.ref]
+            rows = [row for row, value in enumerate(source[key.name]) if lo <= value < hi]
+        else:
+            rows = []
+        table = {}
+        for column in schema:
+            values = source[column.name]
+            if isinstance(rows, range):
+                selected = to_array(column.typecode, memoryview(values)[rows.start : rows.stop])
+            else:
+                selected = array(column.typecode, map(values.__getitem__, rows))
+            shift = offsets.get(column.ref or "")
+            if shift:
+                selected = array(column.typecode, (value - shift for value in selected))
+            table[column.name] = selected
+        columns[name] = table
+    return columns
+
+
+def _digest(columns: dict[str, dict[str, array]]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for table in columns.values():
+        for values in table.values():
+            digest.update(memoryview(values).cast("B"))
+    return digest.hexdigest()
+
+
+def _restore(columns: dict[str, dict[str, array]], interners: Ledger, scales: array | memoryview) -> Ledger:
+    return Ledger.restore({name: getattr(interners, name) for name in INTERNERS}, scales, columns, True)
+
+
+def store_history(
+    cache: Cache,
+    root: str | PathLike[str],
+    ledger: Ledger,
+    files: list[FileState],
+    globs: list[list[Any]] | None = None,
+) -> None:
+    """Write the year files and manifest of the date-sorted *ledger* of *root*.
+
+    *files* are the journal files it was built from and *globs* the
+    ``[pattern, paths]`` glob includes, both checked when the history is
+    opened.  A year file whose rows did not change is kept.
+    """
+    if not ledger.is_sorted:
+        raise ValueError("ledger is not in date order; call sort() first")
+    root = os.path.abspath(root)
+    found = read_ledger(cache.history_path(root))
+    previous: dict[int, str] = {}
+    if found is not None and found[1].get("root") == root:
+        previous = {year: digest for year, digest in found[1]["years"]}
+    checkpoints: dict[str, array] = {column.name: array(column.typecode) for column in SCHEMAS["balances"]}
+    running: dict[tuple[int, int], int] = {}
+    columns = ledger.postings.columns
+    position = 0
+
+    def checkpoint(day: int) -> None:
+        nonlocal position
+        stop = bisect_left(columns["date"], day, position)
+        for account, commodity, amount in zip(
+            columns["account"][position:stop], columns["commodity"][position:stop], columns["amount"][position:stop]
+        ):
+            running[account, commodity] = running.get((account, commodity), 0) + amount
+        position = stop
+        for (account, commodity), amount in sorted(running.items()):
+            if amount:
+                for name, value in zip(checkpoints, (day, account, commodity, amount, 0, 0)):
+                    checkpoints[name].append(value)
+
+    years = []
+    empty = Ledger()
+    for year in _years(ledger):
+        checkpoint(year_start(year))
+        sliced = _slice(ledger, year_start(year), year_start(year + 1))
+        digest = _digest(sliced)
+        path = cache.history_path(root, year)
+        if previous.get(year) != digest or not path.exists():
+            write_ledger(path, _restore(sliced, empty, array("b")), {"root": root, "year": year})
+        years.append([year, digest])
+    if years:
+        checkpoint(year_start(years[-1][0] + 1))
+    for year in previous.keys() - {year for year, _ in years}:
+        cache.history_path(root, year).unlink(missing_ok=True)
+    manifest = {name: {column.name: array(column.typecode) for column in schema} for name, schema in SCHEMAS.items()}
+    manifest["prices"] = ledger.prices.columns
+    manifest["balances"] = checkpoints
+    meta = {"root": root, "files": [list(state) for state in files], "globs": globs or [], "years": years}
+    write_ledger(cache.history_path(root), _restore(manifest, ledger, ledger.scales), meta)
+
+
+class History:
+    """A window of calendar years of the journal at *path*.
+
+    The window initially covers the years of the days ``[start, end)``;
+    ``None`` stands for the first or the last year of the journal.  The
+    history is built from :func:`~valedger.cache.load_cached` when the
+    cache has none or a journal file changed.
+    """
+
+    __slots__ = ("root", "cache", "equity", "ledger", "window", "_workers", "_years")
+
+    def __init__(
+        self,
+        path: str | PathLike[str],
+        start: Day | None = None,
+        end: Day | None = None,
+        cache: Cache | None = None,
+        stats: ParseStats | None = None,
+        workers: int | None = None,
+        equity: str = "Equity:Opening Balances",
+    ) -> None:
+        self.root = os.path.abspath(path)
+        self.cache = Cache() if cache is None else cache
+        self.equity = equity
+        self._workers = workers
+        self.ledger = Ledger()
+        self.window: tuple[int, int] | None = None
+        found = self._manifest()
+        if found is None:
+            self._store(stats)
+            found = self._manifest()
+            assert found is not None
+        self._years: list[int] = [year for year, _ in found[1]["years"]]
+        self.load(start, end)
+
+    def __repr__(self) -> str:
+        if self.window is None:
+            return f"History({self.root!r})"
+        return f"History({self.root!r}, years {self.window[0]}-{self.window[1]})"
+
+    @property
+    def years(self) -> list[int]:
+        """Years of the journal with transactions or balance directives."""
+        return list(self._years)
+
+    def _manifest(self) -> tuple[Ledger, dict[str, Any]] | None:
+        found = read_ledger(self.cache.history_path(self.root))
+        if found is None:
+            return None
+        meta = found[1]
+        if meta.get("root") != self.root or not all(FileState(*state).is_current() for state in meta["files"]):
+            return None
+        if not globs_current(meta["globs"]):
+            return None
+        return found
+
+    def _store(self, stats: ParseStats | None = None) -> None:
+        ledger = load_cached(self.root, stats, self._workers, self.cache)
+        files, globs = self.cache.snapshot_files(self.root), self.cache.snapshot_globs(self.root)
+        store_history(self.cache, self.root, ledger, files, globs)
+
+    def load(self, start: Day | None = None, end: Day | None = None) -> Ledger:
+        """Make sure the window covers the days ``[start, end)`` and return its ledger.
+
+        The window only grows: years already loaded stay loaded.  When it
+        grows, the ledger is rebuilt from the cache, so indexes kept over
+        the previous ledger are rebuilt too when next updated.
+        """
+        years = self._years
+        if not years:
+            if self.window is None:
+                self.ledger = self._build(0, -1)
+                self.window = (0, -1)
+            return self.ledger
+        first = years[0] if start is None else min(max(from_day(to_day(start)).year, years[0]), years[-1] + 1)
+        last = years[-1] if end is None else min(from_day(to_day(end) - 1).year, years[-1])
+        if self.window is not None:
+            first, last = min(first, self.window[0]), max(last, self.window[1])
+        if (first, last) != self.window:
+            self.ledger = self._build(first, last)
+            self.window = (first, last)
+        return self.ledger
+
+    def rows_between(self, start: Day | None = None, end: Day | None = None) -> tuple[int, int]:
+        """Posting rows of the window dated in ``[start, end)``, loading years as needed."""
+        return self.load(start, end).rows_between(start, end)
+
+    def _build(self, first: int, last: int) -> Ledger:
+        found = self._manifest()
+        if found is None:
+            self._store()
+            found = self._manifest()
+            assert found is not None
+            self._years = [year for year, _ in found[1]["years"]]
+        ledger = found[0]
+        # The manifest's balances are the checkpoints; the window gets the
+        # balance directives of its own years instead.
+        checkpoints = ledger.balances.columns
+        dates = checkpoints["date"]
+        opening: list[tuple[int, int, int]] = []
+        if self._years:
+            # The checkpoint of the window's first year, or of the next year
+            # with transactions when it has none; past the last year, the
+            # journal's final balances.  None means all were zero.
+            position = bisect_left(self._years, first)
+            seed = year_start(self._years[position] if position < len(self._years) else self._years[-1] + 1)
+            lo = bisect_left(dates, seed)
+            hi = bisect_right(dates, seed, lo)
+            amounts = checkpoints["amount"]
+            opening = list(zip(checkpoints["account"][lo:hi], checkpoints["commodity"][lo:hi], amounts[lo:hi]))
+        ledger.truncate(tuple(0 if name == "balances" else len(table) for name, table in ledger.tables.items()))
+        if opening:
+            day = year_start(first)
+            txn = ledger.begin_transaction(day, ledger.payees.intern(OPENING))
+            residual: dict[int, int] = {}
+            for account, commodity, amount in opening:
+                ledger.append(day, txn, account, commodity, amount)
+                residual[commodity] = residual.get(commodity, 0) + amount
+            for commodity, amount in residual.items():
+                if amount:
+                    ledger.append(day, txn, ledger.accounts.intern(self.equity), commodity, -amount)
+        for year in self._years:
+            if first <= year <= last:
+                ledger.extend(self._year(year))
+        ledger.order_accounts()
+        return ledger
+
+    def _year(self, year: int) -> Ledger:
+        found = read_ledger(self.cache.history_path(self.root, year))
+        if found is None:
+            # The year file was removed from the cache behind our back.
+            self._store()
+            found = read_ledger(self.cache.history_path(self.root, year))
+            if found is None:
+                raise ValueError(f"no year {year} in the history of {self.root}")
+        return found[0]
@@ -0,0 +1,55 @@
+"""Import of bank statements: CSV, OFX/QFX, QIF and CAMT.053.
+
+See :mod:`valedger.importers.pipeline` for how statements flow through the
+decode, normalize, dedupe, categorize and emit stages.
+"""
+
+from valedger.importers.camt import read_camt
+from valedger.importers.csvfile import CsvLayout, read_csv
+from valedger.importers.fingerprints import FingerprintIndex
+from valedger.importers.learning import Categorizer
+from valedger.importers.ofx import read_ofx
+from valedger.importers.pipeline import (
+    Record,
+    Rule,
+    Stage,
+    categorize,
+    decode,
+    dedupe,
+    detect,
+    emit,
+    fingerprint,
+    normalize,
+    normalize_payee,
+    pipeline,
+    store,
+)
+from valedger.importers.qif import read_qif
+from valedger.importers.rules import CategoryRule, RuleSet, load_rules, parse_rules
+
+__all__ = [
+    "Categorizer",
+    "CategoryRule",
+    "CsvLayout",
+    "FingerprintIndex",
+    "Record",
+    "Rule",
+    "RuleSet",
+    "Stage",
+    "categorize",
+    "decode",
+    "dedupe",
+    "detect",
+    "emit",
+    "fingerprint",
+    "load_rules",
+    "normalize",
+    "normalize_payee",
+    "parse_rules",
+    "pipeline",
+    "read_camt",
+    "read_csv",
+    "read_ofx",
+    "read_qif",
+    "store",
+]
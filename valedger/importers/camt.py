@@ -0,0 +1,92 @@
+"""ISO 20022 CAMT.053 bank-to-customer statements.
+
+Multi-year CAMT exports easily run into hundreds of megabytes, so they are
+read with :func:`xml.etree.ElementTree.iterparse`: every ``Ntry`` (entry)
+element is turned into a record as soon as it is complete and then
+removed from the tree, keeping memory bounded by a single entry whatever
+the file size.  Element names are matched without their namespace, which
+differs between the yearly versions of the schema.
+"""
+
+from collections.abc import Iterator
+from os import PathLike
+from xml.etree.ElementTree import Element, iterparse
+
+from valedger.errors import ParseError
+from valedger.importers.pipeline import Record
+from valedger.money import Money
+from valedger.parser import parse_date
+
+
+def _namespace(tag: str) -> str:
+    return tag[: tag.index("}") + 1] if tag.startswith("{") else ""
+
+
+def read_camt(path: str | PathLike[str], account: str = "") -> Iterator[Record]:
+    """Decode a CAMT.053 statement file, which may hold several statements.
+
+    Records take the IBAN (or other id) of their statement's account unless
+    *account* is given.
+    """
+    source = str(path)
+    own = account
+    events = iterparse(path, events=("start", "end"))
+    count = 0
+    try:
+        _, root = next(events)
+        ns = _namespace(root.tag)
+        statements = (f"{ns}Stmt", f"{ns}Rpt")
+        entry, account_tag = f"{ns}Ntry", f"{ns}Acct"
+        statement = root
+        for event, element in events:
+            tag = element.tag
+            if event == "start":
+                if tag in statements:
+                    statement = element
+            elif tag == entry:
+                count += 1
+                yield _entry(element, ns, own, source, count)
+                statement.remove(element)
+            elif tag == account_tag and not account:
+                own = element.findtext(f"{ns}Id/{ns}IBAN") or element.findtext(f"{ns}Id/{ns}Othr/{ns}Id") or own
+            elif tag in statements:
+                element.clear()
+    except SyntaxError as error:
+        raise ParseError(f"invalid CAMT.053 XML: {error}", source) from None
+
+
+def _flatten(element: Element, skip: int, prefix: str, fields: dict[str, str]) -> None:
+    """Collect the text of the leaves below *element* by path, first one wins."""
+    for child in element:
+        path = prefix + child.tag[skip:]
+        if len(child):
+            _flatten(child, skip, path + "/", fields)
+        elif path not in fields:
+            fields[path] = (child.text or "").strip()
+
+
+def _entry(entry: Element, ns: str, account: str, source: str, count: int) -> Record:
+    fields: dict[str, str] = {}
+    _flatten(entry, len(ns), "", fields)
+    get = fields.get
+    amount = entry.find(f"{ns}Amt")
+    if amount is None or not amount.text:
+        raise ParseError("entry without an amount", source, count)
+    try:
+        money = Money.parse(amount.text, amount.get("Ccy", ""))
+        booked = get("BookgDt/Dt") or get("BookgDt/DtTm", "")[:10] or get("ValDt/Dt") or get("ValDt/DtTm", "")[:10]
+        day = parse_date(booked)
+    except ValueError as error:
+        raise ParseError(str(error), source, count) from None
+    debit = get("CdtDbtInd") == "DBIT"
+    if get("RvslInd") == "true":
+        debit = not debit
+    party = "NtryDtls/TxDtls/RltdPties/" + ("Cdtr" if debit else "Dbtr")
+    payee = get(f"{party}/Nm") or get(f"{party}/Pty/Nm") or ""
+    memo = get("NtryDtls/TxDtls/RmtInf/Ustrd") or get("NtryDtls/TxDtls/RmtInf/Strd/CdtrRefInf/Ref")
+    memo = memo or get("AddtlNtryInf") or ""
+    reference = get("NtryDtls/TxDtls/Refs/EndToEndId", "")
+    if reference == "NOTPROVIDED":
+        reference = ""
+    reference = reference or get("NtryDtls/TxDtls/Refs/AcctSvcrRef") or get("AcctSvcrRef") or get("NtryRef") or ""
+    return Record(day, -money if debit else money, payee, memo, reference, account, "", source, count)
@@ -0,0 +1,103 @@
+"""CSV statements.
+
+Every bank lays out its CSV exports differently, so the columns are
+described by a :class:`CsvLayout` naming the header of each field.  The
+default layout matches the common English headers and guesses the rest.
+"""
+
+from collections.abc import Iterator
+from csv import DictReader
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from os import PathLike
+
+from valedger.errors import ParseError
+from valedger.importers.pipeline import Record
+from valedger.money import Money
+
+
+@dataclass(slots=True)
+class CsvLayout:
+    """Headers and formats of one bank's CSV export.
+
+    Amounts come from *amount*, or from separate *debit* and *credit*
+    columns (debits are made negative).  Headers are compared
+    case-insensitively; a field whose header is missing from the file is
+    left empty.
+    """
+
+    date: str = "date"
+    amount: str | None = "amount"
+    debit: str | None = None
+    credit: str | None = None
+    payee: str = "payee"
+    memo: str | None = "memo"
+    reference: str | None = "reference"
+    account: str | None = "account"
+    currency: str | None = "currency"
+    date_format: str = "%Y-%m-%d"
+    delimiter: str = ","
+    decimal: str = "."
+    encoding: str = "utf-8-sig"
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text: str, format: str) -> int:
+    return datetime.strptime(text.strip(), format).toordinal()
+
+
+def parse_decimal(text: str, commodity: str, decimal: str = ".") -> Money:
+    """Parse a bank-formatted number such as ``-1.234,56`` with the given decimal mark."""
+    text = text.strip().replace(" ", "").replace("\u00a0", "")
+    if decimal != ".":
+        text = text.replace(".", "").replace(decimal, ".")
+    negative = text.endswith("-") or text.startswith("(") and text.endswith(")")
+    text = text.strip("()").rstrip("-")
+    money = Money.parse(text, commodity)
+    return -money if negative else money
+
+
+def read_csv(
+    path: str | PathLike[str], layout: CsvLayout | None = None, commodity: str = "", account: str = ""
+) -> Iterator[Record]:
+    """Decode a CSV statement; *commodity* and *account* fill missing columns."""
+    layout = CsvLayout() if layout is None else layout
+    source = str(path)
+    with open(path, newline="", encoding=layout.encoding) as handle:
+        reader = DictReader(handle, delimiter=layout.delimiter)
+        headers = {name.strip().casefold(): name for name in reader.fieldnames or ()}
+
+        def column(name: str | None) -> str | None:
+            return headers.get(name.casefold()) if name else None
+
+        date, amount, debit, credit = map(column, (layout.date, layout.amount, layout.debit, layout.credit))
+        payee, memo, reference = map(column, (layout.payee, layout.memo, layout.reference))
+        own, currency = column(layout.account), column(layout.currency)
+        if date is None or (amount is None and debit is None and credit is None):
+            raise ParseError("CSV statement lacks a date or amount column", source, 1)
+        for row in reader:
+            line = reader.line_num
+            try:
+                code = (row[currency] if currency else "") or commodity
+                if amount is not None:
+                    money = parse_decimal(row[amount], code, layout.decimal)
+                elif debit is not None and row[debit].strip():
+                    money = -abs(parse_decimal(row[debit], code, layout.decimal))
+                elif credit is None:
+                    raise ParseError("row has no debit amount", source, line)
+                else:
+                    money = abs(parse_decimal(row[credit], code, layout.decimal))
+                yield Record(
+                    parse_date(row[date], layout.date_format),
+                    money,
+                    row[payee] if payee else "",
+                    row[memo] if memo else "",
+                    row[reference] if reference else "",
+                    (row[own] if own else "") or account,
+                    "",
+                    source,
+                    line,
+                )
+            except (ValueError, TypeError) as error:
+                raise ParseError(str(error), source, line) from None
@@ -0,0 +1,301 @@
+"""Persistent fingerprint index for duplicate detection.
+
+Re-importing a statement that overlaps the journal must not compare every
+new row against every recorded posting.  A :class:`FingerprintIndex` keeps
+a stable 64-bit hash of every recorded posting so that checking a row is a
+binary search, and a batch of rows costs O(batch) whatever the size of the
+ledger.
+
+Keys are kept in sorted ``array('q')`` columns:
+
+* the *exact* key hashes the date, amount, account and normalized payee;
+  a posting whose transaction has a code (the bank reference of imported
+  transactions) has a second exact key with the reference in place of the
+  payee.  A record with a reference is looked up by that key first, then
+  by its payee, so it is recognised whether or not the journal kept the
+  reference;
+* the *fuzzy* key hashes only amount and account and is bucketed by day:
+  the day fills the low bits, so all postings of one amount and account
+  within ``±N`` days form one contiguous range of the array.
+
+Records let through by :meth:`FingerprintIndex.filter` are remembered
+apart from the ledger's postings, as the number of postings each of their
+keys must at least have.  Once they are stored in the journal and the
+ledger is indexed again they are found there, and counted once.
+
+The arrays are written to a small file next to the journal cache and
+mapped back with :mod:`mmap`, so opening the index costs nothing.
+Postings appended to the ledger later are held in memory until
+:meth:`FingerprintIndex.save`.  When the ledger's rows were rewritten
+since the last update (see :attr:`~valedger.ledger.Ledger.generation`),
+a digest of the postings and transactions indexed tells whether they are
+still the same, and the ledger's fingerprints are computed again if not.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from os import PathLike
+from pathlib import Path
+
+from valedger.importers.pipeline import Record, normalize_payee
+from valedger.ledger import Ledger
+from valedger.money import Money
+
+MAGIC = b"VLFPX\0"
+FORMAT = 2
+_DAY_BITS = 20  # day numbers stay below 2**20 until the year 2870
+_DAY_MASK = (1 << _DAY_BITS) - 1
+
+
+def _amount(value: int, scale: int, commodity: str) -> str:
+    while scale and value % 10 == 0:
+        value, scale = value // 10, scale - 1
+    return f"{value}e-{scale} {commodity}"
+
+
+def _hash(*parts: object) -> int:
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def exact_key(day: int, amount: Money, account: str, payee: str, reference: str = "") -> int:
+    """Hash identifying one posting of one transaction, by *reference* if given, else by payee."""
+    identity = f"ref:{reference}" if reference else f"payee:{normalize_payee(payee)}"
+    return _hash(day, _amount(amount.value, amount.scale, amount.commodity), account, identity)
+
+
+def fuzzy_key(day: int, amount: Money, account: str) -> int:
+    """Hash of amount and account with *day* in the low bits, so keys sort by day."""
+    key = _hash(_amount(amount.value, amount.scale, amount.commodity), account) & ((1 << (63 - _DAY_BITS)) - 1)
+    return key << _DAY_BITS | day
+
+
+def _exact_keys(day: int, amount: Money, account: str, payee: str, reference: str = "") -> list[int]:
+    """The exact keys of a posting or record: by reference first, if any, then by payee."""
+    keys = [exact_key(day, amount, account, payee)]
+    if reference:
+        keys.insert(0, exact_key(day, amount, account, payee, reference))
+    return keys
+
+
+def _digest(ledger: Ledger, rows: int) -> bytes:
+    transactions = ledger.postings.columns["txn"][rows - 1] + 1 if rows else 0
+    return ledger.digest(rows) + ledger.digest(transactions, "transactions")
+
+
+def _pairs(floors: dict[int, int]) -> tuple[array, array]:
+    keys = array("q", sorted(floors))
+    return keys, array("q", map(floors.__getitem__, keys))
+
+
+class FingerprintIndex:
+    """Fingerprints of the postings of a ledger and of imported records."""
+
+    __slots__ = (
+        "rows",
+        "generation",
+        "_digest",
+        "_exact",
+        "_fuzzy",
+        "_new_exact",
+        "_new_fuzzy",
+        "_imported",
+        "_imported_fuzzy",
+        "_imported_days",
+    )
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget the ledger's postings and the imported records."""
+        self._reset()
+        # Imported records: the least number of postings each key must have.
+        self._imported: dict[int, int] = {}
+        self._imported_fuzzy: dict[int, int] = {}
+        self._imported_days: list[int] = []  # sorted keys of _imported_fuzzy
+
+    def _reset(self) -> None:
+        self.rows = 0
+        self.generation = -1
+        self._digest = b""
+        self._exact: array | memoryview = array("q")
+        self._fuzzy: array | memoryview = array("q")
+        self._new_exact: Counter[int] = Counter()
+        self._new_fuzzy: list[int] = []  # sorted
+
+    def __len__(self) -> int:
+        """Number of postings and imported records fingerprinted."""
+        missing = sum(max(floor - self._recorded(key), 0) for key, floor in self._imported_fuzzy.items())
+        return len(self._fuzzy) + len(self._new_fuzzy) + missing
+
+    def __repr__(self) -> str:
+        return f"FingerprintIndex({len(self)} fingerprints, {self.rows} postings)"
+
+    def update(self, ledger: Ledger) -> None:
+        """Fingerprint the postings appended to *ledger* since the last update.
+
+        The ledger's postings are fingerprinted again if the ledger has
+        fewer postings than were indexed or the indexed ones changed.
+        """
+        if len(ledger) < self.rows or (
+            self.rows and ledger.generation != self.generation and _digest(ledger, self.rows) != self._digest
+        ):
+            self._reset()
+        postings = ledger.postings.columns
+        transactions = ledger.transactions.columns
+        accounts, payees, codes = ledger.accounts, ledger.payees, ledger.codes
+        for row in range(self.rows, len(ledger)):
+            txn = postings["txn"][row]
+            day = postings["date"][row]
+            amount = ledger.money(postings["commodity"][row], postings["amount"][row])
+            account = accounts.name(postings["account"][row])
+            payee = payees.name(transactions["payee"][txn])
+            for key in _exact_keys(day, amount, account, payee, codes.name(transactions["code"][txn])):
+                self._new_exact[key] += 1
+            self._new_fuzzy.append(fuzzy_key(day, amount, account))
+        self._new_fuzzy.sort()
+        self.rows = len(ledger)
+        self.generation = ledger.generation
+        self._digest = _digest(ledger, self.rows)
+
+    def add(self, day: int, amount: Money, account: str, payee: str, reference: str = "") -> None:
+        """Record an imported transaction that the ledger may not have yet."""
+        for key in _exact_keys(day, amount, account, payee, reference):
+            self._imported[key] = self.count(key) + 1
+        key = fuzzy_key(day, amount, account)
+        if key not in self._imported_fuzzy:
+            insort(self._imported_days, key)
+        self._imported_fuzzy[key] = max(self._recorded(key), self._imported_fuzzy.get(key, 0)) + 1
+
+    def add_record(self, record: Record) -> None:
+        self.add(record.date, record.amount, record.account, record.payee, record.reference)
+
+    def count(self, key: int) -> int:
+        """Number of recorded postings with exact fingerprint *key*."""
+        exact = self._exact
+        found = bisect_right(exact, key) - bisect_left(exact, key) + self._new_exact.get(key, 0)
+        return max(found, self._imported.get(key, 0))
+
+    def _recorded(self, key: int) -> int:
+        """Number of the ledger's postings with fuzzy key *key*."""
+        return sum(bisect_right(fuzzy, key) - bisect_left(fuzzy, key) for fuzzy in (self._fuzzy, self._new_fuzzy))
+
+    def nearby(self, day: int, amount: Money, account: str, window: int) -> list[int]:
+        """Fuzzy keys of the recorded postings of *amount* and *account* within ``±window`` days."""
+        key = fuzzy_key(day, amount, account)
+        low, high = key - min(window, day), key + window
+        found: Counter[int] = Counter()
+        for fuzzy in (self._fuzzy, self._new_fuzzy):
+            found.update(fuzzy[bisect_left(fuzzy, low) : bisect_right(fuzzy, high)])
+        imported = self._imported_days
+        for value in imported[bisect_left(imported, low) : bisect_right(imported, high)]:
+            found[value] = max(found[value], self._imported_fuzzy[value])
+        return list(found.elements())
+
+    def filter(self, records: Iterable[Record], window: int = 0, record: bool = True) -> Iterator[Record]:
+        """Yield the records that are not recorded yet.
+
+        A record is a duplicate if a recorded posting has one of its exact
+        fingerprints or, with a *window*, the same amount and account
+        within ``±window`` days (the closest one is taken).  Each recorded
+        posting matches at most one record, so a statement with three
+        equal coffees on a day where the journal has two yields one.
+        Unless *record* is false, the records yielded are remembered as
+        imported (see :meth:`add`).
+        """
+        used_exact: Counter[int] = Counter()
+        used_fuzzy: Counter[int] = Counter()
+        for item in records:
+            keys = _exact_keys(item.date, item.amount, item.account, item.payee, item.reference)
+            near = fuzzy_key(item.date, item.amount, item.account)
+            match = next((key for key in keys if used_exact[key] < self.count(key)), None)
+            if match is not None:
+                # A posting found by its reference has a payee key too;
+                # it must not match another record by that one.
+                for key in keys[keys.index(match) :]:
+                    used_exact[key] += 1
+                used_fuzzy[near] += 1
+                continue
+            if window:
+                candidates = Counter(self.nearby(item.date, item.amount, item.account, window))
+                free = [value for value, count in candidates.items() if used_fuzzy[value] < count]
+                if free:
+                    used_fuzzy[min(free, key=lambda value: abs((value & _DAY_MASK) - item.date))] += 1
+                    continue
+            if record:
+                self.add_record(item)
+                for key in keys:
+                    used_exact[key] += 1
+                used_fuzzy[near] += 1
+            yield item
+
+    def save(self, path: str | PathLike[str]) -> None:
+        """Write the index to *path* atomically, merging in-memory additions."""
+        exact = array("q", sorted([*self._exact, *self._new_exact.elements()]))
+        fuzzy = array("q", sorted([*self._fuzzy, *self._new_fuzzy]))
+        imported, floors = _pairs(self._imported)
+        imported_fuzzy, fuzzy_floors = _pairs(self._imported_fuzzy)
+        header = json.dumps(
+            {
+                "format": FORMAT,
+                "rows": self.rows,
+                "digest": self._digest.hex(),
+                "exact": len(exact),
+                "fuzzy": len(fuzzy),
+                "imported": len(imported),
+                "imported_fuzzy": len(imported_fuzzy),
+            }
+        ).encode()
+        start = len(MAGIC) + 4 + len(header)
+        padding = -start % 8
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "wb") as handle:
+            handle.write(MAGIC)
+            handle.write(len(header).to_bytes(4, "little"))
+            handle.write(header)
+            handle.write(b"\0" * padding)
+            for values in (exact, fuzzy, imported, floors, imported_fuzzy, fuzzy_floors):
+                values.tofile(handle)
+        os.replace(temporary, path)
+        self._exact, self._fuzzy = exact, fuzzy
+        self._new_exact, self._new_fuzzy = Counter(), []
+
+    @classmethod
+    def load(cls, path: str | PathLike[str]) -> "FingerprintIndex":
+        """Map the index saved at *path*; an empty index if there is none."""
+        index = cls()
+        try:
+            with open(path, "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return index
+        if mapped[: len(MAGIC)] != MAGIC:
+            return index
+        length = int.from_bytes(mapped[len(MAGIC) : len(MAGIC) + 4], "little")
+        header = json.loads(mapped[len(MAGIC) + 4 : len(MAGIC) + 4 + length])
+        if header.get("format") != FORMAT:
+            return index
+        start = len(MAGIC) + 4 + length
+        start += -start % 8
+        data = memoryview(mapped)[start:].cast("q")
+        views = []
+        for size in (header["exact"], header["fuzzy"], header["imported"], header["imported"]):
+            views.append(data[:size])
+            data = data[size:]
+        index._exact, index._fuzzy, imported, floors = views
+        size = header["imported_fuzzy"]
+        index._imported = dict(zip(imported, floors))
+        index._imported_days = list(data[:size])
+        index._imported_fuzzy = dict(zip(index._imported_days, data[size : 2 * size]))
+        index.rows = header["rows"]
+        index._digest = bytes.fromhex(header["digest"])
+        return index
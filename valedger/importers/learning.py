@@ -0,0 +1,226 @@
+"""Categorization learned from the journal.
+
+Explicit rules (see :mod:`valedger.importers.rules`) only cover the payees
+somebody wrote a rule for.  A :class:`Categorizer` learns from recorded
+transactions which accounts the words of their payees and notes go with,
+and suggests the counter account of imported lines by multinomial naive
+Bayes.
+
+The model is an inverted index from token to per-account counts, so
+learning a transaction touches only its own tokens and the model is
+updated in place as transactions are added, never retrained.  Scoring a
+line only visits the accounts that actually occur with its tokens.  When
+transactions it learned from change, for example a back-dated one was
+sorted in among them (a digest of their rows tells, once the ledger's
+:attr:`~valedger.ledger.Ledger.generation` moved), the model starts over.
+"""
+
+import json
+import math
+import os
+import re
+from collections.abc import Iterable
+from os import PathLike
+from pathlib import Path
+
+from valedger.importers.pipeline import Record
+from valedger.ledger import Ledger
+
+_TOKEN = re.compile(r"[^\W\d_]{2,}")
+FORMAT = 2
+
+
+def _digest(ledger: Ledger, transactions: int) -> bytes:
+    first = ledger.transactions.columns["first"]
+    rows = first[transactions] if transactions < len(first) else len(ledger)
+    return ledger.digest(transactions, "transactions") + ledger.digest(rows)
+
+
+def tokenize(*texts: str) -> list[str]:
+    """Lower-case words of at least two letters; numbers are dropped."""
+    return [token for text in texts for token in _TOKEN.findall(text.casefold())]
+
+
+class Categorizer:
+    """Naive Bayes model of the accounts that go with payee and note words.
+
+    Only accounts below one of *roots* are learned and suggested, which by
+    default leaves out the asset and liability accounts that statements
+    themselves are about.  Used as a categorization rule, it only answers
+    when its best suggestion has at least *confidence* probability.
+    """
+
+    __slots__ = (
+        "roots",
+        "smoothing",
+        "confidence",
+        "transactions",
+        "generation",
+        "_digest",
+        "_tokens",
+        "_documents",
+        "_totals",
+        "_base",
+        "_weights",
+    )
+
+    def __init__(
+        self, roots: Iterable[str] = ("Expenses", "Income"), smoothing: float = 0.1, confidence: float = 0.5
+    ) -> None:
+        self.roots = tuple(roots)
+        self.smoothing = smoothing
+        self.confidence = confidence
+        self.clear()
+
+    def clear(self) -> None:
+        self.transactions = 0
+        self.generation = -1
+        self._digest = b""
+        self._tokens: dict[str, dict[str, int]] = {}
+        self._documents: dict[str, int] = {}
+        self._totals: dict[str, int] = {}
+        self._base: dict[str, tuple[float, float]] | None = None
+        self._weights: dict[str, dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        """Number of distinct tokens learned."""
+        return len(self._tokens)
+
+    def __repr__(self) -> str:
+        return f"Categorizer({len(self)} tokens, {len(self._documents)} accounts)"
+
+    def accepts(self, account: str) -> bool:
+        return any(account == root or account.startswith(root + ":") for root in self.roots)
+
+    def learn(self, tokens: Iterable[str], account: str, weight: int = 1) -> None:
+        """Record that *tokens* went with *account*; a negative *weight* unlearns."""
+        if not self.accepts(account):
+            return
+        self._documents[account] = self._documents.get(account, 0) + weight
+        for token in tokens:
+            counts = self._tokens.setdefault(token, {})
+            counts[account] = counts.get(account, 0) + weight
+            self._totals[account] = self._totals.get(account, 0) + weight
+            self._weights.pop(token, None)
+        self._base = None
+
+    def learn_record(self, record: Record) -> None:
+        """Learn an imported line once its counter account is settled."""
+        if record.counter:
+            self.learn(tokenize(record.payee, record.memo), record.counter)
+
+    def update(self, ledger: Ledger) -> None:
+        """Learn the transactions added to *ledger* since the last update.
+
+        The model starts over if the ledger has fewer transactions than
+        were learned or the learned ones changed.
+        """
+        if len(ledger.transactions) < self.transactions or (
+            self.transactions
+            and ledger.generation != self.generation
+            and _digest(ledger, self.transactions) != self._digest
+        ):
+            self.clear()
+        transactions = ledger.transactions.columns
+        postings = ledger.postings.columns
+        accounts, payees, notes = ledger.accounts, ledger.payees, ledger.notes
+        for txn in range(self.transactions, len(ledger.transactions)):
+            tokens = tokenize(payees.name(transactions["payee"][txn]), notes.name(transactions["note"][txn]))
+            if not tokens:
+                continue
+            for account in {accounts.name(postings["account"][row]) for row in ledger.transaction_rows(txn)}:
+                self.learn(tokens, account)
+        self.transactions = len(ledger.transactions)
+        self.generation = ledger.generation
+        self._digest = _digest(ledger, self.transactions)
+
+    def _priors(self) -> dict[str, tuple[float, float]]:
+        """Per account, its log prior and the log of its smoothed token total."""
+        if self._base is None:
+            documents = sum(self._documents.values()) or 1
+            vocabulary = len(self._tokens) or 1
+            alpha = self.smoothing
+            self._base = {
+                account: (math.log(count / documents), math.log(self._totals.get(account, 0) + alpha * vocabulary))
+                for account, count in self._documents.items()
+                if count > 0
+            }
+        return self._base
+
+    def scores(self, payee: str, memo: str = "") -> dict[str, float]:
+        """Log-likelihood of the accounts seen with any of the words of a line."""
+        tokens = [token for token in tokenize(payee, memo) if token in self._tokens]
+        if not tokens:
+            return {}
+        priors = self._priors()
+        alpha = self.smoothing
+        # log P(token | account) is log(alpha) - log(total + alpha * V) for
+        # an unseen token; seen ones add log((count + alpha) / alpha).
+        scores: dict[str, float] = {}
+        for token in tokens:
+            weights = self._weights.get(token)
+            if weights is None:
+                weights = self._weights[token] = {
+                    account: math.log1p(count / alpha) for account, count in self._tokens[token].items() if count > 0
+                }
+            for account, weight in weights.items():
+                scores[account] = scores.get(account, 0.0) + weight
+        unseen = len(tokens) * math.log(alpha)
+        return {
+            account: score + priors[account][0] - len(tokens) * priors[account][1] + unseen
+            for account, score in scores.items()
+            if account in priors
+        }
+
+    def suggest(self, payee: str, memo: str = "") -> tuple[str, float] | None:
+        """Return the most likely account and its probability, or ``None``."""
+        scores = self.scores(payee, memo)
+        if not scores:
+            return None
+        best = max(scores, key=scores.__getitem__)
+        top = scores[best]
+        return best, 1.0 / sum(math.exp(score - top) for score in scores.values())
+
+    def __call__(self, record: Record) -> str | None:
+        """Counter account for *record* if at least *confidence* sure; a :data:`~valedger.importers.pipeline.Rule`."""
+        found = self.suggest(record.payee, record.memo)
+        return found[0] if found is not None and found[1] >= self.confidence else None
+
+    def save(self, path: str | PathLike[str]) -> None:
+        """Write the model to *path* atomically."""
+        data = {
+            "format": FORMAT,
+            "roots": self.roots,
+            "smoothing": self.smoothing,
+            "confidence": self.confidence,
+            "transactions": self.transactions,
+            "digest": self._digest.hex(),
+            "documents": self._documents,
+            "tokens": self._tokens,
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(data, handle, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str | PathLike[str]) -> "Categorizer":
+        """Read the model saved at *path*; an empty model if there is none."""
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return cls()
+        if data.get("format") != FORMAT:
+            return cls()
+        model = cls(data["roots"], data["smoothing"], data["confidence"])
+        model.transactions = data["transactions"]
+        model._digest = bytes.fromhex(data["digest"])
+        model._documents = data["documents"]
+        model._tokens = data["tokens"]
+        for counts in model._tokens.values():
+            for account, count in counts.items():
+                model._totals[account] = model._totals.get(account, 0) + count
+        return model
@@ -0,0 +1,86 @@
+"""OFX and QFX statements.
+
+OFX 1.x is SGML whose leaf elements are not closed (``<TRNAMT>-12.50``),
+OFX 2.x is XML, and QFX is OFX with extra Quicken tags.  All of them are
+read with one tag tokenizer over fixed-size blocks of the file instead of
+an XML parser, which handles both dialects and never holds more than a
+block and one transaction in memory.
+"""
+
+import re
+from collections.abc import Iterator
+from datetime import date
+from os import PathLike
+
+from valedger.errors import ParseError
+from valedger.importers.pipeline import Record
+from valedger.money import Money
+
+_BLOCK = 1 << 16
+_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)[^>]*>([^<]*)")
+
+
+def tags(path: str | PathLike[str], encoding: str = "latin-1") -> Iterator[tuple[bool, str, str]]:
+    """Yield ``(closing, name, text)`` for every tag of an OFX file, in order."""
+    with open(path, encoding=encoding, errors="replace") as handle:
+        pending = ""
+        while True:
+            block = handle.read(_BLOCK)
+            text = pending + block
+            # A tag or its text may continue in the next block.
+            cut = text.rfind("<") if block else len(text)
+            for match in _TAG.finditer(text, 0, max(cut, 0)):
+                yield match[1] == "/", match[2].upper(), match[3].strip()
+            if not block:
+                return
+            pending = text[cut:] if cut >= 0 else text
+
+
+def parse_ofx_date(text: str) -> int:
+    """Parse an OFX date such as ``20240105`` or ``20240105120000.000[-5:EST]``."""
+    return date(int(text[:4]), int(text[4:6]), int(text[6:8])).toordinal()
+
+
+def read_ofx(path: str | PathLike[str], commodity: str = "", account: str = "") -> Iterator[Record]:
+    """Decode an OFX or QFX bank or credit card statement.
+
+    The statement's currency and account id are used unless the file
+    lacks them, in which case *commodity* and *account* are.
+    """
+    source = str(path)
+    currency, own = commodity, account
+    fields: dict[str, str] | None = None
+    count = 0
+    for closing, name, text in tags(path):
+        if name == "STMTTRN":
+            if not closing:
+                fields = {}
+                continue
+            if fields is None:
+                continue
+            count += 1
+            try:
+                amount = Money.parse(fields["TRNAMT"].replace(",", "."), fields.get("CURRENCY") or currency)
+                yield Record(
+                    parse_ofx_date(fields.get("DTPOSTED") or fields["DTUSER"]),
+                    amount,
+                    fields.get("NAME", "") or fields.get("PAYEE", ""),
+                    fields.get("MEMO", ""),
+                    fields.get("FITID", "") or fields.get("REFNUM", "") or fields.get("CHECKNUM", ""),
+                    own,
+                    "",
+                    source,
+                    count,
+                )
+            except (KeyError, ValueError) as error:
+                raise ParseError(f"invalid OFX transaction: {error}", source, count) from None
+            fields = None
+        elif closing:
+            continue
+        elif fields is not None:
+            if text:
+                fields.setdefault(name, text)
+        elif name == "CURDEF" and text:
+            currency = text
+        elif name == "ACCTID" and text and not account:
+            own = text
@@ -0,0 +1,245 @@
+"""Streaming import pipeline for bank statements.
+
+A statement file is decoded into :class:`Record` objects, which then flow
+through a chain of stages, each a generator taking and yielding records:
+
+``decode`` → ``normalize`` → ``dedupe`` → ``categorize`` → ``emit``
+
+Stages never collect their input: records are decoded, transformed and
+written one at a time, so memory does not grow with the size of the
+statements, except in ``dedupe``, which remembers the fingerprint of every
+distinct transaction it has seen and so grows with their number.  A stage
+is just a callable, so institutions with special needs plug in their own
+(configured with :func:`functools.partial` where needed)::
+
+    records = pipeline(
+        decode(paths),
+        partial(normalize, accounts={"BE68539007547034": "Assets:Bank:Checking"}),
+        dedupe,
+        categorize,
+    )
+    journal = "".join(emit(records))
+"""
+
+import inspect
+import re
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from os import PathLike
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from valedger.errors import ParseError
+from valedger.ledger import Ledger, from_day
+from valedger.money import Money, format_number
+
+if TYPE_CHECKING:
+    from valedger.importers.fingerprints import FingerprintIndex
+
+
+class Record(NamedTuple):
+    """One statement line.
+
+    *account* is the statement account: the bank's identifier of it (IBAN,
+    account number) as decoded, and a ledger account name once
+    normalized.  *counter* is the ledger account on the other side, set by
+    the categorize stage.  *source* and *line* locate the record in its
+    statement file.
+    """
+
+    date: int
+    amount: Money
+    payee: str
+    memo: str = ""
+    reference: str = ""
+    account: str = ""
+    counter: str = ""
+    source: str = ""
+    line: int = 0
+
+
+Stage = Callable[[Iterable[Record]], Iterator[Record]]
+Decoder = Callable[..., Iterator[Record]]
+
+UNKNOWN_EXPENSE = "Expenses:Unknown"
+UNKNOWN_INCOME = "Income:Unknown"
+
+
+def pipeline(records: Iterable[Record], *stages: Stage) -> Iterator[Record]:
+    """Chain *stages* lazily over *records*."""
+    result = iter(records)
+    for stage in stages:
+        result = stage(result)
+    return result
+
+
+def detect(path: str | PathLike[str]) -> str:
+    """Guess the format of the statement at *path*: csv, ofx, qif or camt."""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".ofx", ".qfx"):
+        return "ofx"
+    if suffix == ".qif":
+        return "qif"
+    if suffix == ".csv":
+        return "csv"
+    with open(path, "rb") as handle:
+        head = handle.read(4096)
+    if b"camt.053" in head:
+        return "camt"
+    if b"OFXHEADER" in head or b"<OFX>" in head.upper():
+        return "ofx"
+    if head.lstrip().startswith(b"!Type:") or head.lstrip().startswith(b"!Account"):
+        return "qif"
+    if suffix == ".xml":
+        return "camt"
+    return "csv"
+
+
+def decoders() -> dict[str, Decoder]:
+    from valedger.importers import camt, csvfile, ofx, qif
+
+    return {"csv": csvfile.read_csv, "ofx": ofx.read_ofx, "qif": qif.read_qif, "camt": camt.read_camt}
+
+
+def decode(paths: Iterable[str | PathLike[str]], format: str | None = None, **options: object) -> Iterator[Record]:
+    """Decode every statement in *paths*, detecting formats unless *format* is given.
+
+    *options* are passed on to the decoders that accept them, e.g. a CSV
+    ``layout`` or the ``commodity`` of formats without currency codes.
+    """
+    readers = decoders()
+    for path in paths:
+        kind = format or detect(path)
+        try:
+            reader = readers[kind]
+        except KeyError:
+            raise ValueError(f"unknown statement format {kind!r}") from None
+        accepted = inspect.signature(reader).parameters
+        yield from reader(path, **{name: value for name, value in options.items() if name in accepted})
+
+
+_SPACES = re.compile(r"\s+")
+
+
+def clean(text: str) -> str:
+    """Collapse runs of whitespace and strip the ends."""
+    return _SPACES.sub(" ", text).strip()
+
+
+def normalize(
+    records: Iterable[Record], accounts: Mapping[str, str] | None = None, default: str = ""
+) -> Iterator[Record]:
+    """Clean up text fields and name the statement accounts.
+
+    Statement account identifiers are looked up in *accounts* (compared
+    without spaces); unknown ones become *default* if given.  A record
+    without a payee uses its memo instead.
+    """
+    accounts = {key.replace(" ", ""): value for key, value in (accounts or {}).items()}
+    for record in records:
+        payee, memo = clean(record.payee), clean(record.memo)
+        account = accounts.get(record.account.replace(" ", ""), record.account or default) or default
+        yield record._replace(payee=payee or memo, memo=memo, reference=record.reference.strip(), account=account)
+
+
+_NOT_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_payee(payee: str) -> str:
+    """Reduce a payee to lower-case words: ``"ACME  Corp."`` becomes ``"acme corp"``."""
+    return _NOT_WORD.sub(" ", payee.casefold()).strip()
+
+
+def fingerprint(record: Record) -> tuple[int, Money, str, str]:
+    """Key identifying the same transaction across overlapping statements.
+
+    The bank reference identifies a transaction on its own when present;
+    otherwise the normalized payee does.
+    """
+    return record.date, record.amount, record.account, record.reference or normalize_payee(record.payee)
+
+
+def dedupe(
+    records: Iterable[Record], index: "FingerprintIndex | None" = None, window: int = 0
+) -> Iterator[Record]:
+    """Drop records already seen in another statement of the same batch.
+
+    Identical records within one statement are kept (two equal coffees on
+    one day are two transactions), but a record is dropped when an
+    earlier statement already had as many occurrences of it.  With an
+    *index*, records already recorded in the journal are dropped as well;
+    see :meth:`FingerprintIndex.filter` for the meaning of *window*.
+
+    Statements of a batch may overlap anywhere, so the fingerprints of all
+    distinct records seen are kept until the stage is exhausted.
+    """
+    if index is not None:
+        records = index.filter(records, window)
+    seen: dict[tuple[int, Money, str, str], dict[str, int]] = {}
+    for record in records:
+        key = fingerprint(record)
+        counts = seen.setdefault(key, {})
+        count = counts[record.source] = counts.get(record.source, 0) + 1
+        if all(count > other for source, other in counts.items() if source != record.source):
+            yield record
+
+
+Rule = Callable[[Record], str | None]
+
+
+def categorize(
+    records: Iterable[Record],
+    rules: Iterable[Rule] = (),
+    expense: str = UNKNOWN_EXPENSE,
+    income: str = UNKNOWN_INCOME,
+) -> Iterator[Record]:
+    """Set the counter account of each record.
+
+    The first of *rules* returning an account name wins; records no rule
+    matches are booked to *expense* or *income* depending on their sign.
+    Records that already have a counter account are left alone.
+    """
+    rules = list(rules)
+    for record in records:
+        if record.counter:
+            yield record
+            continue
+        for rule in rules:
+            counter = rule(record)
+            if counter:
+                break
+        else:
+            counter = expense if record.amount.value < 0 else income
+        yield record._replace(counter=counter)
+
+
+def emit(records: Iterable[Record]) -> Iterator[str]:
+    """Render records as journal transactions."""
+    for record in records:
+        if not record.account:
+            raise ParseError("record has no statement account", record.source, record.line)
+        amount = record.amount
+        header = f"{from_day(record.date).isoformat()} *"
+        if record.reference:
+            header += f" ({record.reference})"
+        header += f" {record.payee}" if record.payee else ""
+        if record.memo and record.memo != record.payee:
+            header += f" | {record.memo}"
+        yield (
+            f"{header}\n"
+            f"    {record.account}  {format_number(amount.value, amount.scale)} {amount.commodity}\n"
+            f"    {record.counter or (UNKNOWN_EXPENSE if amount.value < 0 else UNKNOWN_INCOME)}\n\n"
+        )
+
+
+def store(ledger: Ledger, records: Iterable[Record]) -> int:
+    """Add records to *ledger* as transactions and return how many were added."""
+    count = 0
+    for record in records:
+        if not record.account:
+            raise ParseError("record has no statement account", record.source, record.line)
+        counter = record.counter or (UNKNOWN_EXPENSE if record.amount.value < 0 else UNKNOWN_INCOME)
+        note = record.memo if record.memo != record.payee else ""
+        postings = [(record.account, record.amount), (counter, -record.amount)]
+        ledger.add_transaction(record.date, record.payee, postings, note, record.reference)
+        count += 1
+    return count
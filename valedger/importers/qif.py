@@ -0,0 +1,60 @@
+"""QIF statements.
+
+QIF records are runs of lines starting with a field code (``D`` date,
+``T`` amount, ``P`` payee, ``M`` memo, ``N`` number) ended by ``^``.
+Dates come in several regional formats; the default handles the usual
+US ``MM/DD/YYYY`` and ``MM/DD'YY`` forms.
+"""
+
+from collections.abc import Iterator
+from os import PathLike
+
+from valedger.errors import ParseError
+from valedger.importers.csvfile import parse_date, parse_decimal
+from valedger.importers.pipeline import Record
+
+
+def read_qif(
+    path: str | PathLike[str],
+    commodity: str = "",
+    account: str = "",
+    date_format: str = "%m/%d/%Y",
+    decimal: str = ".",
+    encoding: str = "utf-8-sig",
+) -> Iterator[Record]:
+    """Decode a QIF bank, cash or credit card statement."""
+    source = str(path)
+    fields: dict[str, str] = {}
+    start = 0
+    with open(path, encoding=encoding, errors="replace") as handle:
+        for lineno, line in enumerate(handle, 1):
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("!"):
+                continue
+            code, value = line[0], line[1:].strip()
+            if code != "^":
+                if not fields:
+                    start = lineno
+                fields.setdefault(code, value)
+                continue
+            if "D" not in fields or ("T" not in fields and "U" not in fields):
+                fields = {}
+                continue
+            try:
+                text = fields["D"].replace("'", "/").replace(" ", "")
+                if text.count("/") == 2 and len(text.rpartition("/")[2]) == 2:
+                    text = text[: text.rindex("/") + 1] + "20" + text.rpartition("/")[2]
+                yield Record(
+                    parse_date(text, date_format),
+                    parse_decimal(fields.get("T") or fields["U"], commodity, decimal),
+                    fields.get("P", ""),
+                    fields.get("M", ""),
+                    fields.get("N", ""),
+                    account,
+                    "",
+                    source,
+                    start,
+                )
+            except ValueError as error:
+                raise ParseError(str(error), source, start) from None
+            fields = {}
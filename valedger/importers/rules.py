@@ -0,0 +1,326 @@
+"""Compiled categorization rules.
+
+A rule maps statement lines whose payee or memo matches a pattern to a
+counter account, optionally renaming the payee.  Rules are kept in
+priority order, and with more than a thousand of them trying each in turn
+for every imported line is far too slow.  A :class:`RuleSet` therefore
+compiles all rules on one field into matchers that each look at a line
+once:
+
+* literal substring rules go into an Aho–Corasick automaton, which finds
+  every occurrence of every literal in one pass over the text;
+* regular expressions that require some literal text, as almost all
+  payee patterns do, have it extracted into a second automaton, and only
+  the few rules whose literal occurs in a line are run on it;
+* the remaining regular expressions become a single pattern of the form
+  ``(?=.*?(?:pattern))(?P<r12>)|...``: tried at the start of the text, the
+  alternation stops at the first rule, in priority order, whose pattern
+  occurs anywhere, and the name of the empty group identifies it.
+  Patterns with backreferences, named groups or global flags would change
+  meaning inside it; the few of those are tried one by one instead.
+
+The lowest rule index found by any matcher wins.
+
+Rules files have one rule per line::
+
+    # field  operator  pattern            account                payee
+    payee    ~         ^albert heijn\\b     -> Expenses:Groceries  = Albert Heijn
+    memo     contains  netflix            -> Expenses:Subscriptions
+
+``~`` matches a regular expression and ``contains`` a literal, both
+ignoring case; ``text`` matches payee and memo together.
+"""
+
+import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+from os import PathLike
+from typing import NamedTuple
+
+from valedger.errors import ParseError
+from valedger.importers.pipeline import Record
+
+FIELDS = ("payee", "memo", "text")
+OPERATORS = {"~": False, "contains": True}
+
+
+class CategoryRule(NamedTuple):
+    """Book lines whose *field* matches *pattern* to *account*.
+
+    *literal* patterns match as case-insensitive substrings, others as
+    case-insensitive regular expressions.  A non-empty *payee* replaces the
+    payee of matching lines.
+    """
+
+    pattern: str
+    account: str
+    field: str = "payee"
+    literal: bool = False
+    payee: str = ""
+
+
+class Automaton:
+    """Aho–Corasick automaton over words tagged with integer indices."""
+
+    __slots__ = ("_goto", "_fail", "_outputs")
+
+    def __init__(self, words: Iterable[tuple[str, int]]) -> None:
+        goto: list[dict[str, int]] = [{}]
+        outputs: list[tuple[int, ...]] = [()]
+        for word, index in words:
+            node = 0
+            for char in word:
+                following = goto[node].get(char)
+                if following is None:
+                    following = goto[node][char] = len(goto)
+                    goto.append({})
+                    outputs.append(())
+                node = following
+            outputs[node] += (index,)
+        # Breadth-first, so the failure target of a node is always done
+        # before the node itself and its outputs can be inherited.
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, following in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[following] = target if target != following else 0
+                if outputs[fail[following]]:
+                    outputs[following] = tuple(sorted(outputs[following] + outputs[fail[following]]))
+                queue.append(following)
+        self._goto, self._fail, self._outputs = goto, fail, outputs
+
+    def _states(self, text: str) -> Iterator[tuple[int, ...]]:
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if outputs[node]:
+                yield outputs[node]
+
+    def search(self, text: str) -> int:
+        """Return the lowest index of the words occurring in *text*, or -1."""
+        return min((found[0] for found in self._states(text)), default=-1)
+
+    def find_all(self, text: str) -> set[int]:
+        """Return the indices of all words occurring in *text*."""
+        result: set[int] = set()
+        for found in self._states(text):
+            result.update(found)
+        return result
+
+
+_META = frozenset(".^$*+?{}[]\\|()")
+# Escapes standing for one character given by code (``\x41``, ``\u00e9``,
+# ``\N{...}``, octal) or for a class or position (``\d``, ``\b``): neither
+# is literal text.
+_ESCAPE = re.compile(
+    r"\\(?:x[0-9a-fA-F]{0,2}|u[0-9a-fA-F]{0,4}|U[0-9a-fA-F]{0,8}|N\{[^}]*\}?|[0-7]{1,3}|\d{1,2}|.)", re.S
+)
+# Backreferences and conditionals count groups, and named groups clash,
+# once patterns are joined into one.
+_GROUPS = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?<(?![=!])|\(\?\(")
+_GLOBAL_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+def _class_end(pattern: str, position: int) -> int:
+    """Position after the character class opening at *position*."""
+    position += 1
+    if pattern[position : position + 1] == "^":
+        position += 1
+    if pattern[position : position + 1] == "]":
+        position += 1
+    while position < len(pattern) and pattern[position] != "]":
+        position += 2 if pattern[position] == "\\" else 1
+    return position + 1
+
+
+def required_literal(pattern: str) -> str:
+    """Return the longest literal text any match of *pattern* must contain.
+
+    Only plain characters at the top level of the pattern are considered;
+    the result is ``""`` when none can be found (e.g. with a top-level
+    alternation or verbose mode).
+    """
+    if any("x" in flags for flags in _GLOBAL_FLAGS.findall(pattern)):
+        return ""
+    best, run = "", ""
+    depth = 0
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        following = pattern[position + 1 : position + 2]
+        if depth == 0 and char == "|":
+            return ""
+        if char == "\\" and following and not following.isalnum() and depth == 0:
+            literal, position = following, position + 2
+        elif char not in _META and depth == 0:
+            literal, position = char, position + 1
+        else:
+            if char == "(":
+                depth += 1
+                position += 1
+            elif char == ")":
+                depth -= 1
+                position += 1
+            elif char == "[":
+                position = _class_end(pattern, position)
+            elif char == "{":
+                end = pattern.find("}", position)
+                position = end + 1 if end > 0 else len(pattern)
+            elif char == "\\":
+                position = _ESCAPE.match(pattern, position).end()  # type: ignore[union-attr]
+            else:
+                position += 1
+            best, run = max(best, run, key=len), ""
+            continue
+        if pattern[position : position + 1] in ("?", "*", "{"):
+            best, run = max(best, run, key=len), ""
+        else:
+            run += literal
+    return max(best, run, key=len)
+
+
+class _FieldMatcher:
+    __slots__ = ("literals", "prefilter", "expressions", "pattern", "separate")
+
+    def __init__(self, rules: list[tuple[int, CategoryRule]]) -> None:
+        literals, prefiltered, combined = [], [], []
+        self.separate: list[int] = []
+        self.expressions: dict[int, re.Pattern[str]] = {}
+        for index, rule in rules:
+            if rule.literal:
+                literals.append((rule.pattern.casefold(), index))
+                continue
+            try:
+                self.expressions[index] = re.compile(rule.pattern, re.IGNORECASE)
+            except re.error as error:
+                raise ValueError(f"rule {index} ({rule.pattern!r}): {error}") from None
+            literal = required_literal(rule.pattern).casefold()
+            if len(literal) >= 3:
+                prefiltered.append((literal, index))
+            elif _GROUPS.search(rule.pattern) or _GLOBAL_FLAGS.search(rule.pattern):
+                self.separate.append(index)
+            else:
+                combined.append((index, rule))
+        self.literals = Automaton(literals) if literals else None
+        self.prefilter = Automaton(prefiltered) if prefiltered else None
+        self.pattern = None
+        if combined:
+            alternatives = "|".join(
+                rf"(?=[\s\S]*?(?i:{rule.pattern}))(?P<r{index}>)" for index, rule in combined
+            )
+            try:
+                self.pattern = re.compile(alternatives)
+            except re.error as error:
+                raise ValueError(f"rules cannot be combined: {error}") from None
+
+    def search(self, text: str) -> int:
+        found = -1
+        if self.pattern is not None:
+            match = self.pattern.match(text)
+            if match is not None:
+                found = int(match.lastgroup[1:])  # type: ignore[index]
+        for index in self.separate:
+            if 0 <= found < index:
+                break
+            if self.expressions[index].search(text):
+                found = index
+                break
+        if self.literals is not None or self.prefilter is not None:
+            folded = text.casefold()
+            if self.literals is not None:
+                index = self.literals.search(folded)
+                if index >= 0 and (found < 0 or index < found):
+                    found = index
+            if self.prefilter is not None:
+                for index in sorted(self.prefilter.find_all(folded)):
+                    if 0 <= found < index:
+                        break
+                    if self.expressions[index].search(text):
+                        found = index
+                        break
+        return found
+
+
+class RuleSet:
+    """Rules compiled for matching many lines; earlier rules take priority."""
+
+    __slots__ = ("rules", "_matchers")
+
+    def __init__(self, rules: Iterable[CategoryRule] = ()) -> None:
+        self.rules = list(rules)
+        for rule in self.rules:
+            if rule.field not in FIELDS:
+                raise ValueError(f"unknown rule field {rule.field!r}; expected one of {', '.join(FIELDS)}")
+        self._matchers = {
+            field: _FieldMatcher([(index, rule) for index, rule in enumerate(self.rules) if rule.field == field])
+            for field in FIELDS
+            if any(rule.field == field for rule in self.rules)
+        }
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __repr__(self) -> str:
+        return f"RuleSet({len(self)} rules)"
+
+    def match(self, payee: str, memo: str = "") -> CategoryRule | None:
+        """Return the first rule matching a line with *payee* and *memo*."""
+        found = -1
+        for field, matcher in self._matchers.items():
+            text = payee if field == "payee" else memo if field == "memo" else f"{payee}\n{memo}"
+            index = matcher.search(text)
+            if index >= 0 and (found < 0 or index < found):
+                found = index
+        return self.rules[found] if found >= 0 else None
+
+    def __call__(self, record: Record) -> str | None:
+        """Counter account for *record*; a :data:`~valedger.importers.pipeline.Rule`."""
+        rule = self.match(record.payee, record.memo)
+        return rule.account if rule is not None else None
+
+    def apply(self, records: Iterable[Record]) -> Iterator[Record]:
+        """Pipeline stage setting the counter account and payee of matching records."""
+        for record in records:
+            rule = None if record.counter else self.match(record.payee, record.memo)
+            if rule is not None:
+                record = record._replace(counter=rule.account, payee=rule.payee or record.payee)
+            yield record
+
+
+_RULE_LINE = re.compile(
+    r"(?P<field>\w+)\s+(?P<operator>~|contains)\s+(?P<pattern>.+?)\s+->\s+(?P<account>\S.*?)(?:\s+=\s+(?P<payee>.+?))?\s*$"
+)
+
+
+def parse_rules(lines: Iterable[str], path: str | None = None) -> RuleSet:
+    """Parse rules in the rules file format; see the module documentation."""
+    rules = []
+    for lineno, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text or text.startswith(("#", ";")):
+            continue
+        match = _RULE_LINE.match(text)
+        if match is None or match["field"] not in FIELDS:
+            raise ParseError(f"invalid rule: {text}", path, lineno)
+        rules.append(
+            CategoryRule(
+                match["pattern"], match["account"], match["field"], OPERATORS[match["operator"]], match["payee"] or ""
+            )
+        )
+    try:
+        return RuleSet(rules)
+    except ValueError as error:
+        raise ParseError(str(error), path) from None
+
+
+def load_rules(path: str | PathLike[str]) -> RuleSet:
+    with open(path, encoding="utf-8") as handle:
+        return parse_rules(handle, str(path))
@@ -0,0 +1,84 @@
+"""String interning for the columnar store."""
+
+from collections.abc import Iterable, Iterator
+
+
+class Interner:
+    """Bidirectional mapping between strings and dense integer ids.
+
+    An interner restored with :meth:`unpack` decodes its names only when
+    they are first needed, and builds the reverse index only when an id is
+    first looked up, so opening a cached ledger does not pay for strings a
+    report never touches.
+    """
+
+    __slots__ = ("_names", "_ids", "_packed")
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._names: list[str] = []
+        self._ids: dict[str, int] | None = {}
+        self._packed: tuple[bytes | memoryview, int] | None = None
+        for name in names:
+            self.intern(name)
+
+    @classmethod
+    def unpack(cls, packed: bytes | memoryview, count: int) -> "Interner":
+        """Restore an interner from :meth:`pack` output holding *count* names."""
+        interner = cls()
+        interner._packed = (packed, count)
+        interner._ids = None
+        return interner
+
+    def pack(self) -> bytes:
+        """Serialise the names, in id order, as NUL-separated UTF-8."""
+        return "\0".join(self._all()).encode()
+
+    def _all(self) -> list[str]:
+        if self._packed is not None:
+            packed, count = self._packed
+            self._names = str(packed, "utf-8").split("\0") if count else []
+            self._packed = None
+        return self._names
+
+    def _index(self) -> dict[str, int]:
+        if self._ids is None:
+            self._ids = {name: ident for ident, name in enumerate(self._all())}
+        return self._ids
+
+    def intern(self, name: str) -> int:
+        """Return the id of *name*, assigning the next free id if it is new."""
+        try:
+            return self._ids[name]  # type: ignore[index]
+        except (KeyError, TypeError):
+            ident = self._index().get(name)
+            return self._add(name) if ident is None else ident
+
+    def _add(self, name: str) -> int:
+        ident = self._index()[name] = len(self._names)
+        self._names.append(name)
+        return ident
+
+    def id(self, name: str) -> int:
+        """Return the id of *name*, raising :class:`KeyError` if unknown."""
+        return self._index()[name]
+
+    def get(self, name: str, default: int | None = None) -> int | None:
+        return self._index().get(name, default)
+
+    def name(self, ident: int) -> str:
+        return self._all()[ident]
+
+    def names(self) -> list[str]:
+        return list(self._all())
+
+    def __len__(self) -> int:
+        return self._packed[1] if self._packed is not None else len(self._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._all())
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._index()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} names)"
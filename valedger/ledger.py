@@ -0,0 +1,585 @@
+"""Columnar posting store.
+
+A :class:`Ledger` keeps every posting in a handful of parallel typed arrays
+instead of one Python object per row: the date as a proleptic Gregorian day
+number, interned account and commodity ids, the owning transaction and the
+amount as a scaled 64-bit integer.  Several million postings therefore cost
+a few dozen megabytes and a report is a scan over contiguous machine words.
+
+Reports read the store through :class:`View` objects, which expose
+zero-copy :class:`memoryview` slices of the columns.  A live view pins the
+underlying buffers, so views must be released (or used as context
+managers) before more rows are appended.
+
+Indexes built over a ledger (balances, text, lots, ...) follow appended
+rows incrementally.  Operations that rewrite rows already there, such as
+sorting, renumbering accounts, widening a commodity's precision or
+truncating, give the ledger a new :attr:`Ledger.generation`, which tells
+an index to check the rows it covered before trusting them.
+"""
+
+import hashlib
+import operator
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+from datetime import date
+from itertools import compress, count, islice
+from typing import NamedTuple
+
+from valedger.accounts import AccountTree
+from valedger.interning import Interner
+from valedger.money import Money
+
+Day = int | date
+
+
+def to_day(value: Day) -> int:
+    """Return the day number of *value* (a :class:`date` or day number)."""
+    if isinstance(value, date):
+        return value.toordinal()
+    return int(value)
+
+
+def from_day(day: int) -> date:
+    """Return the :class:`date` for day number *day*."""
+    return date.fromordinal(day)
+
+
+def to_array(typecode: str, values: array | memoryview) -> array:
+    """Return *values* as an array, copying a memoryview in a single pass."""
+    if type(values) is array:
+        return values
+    result = array(typecode)
+    result.frombytes(memoryview(values).cast("B"))
+    return result
+
+
+class Column(NamedTuple):
+    """Schema entry of a :class:`Table` column.
+
+    *ref* names the interner or table whose ids the column stores, which
+    tells generic operations such as sorting how to remap it.
+    """
+
+    name: str
+    typecode: str
+    ref: str | None = None
+
+
+class Table:
+    """A set of equally long typed arrays described by a schema.
+
+    Columns may also be read-only memoryviews, e.g. over a memory-mapped
+    cache file; they are copied into private arrays by :meth:`thaw` the
+    first time the table is modified.
+    """
+
+    __slots__ = ("schema", "columns", "_arrays")
+
+    def __init__(self, schema: tuple[Column, ...]) -> None:
+        self.schema = schema
+        self.columns: dict[str, array] = {c.name: array(c.typecode) for c in schema}
+        self._arrays = list(self.columns.values())
+
+    def __len__(self) -> int:
+        return len(self._arrays[0])
+
+    def __getitem__(self, name: str) -> array:
+        return self.columns[name]
+
+    @property
+    def frozen(self) -> bool:
+        """Whether some column is a read-only memoryview."""
+        return any(type(column) is not array for column in self._arrays)
+
+    def thaw(self) -> None:
+        """Copy read-only columns into private, growable arrays."""
+        for column in self.schema:
+            source = self.columns[column.name]
+            if type(source) is not array:
+                self.columns[column.name] = to_array(column.typecode, source)
+        self._arrays = list(self.columns.values())
+
+    def append(self, *values: int) -> int:
+        """Append one row, given in schema order, and return its index."""
+        if type(self._arrays[0]) is not array:
+            self.thaw()
+        row = len(self._arrays[0])
+        for column, value in zip(self._arrays, values, strict=True):
+            column.append(value)
+        return row
+
+    def row(self, index: int) -> tuple[int, ...]:
+        return tuple(column[index] for column in self._arrays)
+
+    def view(self, start: int = 0, stop: int | None = None) -> "View":
+        return View(self, start, len(self) if stop is None else stop)
+
+    def take(self, order: Iterable[int]) -> None:
+        """Reorder every column so that row ``i`` becomes row ``order[i]``."""
+        order = order if isinstance(order, (list, array)) else list(order)
+        for column in self.schema:
+            source = self.columns[column.name]
+            self.columns[column.name] = array(column.typecode, map(source.__getitem__, order))
+        self._arrays = list(self.columns.values())
+
+    def remap(self, name: str, mapping: array | list[int]) -> None:
+        """Replace every value ``v`` of column *name* by ``mapping[v]``."""
+        source = self.columns[name]
+        self.columns[name] = array(source.typecode, map(mapping.__getitem__, source))
+        self._arrays = list(self.columns.values())
+
+
+class View:
+    """Zero-copy window over rows ``start:stop`` of a :class:`Table`.
+
+    Columns are exposed as attributes holding :class:`memoryview` slices.
+    """
+
+    __slots__ = ("start", "stop", "_columns")
+
+    def __init__(self, table: Table, start: int, stop: int) -> None:
+        self.start = start
+        self.stop = stop
+        self._columns = {name: memoryview(column)[start:stop] for name, column in table.columns.items()}
+
+    def __getattr__(self, name: str) -> memoryview:
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def release(self) -> None:
+        """Release the column buffers so the table can grow again."""
+        for column in self._columns.values():
+            column.release()
+
+    def __enter__(self) -> "View":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.release()
+
+    def __repr__(self) -> str:
+        return f"View(rows {self.start}:{self.stop})"
+
+
+POSTINGS = (
+    Column("date", "i"),
+    Column("txn", "i", "transactions"),
+    Column("account", "i", "accounts"),
+    Column("commodity", "i", "commodities"),
+    Column("amount", "q"),
+)
+
+TRANSACTIONS = (
+    Column("date", "i"),
+    Column("payee", "i", "payees"),
+    Column("note", "i", "notes"),
+    Column("code", "i", "codes"),
+    Column("first", "i", "postings"),
+    Column("file", "i", "files"),
+    Column("line", "i"),
+)
+
+# Lot cost and price annotations are rare, so they live in a sparse side
+# table rather than in extra posting columns.  Both totals are unsigned
+# and carry their own scale; a commodity of -1 means "not given".
+ANNOTATIONS = (
+    Column("posting", "i", "postings"),
+    Column("cost_commodity", "i", "commodities"),
+    Column("cost", "q"),
+    Column("cost_scale", "b"),
+    Column("price_commodity", "i", "commodities"),
+    Column("price", "q"),
+    Column("price_scale", "b"),
+)
+
+# Assertions attached to a posting (``= 100 EUR``): the balance of the
+# posting's account in *commodity* right after that posting.
+ASSERTIONS = (
+    Column("posting", "i", "postings"),
+    Column("commodity", "i", "commodities"),
+    Column("amount", "q"),
+)
+
+# Dated balance directives: the balance at the start of *date*, and where
+# the directive was written.
+BALANCES = (
+    Column("date", "i"),
+    Column("account", "i", "accounts"),
+    Column("commodity", "i", "commodities"),
+    Column("amount", "q"),
+    Column("file", "i", "files"),
+    Column("line", "i"),
+)
+
+# Unit prices: one *commodity* costs ``price / 10 ** scale`` of *quote*.
+PRICES = (
+    Column("date", "i"),
+    Column("commodity", "i", "commodities"),
+    Column("quote", "i", "commodities"),
+    Column("price", "q"),
+    Column("scale", "b"),
+)
+
+TAGS = (
+    Column("txn", "i", "transactions"),
+    Column("tag", "i", "tags"),
+)
+
+SCHEMAS = {
+    "postings": POSTINGS,
+    "transactions": TRANSACTIONS,
+    "annotations": ANNOTATIONS,
+    "assertions": ASSERTIONS,
+    "balances": BALANCES,
+    "prices": PRICES,
+    "tags": TAGS,
+}
+
+# Tables whose ``amount`` column is scaled by the precision of their
+# ``commodity`` column and must follow when that precision widens.
+SCALED = ("postings", "assertions", "balances")
+
+INTERNERS = ("accounts", "commodities", "payees", "notes", "codes", "tags", "files")
+INTERNER_TYPES: dict[str, type[Interner]] = {"accounts": AccountTree}
+
+# Lengths of every table, in ``SCHEMAS`` order; see :meth:`Ledger.mark`.
+Mark = tuple[int, ...]
+
+# Generations are unique across ledgers, so an index updated from one
+# ledger never mistakes another for it.
+_generations = count()
+
+
+def inverse(order: list[int] | array) -> array:
+    """Return the inverse of the permutation *order*.
+
+    The result has one extra trailing entry mapping ``len(order)`` to
+    itself, so end-of-table references survive a reorder.
+    """
+    size = len(order)
+    result = array("i", bytes(4 * (size + 1)))
+    for position, index in enumerate(order):
+        result[index] = position
+    result[size] = size
+    return result
+
+
+class Ledger:
+    """Columnar store of transactions and their postings.
+
+    Amounts are integers scaled by the precision of their commodity, kept in
+    :attr:`scales` alongside the commodity names.  Besides postings and
+    transactions the ledger holds small side tables for cost annotations,
+    balance assertions, prices and tags.  Postings of one transaction are
+    always contiguous and sorting by date is stable, so file order is kept
+    among postings of the same day.
+
+    :attr:`generation` changes whenever existing rows are rewritten, but
+    not when rows are appended.
+    """
+
+    def __init__(self) -> None:
+        self.accounts = AccountTree()
+        self.commodities = Interner()
+        self.scales = array("b")
+        self.payees = Interner([""])
+        self.notes = Interner([""])
+        self.codes = Interner([""])
+        self.tags = Interner()
+        self.files = Interner([""])
+        self.tables = {name: Table(schema) for name, schema in SCHEMAS.items()}
+        self.postings = self.tables["postings"]
+        self.transactions = self.tables["transactions"]
+        self.annotations = self.tables["annotations"]
+        self.assertions = self.tables["assertions"]
+        self.balances = self.tables["balances"]
+        self.prices = self.tables["prices"]
+        self.tag_rows = self.tables["tags"]
+        self._sorted = True
+        self._frozen = False
+        self.generation = next(_generations)
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def __repr__(self) -> str:
+        return f"Ledger({len(self.transactions)} transactions, {len(self.postings)} postings)"
+
+    @classmethod
+    def restore(
+        cls,
+        interners: dict[str, Interner],
+        scales: array | memoryview,
+        columns: dict[str, dict[str, array | memoryview]],
+        is_sorted: bool,
+    ) -> "Ledger":
+        """Rebuild a ledger from serialised parts, e.g. a memory-mapped cache.
+
+        Read-only columns are used in place until the ledger is modified.
+        """
+        ledger = cls()
+        for name in INTERNERS:
+            setattr(ledger, name, interners[name])
+        ledger.scales = scales
+        for name, table in ledger.tables.items():
+            table.columns.update(columns[name])
+            table._arrays = list(table.columns.values())
+        ledger._sorted = is_sorted
+        ledger._frozen = type(scales) is not array or any(table.frozen for table in ledger.tables.values())
+        return ledger
+
+    def thaw(self) -> None:
+        """Make every column writable, copying memory-mapped data if needed."""
+        if not self._frozen:
+            return
+        self.scales = to_array("b", self.scales)
+        for table in self.tables.values():
+            table.thaw()
+        self._frozen = False
+
+    @property
+    def is_sorted(self) -> bool:
+        """Whether postings and transactions are in date order."""
+        return self._sorted
+
+    def commodity(self, name: str, scale: int = 0) -> int:
+        """Intern commodity *name* and make sure it has at least *scale* decimals.
+
+        Widening the precision of a known commodity rescales its existing
+        postings, which is a full column pass but happens at most a few
+        times per commodity while loading.
+        """
+        ident = self.commodities.intern(name)
+        if self._frozen and (ident == len(self.scales) or scale > self.scales[ident]):
+            self.thaw()
+        if ident == len(self.scales):
+            self.scales.append(scale)
+        elif scale > self.scales[ident]:
+            factor = 10 ** (scale - self.scales[ident])
+            for name in SCALED:
+                columns = self.tables[name].columns
+                amounts = columns["amount"]
+                for row in compress(range(len(amounts)), map(ident.__eq__, columns["commodity"])):
+                    amounts[row] *= factor
+            self.scales[ident] = scale
+            self.generation = next(_generations)
+        return ident
+
+    def money(self, commodity: int, value: int) -> Money:
+        """Wrap a scaled *value* of commodity id *commodity* for rendering."""
+        return Money(value, self.commodities.name(commodity), self.scales[commodity])
+
+    def scaled(self, amount: Money) -> tuple[int, int]:
+        """Return ``(commodity id, value at the ledger's scale)`` for *amount*."""
+        commodity = self.commodities.get(amount.commodity)
+        if commodity is None or amount.scale > self.scales[commodity]:
+            commodity = self.commodity(amount.commodity, amount.scale)
+        scale = self.scales[commodity]
+        if scale == amount.scale:
+            return commodity, amount.value
+        return commodity, amount.value * 10 ** (scale - amount.scale)
+
+    def add_transaction(
+        self, day: Day, payee: str, postings: Iterable[tuple[str, Money]], note: str = "", code: str = ""
+    ) -> int:
+        """Append a transaction and its ``(account, amount)`` postings.
+
+        Returns the transaction id.
+        """
+        day = to_day(day)
+        txn = self.begin_transaction(day, self.payees.intern(payee), self.notes.intern(note), self.codes.intern(code))
+        for account, amount in postings:
+            self.append(day, txn, self.accounts.intern(account), *self.scaled(amount))
+        return txn
+
+    def begin_transaction(
+        self, day: int, payee: int, note: int = 0, code: int = 0, file: int = 0, line: int = 0
+    ) -> int:
+        """Append a transaction header; its postings must follow via :meth:`append`."""
+        if self._frozen:
+            self.thaw()
+        transactions = self.transactions
+        if self._sorted and len(transactions) and day < transactions.columns["date"][-1]:
+            self._sorted = False
+        return transactions.append(day, payee, note, code, len(self.postings), file, line)
+
+    def append(self, day: int, txn: int, account: int, commodity: int, amount: int) -> int:
+        """Append a single posting of interned ids and return its row."""
+        if self._frozen:
+            self.thaw()
+        dates, txns, accounts, commodities, amounts = self.postings._arrays
+        dates.append(day)
+        txns.append(txn)
+        accounts.append(account)
+        commodities.append(commodity)
+        amounts.append(amount)
+        return len(amounts) - 1
+
+    def view(self, start: int = 0, stop: int | None = None) -> View:
+        """Return a zero-copy view of posting rows ``start:stop``."""
+        return self.postings.view(start, stop)
+
+    def rows_between(self, start: Day | None = None, end: Day | None = None) -> tuple[int, int]:
+        """Return the posting row range dated in ``[start, end)``.
+
+        The ledger must be sorted; see :meth:`sort`.
+        """
+        if not self._sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        dates = self.postings.columns["date"]
+        lo = 0 if start is None else bisect_left(dates, to_day(start))
+        hi = len(dates) if end is None else bisect_left(dates, to_day(end), lo)
+        return lo, hi
+
+    def date_range(self, start: Day | None = None, end: Day | None = None) -> View:
+        """Return a zero-copy view of the postings dated in ``[start, end)``."""
+        return self.view(*self.rows_between(start, end))
+
+    def mark(self) -> Mark:
+        """Return the current length of every table.
+
+        Two marks delimit a slice of the ledger that :meth:`extend` can copy.
+        """
+        return tuple(map(len, self.tables.values()))
+
+    def truncate(self, mark: Mark) -> None:
+        """Drop every row added after *mark* was taken.
+
+        Interned names are kept; unused ids are harmless.
+        """
+        self.thaw()
+        for table, length in zip(self.tables.values(), mark):
+            for column in table.columns.values():
+                del column[length:]
+        if not self._sorted:
+            dates = self.transactions.columns["date"]
+            self._sorted = all(map(operator.le, dates, islice(dates, 1, None)))
+        self.generation = next(_generations)
+
+    def extend(self, other: "Ledger", start: Mark | None = None, stop: Mark | None = None) -> None:
+        """Append the rows of *other* between marks *start* and *stop*.
+
+        Interned ids are translated to this ledger's ids, amounts are
+        rescaled to its commodity precisions and references between tables
+        are shifted, so the copied rows behave exactly as if they had been
+        appended here directly.
+        """
+        self.thaw()
+        lo = dict(zip(self.tables, start or (0,) * len(self.tables)))
+        hi = dict(zip(self.tables, stop or other.mark()))
+        shifts = {name: len(table) - lo[name] for name, table in self.tables.items()}
+        commodities = [self.commodity(name, scale) for name, scale in zip(other.commodities, other.scales)]
+        factors = [10 ** (self.scales[ours] - scale) for ours, scale in zip(commodities, other.scales)]
+        rescale = any(factor != 1 for factor in factors)
+        mappings = {
+            name: _mapping([getattr(self, name).intern(value) for value in getattr(other, name)])
+            for name in INTERNERS
+            if name != "commodities"
+        }
+        mappings["commodities"] = _mapping(commodities)
+        dates = self.transactions.columns["date"]
+        first = len(dates)
+        for name, table in self.tables.items():
+            a, b = lo[name], hi[name]
+            if a == b:
+                continue
+            source = other.tables[name].columns
+            for column in table.schema:
+                values = source[column.name][a:b]
+                if column.ref in shifts:
+                    if shifts[column.ref]:
+                        values = array(column.typecode, map(shifts[column.ref].__add__, values))
+                elif column.ref is not None and mappings[column.ref] is not None:
+                    values = array(column.typecode, map(mappings[column.ref].__getitem__, values))
+                elif column.name == "amount" and rescale and name in SCALED:
+                    factor = map(factors.__getitem__, source["commodity"][a:b])
+                    values = array(column.typecode, map(operator.mul, values, factor))
+                table.columns[column.name].frombytes(memoryview(values).cast("B"))
+        if self._sorted and len(dates) > first:
+            start_at = max(first - 1, 0)
+            self._sorted = all(map(operator.le, islice(dates, start_at, None), islice(dates, start_at + 1, None)))
+
+    def digest(self, stop: int | None = None, table: str = "postings") -> bytes:
+        """BLAKE2b digest of rows ``[0, stop)`` of *table*, every column.
+
+        Indexes keep the digest of the rows they were built from and
+        compare it when the :attr:`generation` changed, which costs one
+        hash over the columns rather than a pass in Python.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for column in self.tables[table].columns.values():
+            digest.update(memoryview(column)[:stop])
+        return digest.digest()
+
+    def transaction_rows(self, txn: int) -> range:
+        """Return the posting rows belonging to transaction *txn*."""
+        first = self.transactions.columns["first"]
+        stop = first[txn + 1] if txn + 1 < len(first) else len(self.postings)
+        return range(first[txn], stop)
+
+    def sort(self) -> None:
+        """Stable-sort transactions and postings by date.
+
+        The other tables keep their order; references into the sorted
+        tables are remapped.
+        """
+        if self._sorted:
+            return
+        self._reorder("transactions", _date_order(self.transactions))
+        self._reorder("postings", _date_order(self.postings))
+        self._sorted = True
+        self.generation = next(_generations)
+
+    def order_accounts(self) -> None:
+        """Renumber accounts in tree order so subtrees are id ranges.
+
+        Account columns of every table are remapped; see
+        :meth:`AccountTree.renumber`.  Indexes holding account ids notice
+        through the new :attr:`generation`.
+        """
+        mapping = self.accounts.renumber()
+        if mapping is None:
+            return
+        self.thaw()
+        for table in self.tables.values():
+            for column in table.schema:
+                if column.ref == "accounts":
+                    table.remap(column.name, mapping)
+        self.generation = next(_generations)
+
+    def account_range(self, name: str) -> range:
+        """Return the account ids of *name* and all its sub-accounts."""
+        self.order_accounts()
+        return self.accounts.subtree(name)
+
+    def _reorder(self, name: str, order: list[int]) -> None:
+        self.tables[name].take(order)
+        mapping = inverse(order)
+        for table in self.tables.values():
+            for column in table.schema:
+                if column.ref == name:
+                    table.remap(column.name, mapping)
+
+
+def _mapping(mapping: list[int]) -> list[int] | None:
+    """Return an id translation list, or ``None`` if it is the identity.
+
+    The trailing ``-1`` keeps the "not given" id ``-1`` unchanged when the
+    list is used for indexing.
+    """
+    if all(map(operator.eq, mapping, range(len(mapping)))):
+        return None
+    mapping.append(-1)
+    return mapping
+
+
+def _date_order(table: Table) -> list[int]:
+    dates = table.columns["date"]
+    return sorted(range(len(dates)), key=dates.__getitem__)
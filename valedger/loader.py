@@ -0,0 +1,324 @@
+"""Build a :class:`~valedger.ledger.Ledger` from journal files.
+
+The loader drives :func:`~valedger.parser.parse_journal`, follows
+``include`` directives and turns each parsed entry into rows of the
+columnar store.  Parsed entries are discarded as soon as they are stored,
+so peak memory is the ledger itself plus one transaction.
+
+Journals split over several files are parsed concurrently: every file is
+parsed on its own into a :class:`Chunk` by a worker process, recording the
+position of each ``include`` it contains, and the chunks are spliced
+together in the exact order a sequential load would have produced.
+"""
+
+import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from glob import glob
+from os import PathLike
+from pathlib import Path
+from typing import NamedTuple
+
+from valedger.errors import ParseError
+from valedger.ledger import Ledger, Mark
+from valedger.money import Money
+from valedger.parser import Balance, CommodityDecl, Entry, Include, ParseStats, Price, Transaction, parse_journal
+
+
+def _target(base: Path, pattern: str) -> Path:
+    target = Path(pattern).expanduser()
+    return target if target.is_absolute() else base.parent / target
+
+
+def include_glob(base: Path, pattern: str) -> str:
+    """The glob expanded by an ``include`` of *pattern* in file *base*; empty for a single file."""
+    if any(char in pattern for char in "*?["):
+        return str(_target(base, pattern))
+    return ""
+
+
+def expand_glob(pattern: str) -> list[str]:
+    """Files matched by an include glob, in the order they are loaded."""
+    return [str(Path(match)) for match in sorted(glob(pattern))]
+
+
+def resolve_include(base: Path, pattern: str) -> list[Path]:
+    """Return the files matched by an ``include`` of *pattern* in file *base*."""
+    found = include_glob(base, pattern)
+    if found:
+        return [Path(match) for match in expand_glob(found)]
+    return [_target(base, pattern)]
+
+
+def add_entries(ledger: Ledger, entries: Iterable[Entry], path: str) -> list[Include]:
+    """Store parsed *entries* of file *path* in *ledger*.
+
+    Includes are not followed; they are returned so the caller can decide
+    how to load them.
+    """
+    file = ledger.files.intern(path)
+    return [entry for entry in entries if add_entry(ledger, entry, file) is not None]
+
+
+def add_entry(ledger: Ledger, entry: Entry, file: int = 0) -> Include | None:
+    """Store one parsed entry; includes are returned instead of stored."""
+    if isinstance(entry, Transaction):
+        add_transaction(ledger, entry, file)
+    elif isinstance(entry, Price):
+        commodity = ledger.commodity(entry.commodity)
+        quote = ledger.commodity(entry.price.commodity)
+        ledger.prices.append(entry.date, commodity, quote, entry.price.value, entry.price.scale)
+    elif isinstance(entry, Balance):
+        commodity, value = ledger.scaled(entry.amount)
+        ledger.balances.append(entry.date, ledger.accounts.intern(entry.account), commodity, value, file, entry.line)
+    elif isinstance(entry, CommodityDecl):
+        ledger.commodity(entry.commodity, entry.scale or 0)
+    elif isinstance(entry, Include):
+        return entry
+    return None
+
+
+def add_transaction(ledger: Ledger, entry: Transaction, file: int = 0) -> int:
+    """Store one parsed transaction, inferring an elided posting amount.
+
+    The elided posting receives one row per commodity left unbalanced by
+    the others, weighing annotated postings at their cost or price.
+    """
+    elided = [posting for posting in entry.postings if posting.amount is None]
+    if len(elided) > 1:
+        raise ParseError("more than one posting without an amount", ledger.files.name(file), entry.line)
+    day = entry.date
+    txn = ledger.begin_transaction(
+        day,
+        ledger.payees.intern(entry.payee),
+        ledger.notes.intern(entry.note),
+        ledger.codes.intern(entry.code),
+        file,
+        entry.line,
+    )
+    residual: dict[str, Money] = {}
+    for posting in entry.postings:
+        account = ledger.accounts.intern(posting.account)
+        amount = posting.amount
+        if amount is None:
+            continue
+        commodity, value = ledger.scaled(amount)
+        row = ledger.append(day, txn, account, commodity, value)
+        weight = posting.cost or posting.price
+        if weight is None:
+            weight = amount
+        else:
+            weight = -weight if amount.value < 0 else weight
+            _annotate(ledger, row, posting.cost, posting.price)
+        residual[weight.commodity] = residual[weight.commodity] + weight if weight.commodity in residual else weight
+        if posting.assertion is not None:
+            ledger.assertions.append(row, *ledger.scaled(posting.assertion))
+    if elided:
+        posting = elided[0]
+        account = ledger.accounts.intern(posting.account)
+        rows = [
+            ledger.append(day, txn, account, *ledger.scaled(-money))
+            for money in residual.values()
+            if money.value
+        ]
+        if not rows and residual:
+            commodity = ledger.commodity(next(iter(residual)))
+            rows.append(ledger.append(day, txn, account, commodity, 0))
+        if posting.assertion is not None and rows:
+            ledger.assertions.append(rows[-1], *ledger.scaled(posting.assertion))
+    for tag in entry.tags:
+        ledger.tag_rows.append(txn, ledger.tags.intern(tag))
+    return txn
+
+
+def _annotate(ledger: Ledger, row: int, cost: Money | None, price: Money | None) -> None:
+    ledger.annotations.append(
+        row,
+        -1 if cost is None else ledger.commodity(cost.commodity),
+        0 if cost is None else abs(cost.value),
+        0 if cost is None else cost.scale,
+        -1 if price is None else ledger.commodity(price.commodity),
+        0 if price is None else abs(price.value),
+        0 if price is None else price.scale,
+    )
+
+
+class Resume(NamedTuple):
+    """Where to continue parsing a file that has only been appended to.
+
+    Parsing restarts at the file's last entry, on line *line*, because
+    appended lines may still belong to it.  *mark* and *includes* give the
+    chunk's state just before that entry and *newlines* the number of
+    complete lines the file had.
+    """
+
+    line: int
+    mark: Mark
+    includes: int
+    newlines: int
+
+
+class Chunk(NamedTuple):
+    """One file parsed on its own.
+
+    *includes* lists, in file order, the files matched by each ``include``
+    directive together with the ledger mark at which they belong and, for
+    a glob, the pattern (see :func:`include_glob`), so that a cache can
+    tell when files matching it appear or disappear.
+    """
+
+    path: str
+    ledger: Ledger
+    includes: list[tuple[list[str], Mark, str]]
+    stats: ParseStats
+    resume: Resume
+
+
+def parse_chunk(path: str, base: Chunk | None = None, offset: int = 0) -> Chunk:
+    """Parse the file at *path* without following its includes.
+
+    With *base*, the file is known to be *base*'s file with lines appended
+    and *offset* is the byte offset of ``base.resume.line``: *base* is
+    truncated to its resume point and only the rest of the file is parsed.
+    """
+    stats = ParseStats()
+    if base is None:
+        ledger, includes, line, lines = Ledger(), [], 1, 0
+    else:
+        ledger, includes, line = base.ledger, base.includes[: base.resume.includes], base.resume.line
+        ledger.truncate(base.resume.mark)
+        lines = line - 1
+    resume = Resume(line, ledger.mark(), len(includes), 0)
+    file = ledger.files.intern(path)
+    for entry in parse_journal(path, stats, offset, line):
+        resume = Resume(entry.line, ledger.mark(), len(includes), 0)
+        include = add_entry(ledger, entry, file)
+        if include is not None:
+            matches = resolve_include(Path(path), include.path)
+            if not matches:
+                raise ParseError(f"include matches no file: {include.path}", path, include.line)
+            pattern = include_glob(Path(path), include.path)
+            includes.append(([str(match) for match in matches], ledger.mark(), pattern))
+    return Chunk(path, ledger, includes, stats, resume._replace(newlines=lines + stats.lines))
+
+
+def load_journal(
+    path: str | PathLike[str], stats: ParseStats | None = None, workers: int | None = None
+) -> Ledger:
+    """Parse the journal at *path* and everything it includes into a sorted ledger.
+
+    Accounts of the returned ledger are numbered in tree order.
+
+    Included files are parsed by a pool of *workers* processes (by default
+    one per available CPU); ``workers=1`` parses everything in this process.
+    The root file is always parsed here, and the pool is only started once
+    two or more included files are waiting to be parsed, so a journal in a
+    single file never pays for it.  On platforms that spawn worker
+    processes, a script loading a multi-file journal needs the usual
+    ``if __name__ == "__main__":`` guard.
+    """
+    stats = ParseStats() if stats is None else stats
+    ledger = Ledger()
+    if workers is None:
+        workers = available_cpus()
+    if workers <= 1:
+        _load(ledger, Path(path), stats, [])
+    else:
+        chunks = parse_chunks(str(path), workers)
+        for chunk in chunks.values():
+            stats.add(chunk.stats)
+        splice(ledger, chunks, str(path))
+    ledger.sort()
+    ledger.order_accounts()
+    return ledger
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parse_chunks(
+    root: str, workers: int, cached: Callable[[str], Chunk | None] | None = None
+) -> dict[str, Chunk]:
+    """Parse *root* and every file it includes, transitively.
+
+    *cached* may supply a ready chunk for a file, which is then not parsed.
+    *root* is parsed in this process.  Included files are parsed by a pool
+    of *workers* processes, created only once a second file needs parsing
+    while one is waiting or being parsed, and submitted as soon as the
+    chunk including them is known so the pool stays busy while the include
+    tree is discovered.  A lone include is parsed here, like the root.
+    """
+    chunks: dict[str, Chunk] = {}
+    waiting = [root]
+    submitted = {root}
+    pending: dict[Future[Chunk], str] = {}
+    pool: ProcessPoolExecutor | None = None
+
+    def discovered(chunk: Chunk) -> None:
+        chunks[chunk.path] = chunk
+        for paths, _, _ in chunk.includes:
+            for included in paths:
+                if included not in submitted:
+                    submitted.add(included)
+                    waiting.append(included)
+
+    try:
+        while waiting or pending:
+            while waiting:
+                path = waiting.pop()
+                chunk = cached(path) if cached is not None else None
+                if chunk is None and workers > 1 and path != root and (pool is not None or waiting or pending):
+                    pool = pool or ProcessPoolExecutor(max_workers=workers)
+                    pending[pool.submit(parse_chunk, path)] = path
+                    continue
+                discovered(chunk or parse_chunk(path))
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    discovered(future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return chunks
+
+
+def splice(ledger: Ledger, chunks: dict[str, Chunk], path: str, stack: list[Path] | None = None) -> None:
+    """Append the chunk of *path* to *ledger* with its includes spliced in place."""
+    stack = [] if stack is None else stack
+    resolved = Path(path).resolve()
+    if resolved in stack:
+        raise ParseError("include cycle", path)
+    stack.append(resolved)
+    chunk = chunks[path]
+    start = None
+    for paths, mark, _ in chunk.includes:
+        ledger.extend(chunk.ledger, start, mark)
+        for included in paths:
+            splice(ledger, chunks, included, stack)
+        start = mark
+    ledger.extend(chunk.ledger, start)
+    stack.pop()
+
+
+def _load(ledger: Ledger, path: Path, stats: ParseStats, stack: list[Path]) -> None:
+    """Load *path* depth-first, splicing includes in at their position."""
+    resolved = path.resolve()
+    if resolved in stack:
+        raise ParseError("include cycle", str(path))
+    stack.append(resolved)
+    file = ledger.files.intern(str(path))
+    for entry in parse_journal(path, stats):
+        include = add_entry(ledger, entry, file)
+        if include is None:
+            continue
+        matches = resolve_include(path, include.path)
+        if not matches:
+            raise ParseError(f"include matches no file: {include.path}", str(path), include.line)
+        for included in matches:
+            _load(ledger, included, stats, stack)
+    stack.pop()
@@ -0,0 +1,345 @@
+"""Lots, cost basis and realized gains.
+
+An :class:`Inventory` follows the lots held in each (account, commodity)
+position: every acquisition at a cost opens a lot, and every reduction
+closes lots, or parts of them, according to the position's booking
+method:
+
+``fifo`` / ``lifo``
+    oldest or newest lot first;
+``average``
+    all lots of a position are merged into one at their average cost;
+    units that came in without a cost are kept in a lot of their own, as
+    are lots costed in another commodity, so the known cost stays whole;
+``specific``
+    the lots whose unit cost is the one given with the reduction
+    (``-10 ACME {150 EUR}``), oldest first, or one lot chosen by id.
+
+Each position keeps its lot ids in a :class:`~collections.deque` in order
+of acquisition, and specific identification has one deque per unit cost,
+so closing a lot is amortized O(1) however many dividend reinvestments
+a position has collected.  Lots closed out of order stay in the other
+deques until they reach an end and are skipped there.
+
+Quantities are scaled integers like posting amounts; costs and proceeds
+are totals as :class:`~valedger.money.Money`.  The part of a lot's cost
+that goes with a partial reduction is rounded, and the rest stays with
+the lot, so the costs of all disposals of a lot add up to its cost.
+"""
+
+from collections import deque
+from collections.abc import Iterable
+from fractions import Fraction
+from typing import NamedTuple
+
+from valedger.accounts import parent_name
+from valedger.ledger import Ledger
+from valedger.money import Money, round_div
+
+METHODS = ("fifo", "lifo", "average", "specific")
+
+
+class Lot(NamedTuple):
+    """Open lot: *quantity* units of *commodity* held in *account* since *acquired*.
+
+    *cost* is the total cost of the units still held, or ``None`` if they
+    came in without one.
+    """
+
+    id: int
+    account: int
+    commodity: int
+    acquired: int
+    quantity: int
+    cost: Money | None
+
+
+class Disposal(NamedTuple):
+    """Part of a reduction taken from one lot.
+
+    *lot* is ``-1`` (and *cost* ``None``) for units sold beyond what the
+    position held.  *proceeds* is the share of the sale price, if one was
+    given.
+    """
+
+    day: int
+    account: int
+    commodity: int
+    lot: int
+    acquired: int
+    quantity: int
+    cost: Money | None
+    proceeds: Money | None
+
+    @property
+    def gain(self) -> Money | None:
+        """Realized gain, if cost and proceeds are known in the same commodity."""
+        if self.cost is None or self.proceeds is None or self.cost.commodity != self.proceeds.commodity:
+            return None
+        return self.proceeds - self.cost
+
+
+def _share(total: Money | None, part: int, whole: int) -> Money | None:
+    if total is None:
+        return None
+    return Money(round_div(total.value * part, whole), total.commodity, total.scale)
+
+
+def _unit_cost(cost: Money, quantity: int, scale: int) -> tuple[str, Fraction]:
+    return cost.commodity, Fraction(cost.value * 10**scale, 10**cost.scale * quantity)
+
+
+class Inventory:
+    """Open lots and realized disposals of the positions of a ledger.
+
+    *method* is the default booking method; *methods* overrides it for
+    accounts and their subaccounts by name.  With *price_as_cost*, the
+    ``@`` price of an acquisition is taken as its cost when no ``{}`` cost
+    is given, as journals that never write lot costs do.
+    """
+
+    __slots__ = (
+        "method",
+        "methods",
+        "price_as_cost",
+        "rows",
+        "last_day",
+        "generation",
+        "disposals",
+        "_scales",
+        "_methods",
+        "_lots",
+        "_positions",
+        "_by_cost",
+        "_annotations",
+        "_annotated",
+        "_next",
+        "_digest",
+    )
+
+    def __init__(
+        self,
+        ledger: Ledger | None = None,
+        method: str = "fifo",
+        methods: dict[str, str] | None = None,
+        price_as_cost: bool = False,
+    ) -> None:
+        self.methods = dict(methods or {})
+        for booking in (method, *self.methods.values()):
+            if booking not in METHODS:
+                raise ValueError(f"unknown booking method {booking!r}; expected one of {', '.join(METHODS)}")
+        self.method = method
+        self.price_as_cost = price_as_cost
+        self.clear()
+        if ledger is not None:
+            self.update(ledger)
+
+    def clear(self) -> None:
+        self.rows = 0
+        self.last_day: int | None = None
+        self.generation = -1
+        self._digest = b""
+        self.disposals: list[Disposal] = []
+        self._scales: list[int] = []
+        self._methods: dict[int, str] = {}
+        self._lots: dict[int, Lot] = {}
+        self._positions: dict[tuple[int, int], deque[int]] = {}
+        self._by_cost: dict[tuple[int, int, str, Fraction], deque[int]] = {}
+        self._annotations = 0
+        self._annotated: dict[int, int] = {}
+        self._next = 0
+
+    def __len__(self) -> int:
+        """Number of open lots."""
+        return len(self._lots)
+
+    def __repr__(self) -> str:
+        return f"Inventory({len(self)} open lots, {len(self.disposals)} disposals)"
+
+    def booking(self, account: int) -> str:
+        """Booking method of account id *account*."""
+        return self._methods.get(account, self.method)
+
+    def _resolve(self, ledger: Ledger, account: int) -> None:
+        name = ledger.accounts.name(account)
+        while name:
+            if name in self.methods:
+                self._methods[account] = self.methods[name]
+                return
+            name = parent_name(name)
+
+    def update(self, ledger: Ledger) -> None:
+        """Book the postings appended to *ledger* since the last update.
+
+        Postings with a cost annotation, or a price with *price_as_cost*,
+        open lots or name the lots they reduce; other postings only count
+        in positions that already hold lots.  Everything is booked again if
+        the ledger shrank, a commodity precision was widened, the new
+        postings are dated before the last booked day or the booked ones
+        changed, for example a back-dated transaction was sorted in among
+        them (a digest of their rows tells, once the ledger's
+        :attr:`~valedger.ledger.Ledger.generation` moved).
+        """
+        if not ledger.is_sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        postings = ledger.postings
+        stale = len(postings) < self.rows or any(a != b for a, b in zip(self._scales, ledger.scales))
+        if not stale and self.last_day is not None and self.rows < len(postings):
+            stale = postings.columns["date"][self.rows] < self.last_day
+        if not stale and self.rows and ledger.generation != self.generation:
+            stale = self._fingerprint(ledger) != self._digest
+        if stale:
+            self.clear()
+        self.generation = ledger.generation
+        self._scales = list(ledger.scales)
+        annotations = ledger.annotations.columns
+        for index in range(self._annotations, len(ledger.annotations)):
+            self._annotated[annotations["posting"][index]] = index
+        self._annotations = len(ledger.annotations)
+        columns = postings.columns
+        commodities = ledger.commodities
+        for row in range(self.rows, len(postings)):
+            account, commodity = columns["account"][row], columns["commodity"][row]
+            index = self._annotated.get(row)
+            if index is None and (account, commodity) not in self._positions:
+                continue
+            day, quantity = columns["date"][row], columns["amount"][row]
+            cost = price = None
+            if index is not None:
+                if annotations["cost_commodity"][index] >= 0:
+                    cost = Money(
+                        annotations["cost"][index],
+                        commodities.name(annotations["cost_commodity"][index]),
+                        annotations["cost_scale"][index],
+                    )
+                if annotations["price_commodity"][index] >= 0:
+                    price = Money(
+                        annotations["price"][index],
+                        commodities.name(annotations["price_commodity"][index]),
+                        annotations["price_scale"][index],
+                    )
+            if cost is None and price is not None and self.price_as_cost and quantity > 0:
+                cost = price
+            if cost is None and (account, commodity) not in self._positions:
+                continue
+            if account not in self._methods and self.methods:
+                self._resolve(ledger, account)
+            if quantity > 0:
+                self.add(day, account, commodity, quantity, cost)
+            elif quantity < 0:
+                self.reduce(day, account, commodity, -quantity, price, cost)
+        if self.rows < len(postings):
+            self.last_day = columns["date"][len(postings) - 1]
+        self.rows = len(postings)
+        self._digest = self._fingerprint(ledger)
+
+    def _fingerprint(self, ledger: Ledger) -> bytes:
+        """Digest of the booked postings and their annotations."""
+        return ledger.digest(self.rows) + ledger.digest(self._annotations, "annotations")
+
+    def add(self, day: int, account: int, commodity: int, quantity: int, cost: Money | None) -> Lot:
+        """Open a lot of *quantity* units (at the ledger's scale) costing *cost* in total."""
+        key = (account, commodity)
+        position = self._positions.setdefault(key, deque())
+        if self.booking(account) == "average":
+            while position and position[-1] not in self._lots:
+                position.pop()
+            # Merge with the open lot costed in the same commodity, or with
+            # the one without a cost; the position has one lot of each.
+            unit = None if cost is None else cost.commodity
+            for id in reversed(position):
+                last = self._lots.get(id)
+                if last is not None and (None if last.cost is None else last.cost.commodity) == unit:
+                    total = None if last.cost is None or cost is None else last.cost + cost
+                    lot = self._lots[id] = last._replace(quantity=last.quantity + quantity, cost=total)
+                    return lot
+        lot = Lot(self._next, account, commodity, day, quantity, cost)
+        self._next += 1
+        self._lots[lot.id] = lot
+        position.append(lot.id)
+        if cost is not None:
+            unit = _unit_cost(cost, quantity, self._scale(commodity))
+            self._by_cost.setdefault((account, commodity, *unit), deque()).append(lot.id)
+        return lot
+
+    def _scale(self, commodity: int) -> int:
+        return self._scales[commodity] if commodity < len(self._scales) else 0
+
+    def reduce(
+        self,
+        day: int,
+        account: int,
+        commodity: int,
+        quantity: int,
+        proceeds: Money | None = None,
+        cost: Money | None = None,
+        lot: int | None = None,
+    ) -> list[Disposal]:
+        """Take *quantity* units out of a position and record the disposals.
+
+        *proceeds* is the total sale price.  The lot with id *lot* is
+        reduced first, and with specific identification the lots with the
+        unit cost of the total *cost* given; any quantity beyond them is
+        taken in the position's booking order (oldest first for specific
+        identification).
+        """
+        method = self.booking(account)
+        position = self._positions.get((account, commodity), deque())
+        queues = [position]
+        if lot is not None:
+            if lot not in self._lots or self._lots[lot][1:3] != (account, commodity):
+                raise ValueError(f"lot {lot} is not open in this position")
+            queues.insert(0, deque((lot,)))
+        elif method == "specific" and cost is not None:
+            unit = _unit_cost(cost, quantity, self._scale(commodity))
+            queues.insert(0, self._by_cost.get((account, commodity, *unit), deque()))
+        # Lots named by id or cost go first; anything beyond them comes out
+        # of the position in booking order.
+        newest = method == "lifo"
+        disposals = []
+        remaining = quantity
+        for queue in queues:
+            take = queue.pop if newest else queue.popleft
+            while remaining and queue:
+                current = self._lots.get(queue[-1] if newest else queue[0])
+                if current is None:
+                    take()
+                    continue
+                taken = min(remaining, current.quantity)
+                share = _share(current.cost, taken, current.quantity)
+                disposals.append(Disposal(day, account, commodity, current.id, current.acquired, taken, share, None))
+                if taken == current.quantity:
+                    del self._lots[current.id]
+                    take()
+                else:
+                    left = None if current.cost is None or share is None else current.cost - share
+                    self._lots[current.id] = current._replace(quantity=current.quantity - taken, cost=left)
+                remaining -= taken
+        if remaining:
+            disposals.append(Disposal(day, account, commodity, -1, -1, remaining, None, None))
+        if proceeds is not None:
+            # Split the proceeds by quantity; the last disposal takes the
+            # rounding difference so the shares add up.
+            rest = proceeds
+            for index, disposal in enumerate(disposals):
+                part = rest if index == len(disposals) - 1 else _share(proceeds, disposal.quantity, quantity)
+                disposals[index] = disposal._replace(proceeds=part)
+                rest = rest - part  # type: ignore[operator]
+        self.disposals.extend(disposals)
+        return disposals
+
+    def lots(self, account: int, commodity: int | None = None) -> list[Lot]:
+        """Open lots of *account*, in order of acquisition."""
+        keys: Iterable[tuple[int, int]] = (
+            [(account, commodity)] if commodity is not None else [key for key in self._positions if key[0] == account]
+        )
+        return [self._lots[id] for key in keys for id in self._positions.get(key, ()) if id in self._lots]
+
+    def holding(self, account: int, commodity: int) -> tuple[int, Money | None]:
+        """Quantity held in a position and the total cost of its lots."""
+        quantity, cost = 0, None
+        for lot in self.lots(account, commodity):
+            quantity += lot.quantity
+            if lot.cost is not None:
+                cost = lot.cost if cost is None else cost + lot.cost
+        return quantity, cost
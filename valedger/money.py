@@ -0,0 +1,220 @@
+"""Exact fixed-point amounts.
+
+Amounts are plain integers scaled by ``10 ** scale``, where the scale is the
+display precision of the commodity.  Integer arithmetic is exact and an
+order of magnitude faster than :class:`decimal.Decimal`, so
+:class:`Decimal` only appears when converting at the parse and render
+edges.  The column helpers at the bottom of this module operate on whole
+``array('q')`` columns (or memoryviews of them) without creating a
+:class:`Money` per value.
+"""
+
+import operator
+from array import array
+from collections.abc import Iterable
+from decimal import Decimal
+from functools import total_ordering
+from itertools import compress
+
+MAX_SCALE = 18
+
+
+def parse_number(text: str) -> tuple[int, int]:
+    """Parse a decimal literal such as ``-1,234.50`` into ``(value, scale)``.
+
+    Thousands separators are ignored; the scale is the number of digits
+    after the decimal point.
+    """
+    text = text.strip().replace(",", "").replace("_", "")
+    negative = text.startswith("-")
+    if negative or text.startswith("+"):
+        text = text[1:]
+    whole, _, fraction = text.partition(".")
+    digits = whole + fraction
+    if not digits.isdigit() or not digits.isascii():
+        raise ValueError(f"invalid number: {text!r}")
+    value = int(digits)
+    return (-value if negative else value), len(fraction)
+
+
+def rescale(value: int, scale: int, target: int) -> int:
+    """Return *value* at *scale* expressed at the *target* scale.
+
+    Narrowing the scale is only allowed when it is exact.
+    """
+    if target >= scale:
+        return value * 10 ** (target - scale)
+    quotient, remainder = divmod(value, 10 ** (scale - target))
+    if remainder:
+        raise ValueError(f"cannot narrow {value}e-{scale} to {target} decimals exactly")
+    return quotient
+
+
+def round_div(numerator: int, denominator: int) -> int:
+    """Divide integers rounding half to even, as :class:`Decimal` does."""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def format_number(value: int, scale: int, thousands: str = "") -> str:
+    """Render a scaled integer with exactly *scale* decimals."""
+    sign = "-" if value < 0 else ""
+    digits = str(abs(value)).rjust(scale + 1, "0")
+    whole, fraction = (digits[:-scale], digits[-scale:]) if scale else (digits, "")
+    if thousands:
+        whole = f"{int(whole):,}".replace(",", thousands)
+    return f"{sign}{whole}.{fraction}" if scale else f"{sign}{whole}"
+
+
+@total_ordering
+class Money:
+    """An exact amount of a commodity: ``value / 10 ** scale`` units."""
+
+    __slots__ = ("value", "scale", "commodity")
+
+    def __init__(self, value: int, commodity: str, scale: int = 0) -> None:
+        if not 0 <= scale <= MAX_SCALE:
+            raise ValueError(f"scale must be between 0 and {MAX_SCALE}")
+        self.value = value
+        self.commodity = commodity
+        self.scale = scale
+
+    @classmethod
+    def parse(cls, text: str, commodity: str, scale: int | None = None) -> "Money":
+        """Parse a decimal literal, optionally widening it to *scale*."""
+        value, parsed = parse_number(text)
+        if scale is None:
+            return cls(value, commodity, parsed)
+        return cls(rescale(value, parsed, scale), commodity, scale)
+
+    @classmethod
+    def from_decimal(cls, amount: Decimal, commodity: str, scale: int | None = None) -> "Money":
+        sign, digits, exponent = amount.as_tuple()
+        if not isinstance(exponent, int):
+            raise ValueError(f"not a finite amount: {amount}")
+        value = int("".join(map(str, digits)) or "0")
+        value = -value if sign else value
+        if exponent > 0:
+            value, exponent = value * 10**exponent, 0
+        money = cls(value, commodity, -exponent)
+        return money if scale is None else money.at_scale(scale)
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.value).scaleb(-self.scale)
+
+    def at_scale(self, scale: int) -> "Money":
+        """Return the same amount expressed with *scale* decimals (exactly)."""
+        if scale == self.scale:
+            return self
+        return Money(rescale(self.value, self.scale, scale), self.commodity, scale)
+
+    def _align(self, other: "Money") -> tuple[int, int, int]:
+        if not isinstance(other, Money):
+            raise TypeError(f"expected Money, got {type(other).__name__}")
+        if other.commodity != self.commodity:
+            raise ValueError(f"commodity mismatch: {self.commodity} and {other.commodity}")
+        scale = max(self.scale, other.scale)
+        return rescale(self.value, self.scale, scale), rescale(other.value, other.scale, scale), scale
+
+    def __add__(self, other: "Money") -> "Money":
+        left, right, scale = self._align(other)
+        return Money(left + right, self.commodity, scale)
+
+    def __sub__(self, other: "Money") -> "Money":
+        left, right, scale = self._align(other)
+        return Money(left - right, self.commodity, scale)
+
+    def __mul__(self, factor: int) -> "Money":
+        if not isinstance(factor, int):
+            return NotImplemented
+        return Money(self.value * factor, self.commodity, self.scale)
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "Money":
+        return Money(-self.value, self.commodity, self.scale)
+
+    def __abs__(self) -> "Money":
+        return Money(abs(self.value), self.commodity, self.scale)
+
+    def __bool__(self) -> bool:
+        return self.value != 0
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.commodity != self.commodity:
+            return False
+        left, right, _ = self._align(other)
+        return left == right
+
+    def __lt__(self, other: "Money") -> bool:
+        left, right, _ = self._align(other)
+        return left < right
+
+    def __hash__(self) -> int:
+        value, scale = self.value, self.scale
+        while scale and value % 10 == 0:
+            value, scale = value // 10, scale - 1
+        return hash((value, scale, self.commodity))
+
+    def __str__(self) -> str:
+        return f"{format_number(self.value, self.scale)} {self.commodity}"
+
+    def __repr__(self) -> str:
+        return f"Money({str(self)!r})"
+
+
+# Column operations.  These take ``array('q')`` columns or memoryviews of
+# them and never materialise per-value objects.
+
+Values = array | memoryview
+
+
+def total(values: Values) -> int:
+    """Exact sum of a column of scaled integers."""
+    return sum(values)
+
+
+def negate(values: Values) -> array:
+    return array("q", map(operator.neg, values))
+
+
+def rescale_column(values: Values, scale: int, target: int) -> array:
+    """Return *values* widened from *scale* to *target* decimals."""
+    if target < scale:
+        raise ValueError("columns can only be widened")
+    factor = 10 ** (target - scale)
+    return array("q", map(factor.__mul__, values))
+
+
+# ``threshold.__gt__(v)`` is ``v < threshold``: the reflected dunder keeps
+# the comparison loop inside ``map``.
+_REFLECTED = {
+    "<": "__gt__",
+    "<=": "__ge__",
+    ">": "__lt__",
+    ">=": "__le__",
+    "=": "__eq__",
+    "==": "__eq__",
+    "!=": "__ne__",
+}
+
+
+def compare(values: Values, op: str, threshold: int) -> Iterable[bool]:
+    """Lazily evaluate ``value op threshold`` for every value of a column."""
+    try:
+        method = _REFLECTED[op]
+    except KeyError:
+        raise ValueError(f"unknown comparison operator {op!r}") from None
+    return map(getattr(threshold, method), values)
+
+
+def select(values: Values, op: str, threshold: int, offset: int = 0) -> array:
+    """Return the positions (plus *offset*) whose value satisfies ``value op threshold``."""
+    return array("i", compress(range(offset, offset + len(values)), compare(values, op, threshold)))
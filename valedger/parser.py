@@ -0,0 +1,404 @@
+"""Streaming parser for plain-text journals.
+
+The parser understands the common subset of the ledger, hledger and
+beancount formats::
+
+    include 2023.journal
+    commodity 1,000.00 EUR
+    P 2024-01-05 EUR 1.09 USD
+
+    2024-01-05 * (1234) Grocer | weekly shopping  ; food:, receipt:scanned
+        Expenses:Food            42.10 EUR
+        Assets:Bank:Checking    -42.10 EUR = 1000.00 EUR
+
+    2024-01-06 * "Broker" "Buy shares" #invest
+      Assets:Broker  10 AAPL {150.00 USD}
+      Assets:Cash
+
+    2024-02-01 balance Assets:Bank:Checking  950.00 EUR
+
+:func:`parse_journal` reads the file in large binary chunks and yields one
+entry at a time, so memory use is bounded by the chunk size and the
+largest single transaction, never by the size of the file.  Includes are
+reported as :class:`Include` entries and left to the caller to follow.
+"""
+
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from os import PathLike
+from time import perf_counter
+from typing import NamedTuple
+
+from valedger.errors import ParseError
+from valedger.money import Money, parse_number
+
+CHUNK_SIZE = 1 << 22
+
+
+class Posting(NamedTuple):
+    """A parsed posting.
+
+    *cost* is the total lot cost given with ``{unit}`` or ``{{total}}`` and
+    *price* the total price given with ``@ unit`` or ``@@ total``; both are
+    unsigned and expressed in the cost commodity.  *amount* is ``None`` for the
+    posting whose amount is left for the loader to infer.
+    """
+
+    account: str
+    amount: Money | None
+    cost: Money | None = None
+    price: Money | None = None
+    assertion: Money | None = None
+
+
+class Transaction(NamedTuple):
+    date: int
+    payee: str
+    note: str
+    code: str
+    tags: tuple[str, ...]
+    postings: tuple[Posting, ...]
+    line: int
+
+
+class Price(NamedTuple):
+    """Market price of one unit of *commodity* on *date*."""
+
+    date: int
+    commodity: str
+    price: Money
+    line: int
+
+
+class Balance(NamedTuple):
+    """Balance assertion for the start of *date* (beancount ``balance``)."""
+
+    date: int
+    account: str
+    amount: Money
+    line: int
+
+
+class CommodityDecl(NamedTuple):
+    """``commodity`` directive; *scale* is the declared display precision."""
+
+    commodity: str
+    scale: int | None
+    line: int
+
+
+class Include(NamedTuple):
+    path: str
+    line: int
+
+
+Entry = Transaction | Price | Balance | CommodityDecl | Include
+
+
+@dataclass(slots=True)
+class ParseStats:
+    """Counters updated while a journal is parsed."""
+
+    bytes: int = 0
+    lines: int = 0
+    transactions: int = 0
+    postings: int = 0
+    seconds: float = 0.0
+    files: list[str] = field(default_factory=list)
+
+    def add(self, other: "ParseStats") -> None:
+        """Accumulate the counters of *other*, e.g. from a worker process."""
+        self.bytes += other.bytes
+        self.lines += other.lines
+        self.transactions += other.transactions
+        self.postings += other.postings
+        self.seconds += other.seconds
+        self.files.extend(other.files)
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    @property
+    def transactions_per_second(self) -> float:
+        return self.transactions / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.bytes / 1e6:.1f} MB, {self.transactions} transactions, {self.postings} postings "
+            f"in {self.seconds:.3f}s ({self.mb_per_second:.1f} MB/s, {self.transactions_per_second:,.0f} txn/s)"
+        )
+
+
+_COMMODITY = r'"[^"]*"|[^\s\d\-+.,;@=*{}()"]+'
+_NUMBER = r"\d[\d,_]*(?:\.\d*)?|\.\d+"
+_AMOUNT = re.compile(
+    rf"""\s*(?P<sign>[-+]?)\s*(?:
+        (?P<prefix>{_COMMODITY})\s*(?P<sign2>[-+]?)\s*(?P<number>{_NUMBER})
+      | (?P<number2>{_NUMBER})(?:\s*(?P<suffix>{_COMMODITY}(?:[\w.]*)))?
+    )\s*$""",
+    re.VERBOSE,
+)
+# The overwhelmingly common ``-42.10 EUR`` form, parsed without the general regex.
+_PLAIN_AMOUNT = re.compile(r"\s*(-?)(\d+)(?:\.(\d+))? ([A-Za-z]+)\s*$")
+_POSTING_SPLIT = re.compile(r"\s{2,}|\t")
+_ANNOTATIONS = re.compile(r"\{\{(?P<total>[^}]*)\}\}|\{(?P<unit>[^}]*)\}|(?P<at>@@?)")
+_LOT_SEPARATOR = re.compile(r",\s")
+_HLEDGER_TAG = re.compile(r"(?:^|[\s,])([^\s,:]+):")
+_BEANCOUNT_TAG = re.compile(r"#([\w\-/.]+)")
+_QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_CODE = re.compile(r"\(([^)]*)\)\s*")
+_ACCOUNT_DIRECTIVES = frozenset({"open", "close", "pad", "note", "document"})
+_STRING_DIRECTIVES = frozenset({"event", "custom", "query"})
+_INDENT = frozenset(("", " ", "\t", "\r"))
+_COMMENT = frozenset(";#*%|")
+_TRANSACTION_MARKS = frozenset('*!"(')
+_SKIP = CommodityDecl("", None, 0)  # sentinel for ignored dated directives
+
+
+@lru_cache(maxsize=8192)
+def parse_date(text: str) -> int:
+    """Parse ``YYYY-MM-DD`` (or with ``/`` or ``.`` separators) to a day number."""
+    if len(text) != 10 or text[4] not in "-/." or text[7] != text[4]:
+        raise ValueError(f"invalid date: {text!r}")
+    return date(int(text[:4]), int(text[5:7]), int(text[8:])).toordinal()
+
+
+def parse_amount(text: str) -> Money:
+    """Parse an amount such as ``-42.10 EUR``, ``EUR -42.10`` or ``$5``."""
+    match = _PLAIN_AMOUNT.match(text)
+    if match is not None:
+        sign, whole, fraction, commodity = match.groups()
+        value = int(whole + fraction) if fraction else int(whole)
+        return Money(-value if sign else value, commodity, len(fraction) if fraction else 0)
+    match = _AMOUNT.match(text)
+    if match is None:
+        raise ValueError(f"invalid amount: {text.strip()!r}")
+    number = match["number"] or match["number2"]
+    commodity = (match["prefix"] or match["suffix"] or "").strip('"')
+    value, scale = parse_number(number)
+    if (match["sign"] == "-") != (match["sign2"] == "-"):
+        value = -value
+    return Money(value, commodity, scale)
+
+
+def _times(unit: Money, quantity: Money) -> Money:
+    """Total of *quantity* units priced at *unit*, dropping redundant zeros."""
+    value, scale = unit.value * abs(quantity.value), unit.scale + quantity.scale
+    while scale > unit.scale and value % 10 == 0:
+        value, scale = value // 10, scale - 1
+    return Money(value, unit.commodity, scale)
+
+
+def parse_posting(text: str) -> Posting:
+    """Parse a posting line with its indentation and comment removed."""
+    # Fast path for the common ``Account  -42.10 EUR`` posting, using only
+    # string methods; anything unusual falls through to the general parser.
+    account, separator, rest = text.partition("  ")
+    if separator and text[0] not in "*!" and "\t" not in account:
+        number, _, commodity = rest.strip().partition(" ")
+        if commodity.isalpha():
+            dot = number.find(".")
+            try:
+                value = int(number if dot < 0 else number[:dot] + number[dot + 1 :])
+            except ValueError:
+                pass
+            else:
+                return Posting(account, Money(value, commodity, 0 if dot < 0 else len(number) - dot - 1))
+    if text[0] in "*!":
+        text = text[1:].lstrip()
+    parts = _POSTING_SPLIT.split(text, maxsplit=1)
+    if len(parts) == 1 and " " in text:
+        # beancount separates account and amount by a single space
+        parts = text.split(None, 1)
+    account = parts[0]
+    if len(parts) == 1:
+        return Posting(account, None)
+    rest = parts[1]
+    assertion = None
+    if "=" in rest:
+        rest, _, asserted = rest.partition("=")
+        assertion = parse_amount(asserted.lstrip("=*"))
+    cost = price = None
+    match = _ANNOTATIONS.search(rest)
+    amount = parse_amount(rest if match is None else rest[: match.start()]) if rest.strip() else None
+    while match is not None:
+        following = _ANNOTATIONS.search(rest, match.end())
+        if match["at"]:
+            value = parse_amount(rest[match.end() : following.start() if following else len(rest)])
+            price = value if match["at"] == "@@" or amount is None else _times(value, amount)
+        elif match["total"] is not None:
+            cost = parse_amount(match["total"])
+        elif match["unit"].strip():
+            unit = parse_amount(_LOT_SEPARATOR.split(match["unit"])[0])
+            cost = unit if amount is None else _times(unit, amount)
+        match = following
+    if amount is None and (cost is not None or price is not None):
+        raise ValueError("cost or price given without an amount")
+    return Posting(account, amount, cost, price, assertion)
+
+
+def _tags(comment: str) -> list[str]:
+    return _HLEDGER_TAG.findall(comment)
+
+
+def parse_header(text: str) -> tuple[int, str, str, str, list[str]]:
+    """Parse a transaction header into ``(date, payee, note, code, tags)``."""
+    head, _, comment = text.partition(";")
+    stamp, _, rest = head.partition(" ")
+    day = parse_date(stamp.partition("=")[0])
+    rest = rest.strip()
+    if rest[:1] in ("*", "!"):
+        rest = rest[1:].lstrip()
+    elif rest == "txn" or rest.startswith("txn "):
+        rest = rest[3:].lstrip()
+    code = ""
+    match = _CODE.match(rest)
+    if match:
+        code, rest = match[1].strip(), rest[match.end() :]
+    tags = _tags(comment)
+    if rest.startswith('"'):
+        strings = _QUOTED.findall(rest)
+        tags.extend(_BEANCOUNT_TAG.findall(_QUOTED.sub("", rest)))
+        if len(strings) >= 2:
+            payee, note = strings[0], strings[1]
+        else:
+            payee, note = "", strings[0] if strings else ""
+    else:
+        payee, _, note = rest.partition("|")
+        payee, note = payee.strip(), note.strip()
+    return day, payee, note, code, tags
+
+
+def _lines(path: str | PathLike[str], stats: ParseStats, offset: int = 0) -> Iterator[str]:
+    """Yield the lines of *path* from byte *offset*, reading and decoding in large chunks.
+
+    ``stats.lines`` counts newline-terminated lines.
+    """
+    pending = b""
+    with open(path, "rb", buffering=0) as handle:
+        handle.seek(offset)
+        while chunk := handle.read(CHUNK_SIZE):
+            stats.bytes += len(chunk)
+            cut = chunk.rfind(b"\n") + 1
+            if not cut:
+                pending += chunk
+                continue
+            block, pending = pending + chunk[:cut], chunk[cut:]
+            lines = block.decode().split("\n")
+            lines.pop()
+            stats.lines += len(lines)
+            yield from lines
+    if pending:
+        yield pending.decode()
+
+
+def parse_journal(
+    path: str | PathLike[str], stats: ParseStats | None = None, offset: int = 0, line: int = 1
+) -> Iterator[Entry]:
+    """Lazily parse the journal at *path*, yielding one entry at a time.
+
+    *stats*, when given, is updated with byte and entry counts and the time
+    spent inside the parser, from which throughput can be reported.
+    Parsing may start at byte *offset*, which must be the start of
+    top-level line number *line*.
+    """
+    stats = ParseStats() if stats is None else stats
+    name = str(path)
+    stats.files.append(name)
+    started = perf_counter()
+    header: tuple[int, str, str, str, list[str]] | None = None
+    postings: list[Posting] = []
+    header_line = 0
+
+    def finish() -> Transaction:
+        day, payee, note, code, tags = header
+        stats.transactions += 1
+        stats.postings += len(postings)
+        return Transaction(day, payee, note, code, tuple(dict.fromkeys(tags)), tuple(postings), header_line)
+
+    lineno = 0
+    try:
+        for lineno, text in enumerate(_lines(path, stats, offset), line):
+            first = text[:1]
+            if first in _INDENT:
+                if header is None:
+                    continue
+                text = text.strip()
+                if not text:
+                    stats.seconds += perf_counter() - started
+                    yield finish()
+                    started = perf_counter()
+                    header = None
+                elif text[0] in ";#":
+                    header[4].extend(_tags(text[1:]))
+                elif ";" in text:
+                    text, _, comment = text.partition(";")
+                    header[4].extend(_tags(comment))
+                    if not text.partition(" ")[0].endswith(":"):
+                        postings.append(parse_posting(text.rstrip()))
+                elif not text.partition(" ")[0].endswith(":"):  # skip beancount metadata
+                    postings.append(parse_posting(text))
+                continue
+            if header is not None:
+                stats.seconds += perf_counter() - started
+                yield finish()
+                started = perf_counter()
+                header = None
+            if first in _COMMENT:
+                continue
+            text = text.rstrip("\r")
+            if first.isdigit():
+                entry = None if text[11:12] in _TRANSACTION_MARKS else _dated(text, lineno)
+                if entry is None:
+                    header, postings, header_line = parse_header(text), [], lineno
+                    continue
+                if entry is _SKIP:
+                    continue
+            elif text.startswith("P "):
+                _, stamp, commodity, price = text.split(None, 3)
+                entry = Price(parse_date(stamp), commodity, parse_amount(price.partition(";")[0]), lineno)
+            elif text.startswith("include "):
+                entry = Include(text[8:].partition(";")[0].strip(), lineno)
+            elif text.startswith("commodity "):
+                entry = _commodity(text[10:].partition(";")[0].strip(), lineno)
+            else:
+                continue  # unsupported directive (account, alias, ...)
+            stats.seconds += perf_counter() - started
+            yield entry
+            started = perf_counter()
+        if header is not None:
+            stats.seconds += perf_counter() - started
+            yield finish()
+            started = perf_counter()
+    except (ValueError, IndexError) as exc:
+        raise ParseError(str(exc), name, lineno) from exc
+    finally:
+        stats.seconds += perf_counter() - started
+
+
+def _dated(text: str, lineno: int) -> Entry | None:
+    """Parse a beancount-style dated directive; ``None`` means a transaction."""
+    parts = text.partition(";")[0].split(None, 3)
+    if len(parts) < 3:
+        return None
+    keyword = parts[1]
+    if keyword == "balance" and len(parts) == 4 and ":" in parts[2]:
+        return Balance(parse_date(parts[0]), parts[2], parse_amount(parts[3]), lineno)
+    if keyword == "price" and len(parts) == 4:
+        return Price(parse_date(parts[0]), parts[2], parse_amount(parts[3]), lineno)
+    if keyword == "commodity" and len(parts) == 3:
+        return CommodityDecl(parts[2], None, lineno)
+    if keyword in _ACCOUNT_DIRECTIVES and ":" in parts[2] or keyword in _STRING_DIRECTIVES and parts[2][:1] == '"':
+        return _SKIP
+    return None
+
+
+def _commodity(text: str, lineno: int) -> CommodityDecl:
+    if any(char.isdigit() for char in text):
+        sample = parse_amount(text)
+        return CommodityDecl(sample.commodity, sample.scale, lineno)
+    return CommodityDecl(text.strip('"'), None, lineno)
@@ -0,0 +1,217 @@
+"""Dated prices and commodity valuation.
+
+A :class:`PriceIndex` keeps the ``P`` directives of a ledger per
+(commodity, quote) pair as a date-sorted array, so the price in effect on
+a day (the latest one at or before it) is one binary search.  A pair
+without prices of its own is answered from the opposite pair, inverted,
+and failing that by converting along the shortest chain of priced pairs,
+such as CHF→EUR→JPY for CHF→JPY.  Chains are found by a breadth-first
+search of the price graph and cached per pair and date bucket, and reused
+later in the bucket until some pair got its first price in between; rates
+are only worked out when asked for and kept in a least-recently-used
+cache, since valuation reports ask for the same few pairs on the same few
+days millions of times.  Rates are dropped whenever a price is added,
+chains when a pair gets its first or an earlier price.
+
+Rates are exact :class:`~fractions.Fraction` values; :meth:`PriceIndex.convert`
+applies one to a scaled integer amount with the rounding of
+:func:`~valedger.money.round_div`.
+"""
+
+from array import array
+from bisect import bisect_right, insort
+from fractions import Fraction
+from functools import lru_cache
+
+from valedger.ledger import Day, Ledger, to_day
+from valedger.money import round_div
+
+_SHIFT = 32
+
+
+def _key(commodity: int, quote: int) -> int:
+    return commodity << _SHIFT | quote
+
+
+class PriceIndex:
+    """Prices of a ledger by pair and date, with cached derived rates."""
+
+    __slots__ = ("rows", "generation", "bucket", "_digest", "_days", "_rates", "_neighbours", "_openings", "_paths", "_derived")
+
+    def __init__(self, ledger: Ledger | None = None, cache_size: int = 65536, bucket: int = 32) -> None:
+        self.bucket = bucket
+        self._derived = lru_cache(maxsize=cache_size)(self._derive)
+        self.clear()
+        if ledger is not None:
+            self.update(ledger)
+
+    def clear(self) -> None:
+        self.rows = 0
+        self.generation = -1
+        self._digest = b""
+        self._days: dict[int, array] = {}
+        self._rates: dict[int, list[Fraction]] = {}
+        self._neighbours: dict[int, set[int]] = {}
+        self._openings: list[int] = []  # sorted first days of the pairs
+        # Chain per pair and bucket, and the day it was the shortest on.
+        self._paths: dict[tuple[int, int, int], tuple[tuple[int, ...], int]] = {}
+        self._derived.cache_clear()
+
+    def __len__(self) -> int:
+        """Number of (commodity, quote) pairs with prices."""
+        return len(self._days)
+
+    def __repr__(self) -> str:
+        return f"PriceIndex({self.rows} prices, {len(self)} pairs)"
+
+    def update(self, ledger: Ledger) -> None:
+        """Index the prices appended to *ledger* since the last update.
+
+        Prices may come in any date order; of several prices of a pair on
+        one day the last one counts.  The index is rebuilt if the ledger
+        has fewer prices than were indexed or the indexed ones changed.
+        """
+        prices = ledger.prices
+        if len(prices) < self.rows or (
+            self.rows and ledger.generation != self.generation and ledger.digest(self.rows, "prices") != self._digest
+        ):
+            self.clear()
+        self.generation = ledger.generation
+        if self.rows == len(prices):
+            return
+        columns = prices.columns
+        for row in range(self.rows, len(prices)):
+            commodity, quote = columns["commodity"][row], columns["quote"][row]
+            self.add(columns["date"][row], commodity, quote, Fraction(columns["price"][row], 10 ** columns["scale"][row]))
+        self.rows = len(prices)
+        self._digest = ledger.digest(self.rows, "prices")
+
+    def add(self, day: int, commodity: int, quote: int, rate: Fraction) -> None:
+        """Record that one unit of *commodity* costs *rate* units of *quote* on *day*."""
+        key = _key(commodity, quote)
+        days = self._days.get(key)
+        if days is None:
+            self._days[key] = array("i", (day,))
+            self._rates[key] = [rate]
+            self._neighbours.setdefault(commodity, set()).add(quote)
+            self._neighbours.setdefault(quote, set()).add(commodity)
+            insort(self._openings, day)
+            self._paths.clear()
+        elif day >= days[-1]:
+            days.append(day)
+            self._rates[key].append(rate)
+        else:
+            if day < days[0]:
+                self._openings.remove(days[0])
+                insort(self._openings, day)
+                self._paths.clear()
+            position = bisect_right(days, day)
+            days.insert(position, day)
+            self._rates[key].insert(position, rate)
+        self._derived.cache_clear()
+
+    def _direct(self, commodity: int, quote: int, day: int) -> tuple[int, Fraction] | None:
+        """The latest price of *commodity* in *quote* on or before *day*, with its date.
+
+        The opposite pair counts too, inverted; the more recent one wins.
+        A zero price, such as that of a delisted security, has no inverse.
+        """
+        found = None
+        for key, inverted in ((_key(commodity, quote), False), (_key(quote, commodity), True)):
+            days = self._days.get(key)
+            if days is None:
+                continue
+            position = bisect_right(days, day)
+            if position and (found is None or days[position - 1] > found[0]):
+                rate = self._rates[key][position - 1]
+                if inverted and not rate:
+                    continue
+                found = days[position - 1], (1 / rate if inverted else rate)
+        return found
+
+    def _search(self, commodity: int, quote: int, day: int) -> tuple[int, ...] | None:
+        """Shortest chain of commodities from *commodity* to *quote* priced by *day*."""
+        previous = {commodity: commodity}
+        frontier = [commodity]
+        while frontier and quote not in previous:
+            following = []
+            for node in frontier:
+                for neighbour in sorted(self._neighbours.get(node, ())):
+                    if neighbour not in previous and self._direct(node, neighbour, day) is not None:
+                        previous[neighbour] = node
+                        following.append(neighbour)
+            frontier = following
+        if quote not in previous:
+            return None
+        path = [quote]
+        while path[-1] != commodity:
+            path.append(previous[path[-1]])
+        return tuple(reversed(path))
+
+    def path(self, commodity: int, quote: int, day: Day) -> tuple[int, ...] | None:
+        """Commodities to convert through from *commodity* to *quote* on *day*.
+
+        A pair with a price of its own converts directly.  Other paths are
+        cached per date bucket.  A path that was the shortest on some day
+        stays the shortest on later days until another pair gets its first
+        price; on a day after that, or lacking one of the prices of the
+        cached path, the graph is searched again.
+        """
+        day = to_day(day)
+        if self._direct(commodity, quote, day) is not None:
+            return commodity, quote
+        key = (commodity, quote, day // self.bucket)
+        cached = self._paths.get(key)
+        if cached is not None:
+            path, found = cached
+            openings = self._openings
+            if (day <= found or bisect_right(openings, day) == bisect_right(openings, found)) and all(
+                self._direct(a, b, day) is not None for a, b in zip(path, path[1:])
+            ):
+                return path
+        path = self._search(commodity, quote, day)
+        if path is not None:
+            self._paths[key] = path, day
+        return path
+
+    def _derive(self, commodity: int, quote: int, day: int) -> tuple[int, Fraction] | None:
+        direct = self._direct(commodity, quote, day)
+        if direct is not None:
+            return direct
+        path = self.path(commodity, quote, day)
+        if path is None:
+            return None
+        dated, rate = day, Fraction(1)
+        for first, second in zip(path, path[1:]):
+            found = self._direct(first, second, day)
+            assert found is not None
+            dated, rate = min(dated, found[0]), rate * found[1]
+        return dated, rate
+
+    def price(self, commodity: int, quote: int, day: Day) -> Fraction | None:
+        """Units of *quote* one unit of *commodity* was worth on *day*, if known."""
+        if commodity == quote:
+            return Fraction(1)
+        found = self._derived(commodity, quote, to_day(day))
+        return None if found is None else found[1]
+
+    def price_date(self, commodity: int, quote: int, day: Day) -> int | None:
+        """Day of the (oldest) price the rate of :meth:`price` is based on."""
+        found = self._derived(commodity, quote, to_day(day))
+        return None if found is None else found[0]
+
+    def convert(self, value: int, scale: int, commodity: int, quote: int, day: Day, target: int) -> int | None:
+        """Convert a scaled amount of *commodity* to *quote* at the *target* scale.
+
+        Returns ``None`` if no rate is known on *day*.
+        """
+        rate = self.price(commodity, quote, day)
+        if rate is None:
+            return None
+        numerator = value * rate.numerator
+        denominator = rate.denominator
+        if target >= scale:
+            numerator *= 10 ** (target - scale)
+        else:
+            denominator *= 10 ** (scale - target)
+        return round_div(numerator, denominator)
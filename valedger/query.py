@@ -0,0 +1,495 @@
+"""Posting queries.
+
+A query is a list of terms, all of which must hold, in the spirit of
+hledger's query arguments::
+
+    expenses:food date:2024-01..2024-04 amt:>100 not tag:refund
+    (payee:amazon or payee:"bol com") cur:EUR
+
+========================  ==============================================
+``acct:NAME``, ``NAME``   account *NAME* and its subaccounts, or any
+                          account whose name matches the regular
+                          expression *NAME* (ignoring case)
+``date:PERIOD``           a year, month or day (``2024``, ``2024-03``,
+                          ``2024-03-05``) or a range ``START..END`` of
+                          them, END excluded; either side may be left out
+``amt:OPVALUE``           amount compared with ``<``, ``<=``, ``>``,
+                          ``>=`` or ``=`` (the default), sign included
+``cur:NAME``              commodity
+``payee:``, ``note:``     every word in the payee or note, the last one
+``text:``                 also as a prefix; ``text`` searches both
+``tag:NAME``              transaction tag
+========================  ==============================================
+
+Terms combine with ``or``, ``not`` (or a leading ``-``) and parentheses;
+``and`` binds tighter than ``or`` and may be left out.
+
+:func:`compile_query` turns a query into a :class:`Plan` over a ledger.
+Terms answered by an index select rows first: a date range is a binary
+search over the sorted date column and words and tags come from a
+:class:`~valedger.search.TextIndex`, smallest first.  Only the rows left
+are then tested by the remaining terms, which read one or two columns
+each.  :meth:`Plan.explain` shows the plan, with the number of rows every
+index step yields.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from datetime import date
+from fractions import Fraction
+from itertools import compress
+from math import ceil, floor
+from typing import NamedTuple
+
+from valedger.ledger import Ledger
+from valedger.money import parse_number
+from valedger.search import TextIndex, intersect, tokenize, union
+
+Selection = range | array
+
+_TOKEN = re.compile(r'\(|\)|[^\s()"]*"[^"]*"|[^\s()]+')
+_FIELDS = {
+    "acct": "account",
+    "account": "account",
+    "date": "date",
+    "amt": "amount",
+    "amount": "amount",
+    "cur": "commodity",
+    "commodity": "commodity",
+    "payee": "payee",
+    "note": "note",
+    "desc": "note",
+    "text": "text",
+    "tag": "tag",
+}
+_COMPARISON = re.compile(r"(<=|>=|<|>|=)?(.*)")
+
+
+class Term(NamedTuple):
+    field: str
+    value: str
+
+
+class And(NamedTuple):
+    items: tuple
+
+
+class Or(NamedTuple):
+    items: tuple
+
+
+class Not(NamedTuple):
+    item: object
+
+
+Node = Term | And | Or | Not
+
+
+def parse_query(text: str) -> Node:
+    """Parse a query into a tree of :class:`Term`, :class:`And`, :class:`Or` and :class:`Not`."""
+    tokens = _TOKEN.findall(text)
+    position = 0
+
+    def peek() -> str | None:
+        return tokens[position] if position < len(tokens) else None
+
+    def either() -> Node:
+        nonlocal position
+        items = [both()]
+        while peek() is not None and peek().casefold() == "or":  # type: ignore[union-attr]
+            position += 1
+            items.append(both())
+        return items[0] if len(items) == 1 else Or(tuple(items))
+
+    def both() -> Node:
+        nonlocal position
+        items = [unary()]
+        while peek() is not None and peek() != ")" and peek().casefold() != "or":  # type: ignore[union-attr]
+            if peek().casefold() == "and":  # type: ignore[union-attr]
+                position += 1
+            items.append(unary())
+        return items[0] if len(items) == 1 else And(tuple(items))
+
+    def unary() -> Node:
+        nonlocal position
+        token = peek()
+        if token is None or token == ")":
+            raise ValueError(f"invalid query {text!r}: expected a term")
+        position += 1
+        if token.casefold() == "not":
+            return Not(unary())
+        if token == "(":
+            node = either()
+            if peek() != ")":
+                raise ValueError(f"invalid query {text!r}: unbalanced parentheses")
+            position += 1
+            return node
+        if token.startswith("-") and len(token) > 1 and not token[1].isdigit():
+            return Not(_term(token[1:]))
+        return _term(token)
+
+    if not tokens:
+        return And(())
+    node = either()
+    if position != len(tokens):
+        raise ValueError(f"invalid query {text!r}: unexpected {tokens[position]!r}")
+    return node
+
+
+def _term(token: str) -> Term:
+    name, colon, value = token.partition(":")
+    field = _FIELDS.get(name.casefold()) if colon else None
+    if field is None:
+        return Term("account", token.replace('"', ""))
+    return Term(field, value.replace('"', ""))
+
+
+def _period(text: str) -> tuple[int, int]:
+    """Start and end day of a year, month or day written as ``YYYY[-MM[-DD]]``."""
+    try:
+        parts = [int(part) for part in text.replace("/", "-").split("-")]
+    except ValueError:
+        raise ValueError(f"invalid date {text!r}") from None
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"invalid date {text!r}")
+    if len(parts) == 1:
+        return date(parts[0], 1, 1).toordinal(), date(parts[0] + 1, 1, 1).toordinal()
+    if len(parts) == 2:
+        year, month = parts
+        following = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return date(year, month, 1).toordinal(), following.toordinal()
+    start = date(*parts).toordinal()
+    return start, start + 1
+
+
+def _restrict(rows: Selection, found: Selection) -> Selection:
+    """Intersection of two sorted selections."""
+    if isinstance(rows, range) and isinstance(found, range):
+        start = max(rows.start, found.start)
+        return range(start, max(start, min(rows.stop, found.stop)))
+    if isinstance(found, range):
+        rows, found = found, rows
+    if isinstance(rows, range):
+        return found[bisect_left(found, rows.start) : bisect_left(found, rows.stop)]
+    return intersect((rows, found))
+
+
+def _matching(rows: Selection, keep: Callable[..., object], *columns: array | memoryview) -> array:
+    """Rows of *rows* for which *keep* holds on the values of *columns*."""
+    if isinstance(rows, range):
+        return array("i", compress(rows, map(keep, *(column[rows.start : rows.stop] for column in columns))))
+    if len(columns) == 1:
+        values = columns[0]
+        return array("i", [row for row in rows if keep(values[row])])
+    return array("i", [row for row in rows if keep(*(column[row] for column in columns))])
+
+
+class Step:
+    """One operation of a plan."""
+
+    __slots__ = ()
+
+    indexed = False
+    cost = 1
+
+    def select(self, rows: Selection) -> Selection:
+        raise NotImplementedError
+
+    def explain(self, depth: int) -> Iterator[str]:
+        yield "  " * depth + str(self)
+
+
+class DateRange(Step):
+    __slots__ = ("start", "end", "rows")
+
+    indexed = True
+
+    def __init__(self, ledger: Ledger, start: int | None, end: int | None) -> None:
+        self.start, self.end = start, end
+        self.rows = range(*ledger.rows_between(start, end))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def select(self, rows: Selection) -> Selection:
+        return _restrict(rows, self.rows)
+
+    def __str__(self) -> str:
+        start = "" if self.start is None else date.fromordinal(self.start).isoformat()
+        end = "" if self.end is None else date.fromordinal(self.end).isoformat()
+        return f"index date {start}..{end}: rows {self.rows.start}..{self.rows.stop} ({len(self.rows)} rows)"
+
+
+class TextLookup(Step):
+    __slots__ = ("field", "text", "rows")
+
+    indexed = True
+
+    def __init__(self, index: TextIndex, field: str, text: str) -> None:
+        self.field, self.text = field, text
+        self.rows = index.match(field, text)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def select(self, rows: Selection) -> Selection:
+        return _restrict(rows, self.rows)
+
+    def __str__(self) -> str:
+        return f"index {self.field}:{self.text!r} ({len(self.rows)} rows)"
+
+
+class Filter(Step):
+    """Row-wise test of the values of some posting columns."""
+
+    __slots__ = ("description", "keep", "columns", "cost")
+
+    def __init__(
+        self, description: str, keep: Callable[..., object], *columns: array | memoryview, cost: int = 1
+    ) -> None:
+        self.description, self.keep, self.columns, self.cost = description, keep, columns, cost
+
+    def select(self, rows: Selection) -> Selection:
+        return _matching(rows, self.keep, *self.columns)
+
+    def __str__(self) -> str:
+        return f"filter {self.description}"
+
+
+class Intersection(Step):
+    """Index steps smallest first, then filters cheapest first."""
+
+    __slots__ = ("steps",)
+
+    def __init__(self, steps: list[Step]) -> None:
+        indexed = sorted((step for step in steps if step.indexed), key=len)  # type: ignore[arg-type]
+        others = sorted((step for step in steps if not step.indexed), key=lambda step: step.cost)
+        self.steps = indexed + others
+
+    def select(self, rows: Selection) -> Selection:
+        for step in self.steps:
+            if not rows:
+                break
+            rows = step.select(rows)
+        return rows
+
+    def explain(self, depth: int) -> Iterator[str]:
+        yield "  " * depth + "all of"
+        for step in self.steps:
+            yield from step.explain(depth + 1)
+
+
+class Union(Step):
+    __slots__ = ("steps",)
+
+    def __init__(self, steps: list[Step]) -> None:
+        self.steps = steps
+
+    @property
+    def indexed(self) -> bool:  # type: ignore[override]
+        return all(step.indexed for step in self.steps)
+
+    @property
+    def cost(self) -> int:  # type: ignore[override]
+        return sum(step.cost for step in self.steps) + 1
+
+    def __len__(self) -> int:
+        return sum(len(step) for step in self.steps)  # type: ignore[arg-type]
+
+    def select(self, rows: Selection) -> Selection:
+        return union(step.select(rows) for step in self.steps)
+
+    def explain(self, depth: int) -> Iterator[str]:
+        yield "  " * depth + "any of"
+        for step in self.steps:
+            yield from step.explain(depth + 1)
+
+
+class Complement(Step):
+    __slots__ = ("step",)
+
+    def __init__(self, step: Step) -> None:
+        self.step = step
+
+    @property
+    def cost(self) -> int:  # type: ignore[override]
+        return self.step.cost + 1
+
+    def select(self, rows: Selection) -> Selection:
+        excluded = self.step.select(rows)
+        if not excluded:
+            return rows
+        skip = set(excluded)
+        return array("i", [row for row in rows if row not in skip])
+
+    def explain(self, depth: int) -> Iterator[str]:
+        yield "  " * depth + "none of"
+        yield from self.step.explain(depth + 1)
+
+
+class Plan:
+    """A compiled query over one ledger."""
+
+    __slots__ = ("ledger", "query", "root")
+
+    def __init__(self, ledger: Ledger, query: str, root: Step) -> None:
+        self.ledger, self.query, self.root = ledger, query, root
+
+    def rows(self) -> array:
+        """Sorted rows of the matching postings."""
+        selected = self.root.select(range(len(self.ledger)))
+        return selected if type(selected) is array else array("i", selected)
+
+    def explain(self) -> str:
+        """Describe the steps of the plan, indented by nesting."""
+        return "\n".join([f"query {self.query!r} over {len(self.ledger)} postings", *self.root.explain(1)])
+
+    def __repr__(self) -> str:
+        return f"Plan({self.query!r})"
+
+
+class _Compiler:
+    def __init__(self, ledger: Ledger, index: TextIndex | None) -> None:
+        self.ledger = ledger
+        self.index = index
+        self.columns = ledger.postings.columns
+
+    def compile(self, node: Node) -> Step:
+        if isinstance(node, Term):
+            return getattr(self, f"_{node.field}")(node.value)
+        if isinstance(node, Not):
+            return Complement(self.compile(node.item))  # type: ignore[arg-type]
+        steps = [self.compile(item) for item in node.items]
+        if isinstance(node, Or):
+            return Union(steps)
+        if len(steps) == 1:
+            return steps[0]
+        return Intersection(steps)
+
+    def _account(self, pattern: str) -> Step:
+        ledger = self.ledger
+        span = ledger.account_range(pattern) if pattern in ledger.accounts else None
+        if span is not None:
+            start, stop = span.start, span.stop
+            return Filter(
+                f"account ids {start}..{stop} ({pattern} subtree)",
+                lambda account: start <= account < stop,
+                self.columns["account"],
+            )
+        try:
+            expression = re.compile(pattern, re.IGNORECASE)
+        except re.error as error:
+            raise ValueError(f"invalid account pattern {pattern!r}: {error}") from None
+        mask = bytearray(len(ledger.accounts))
+        for account, name in enumerate(ledger.accounts.names()):
+            if expression.search(name):
+                mask[account] = 1
+        return Filter(f"account ~ {pattern!r} ({sum(mask)} accounts)", mask.__getitem__, self.columns["account"])
+
+    def _date(self, value: str) -> Step:
+        first, dots, last = value.partition("..")
+        start = _period(first)[0] if first else None
+        end = (_period(last)[0] if dots else _period(first)[1]) if last or not dots else None
+        return DateRange(self.ledger, start, end)
+
+    def _amount(self, value: str) -> Step:
+        match = _COMPARISON.fullmatch(value.strip())
+        operator = (match and match[1]) or "="
+        try:
+            number, scale = parse_number(match[2] if match else value)
+        except ValueError:
+            raise ValueError(f"invalid amount {value!r}") from None
+        threshold = Fraction(number, 10**scale)
+        # Compare the scaled integers directly: per commodity, the bound is
+        # the threshold at that commodity's precision, rounded so that the
+        # integer comparison agrees with the exact one.
+        bounds = []
+        for precision in self.ledger.scales:
+            scaled = threshold * 10**precision
+            if operator in (">", "<="):
+                bounds.append(floor(scaled))
+            elif operator in ("<", ">="):
+                bounds.append(ceil(scaled))
+            else:
+                bounds.append(int(scaled) if scaled.denominator == 1 else None)
+        tests: dict[str, Callable[[int, int], object]] = {
+            ">": lambda amount, commodity: amount > bounds[commodity],
+            ">=": lambda amount, commodity: amount >= bounds[commodity],
+            "<": lambda amount, commodity: amount < bounds[commodity],
+            "<=": lambda amount, commodity: amount <= bounds[commodity],
+            "=": lambda amount, commodity: amount == bounds[commodity],
+        }
+        return Filter(
+            f"amount {operator} {match[2] if match else value}",
+            tests[operator],
+            self.columns["amount"],
+            self.columns["commodity"],
+            cost=2,
+        )
+
+    def _commodity(self, name: str) -> Step:
+        commodity = self.ledger.commodities.get(name)
+        return Filter(f"commodity = {name}", lambda value: value == commodity, self.columns["commodity"])
+
+    def _words(self, field: str, text: str) -> Step:
+        if self.index is not None:
+            return TextLookup(self.index, field, text)
+        # Without an index, match the interned names once and test the
+        # transaction of every row.
+        words = tokenize(text)
+        fields = ("payee", "note") if field == "text" else (field,)
+        transactions = self.ledger.transactions.columns
+        tests = []
+        for name in fields:
+            interner = self.ledger.payees if name == "payee" else self.ledger.notes
+            matched = set()
+            for ident, value in enumerate(interner.names()):
+                found = tokenize(value)
+                if words and all(word in found for word in words[:-1]):
+                    if any(token.startswith(words[-1]) for token in found):
+                        matched.add(ident)
+            tests.append((transactions[name], matched))
+
+        def keep(txn: int) -> bool:
+            return any(column[txn] in matched for column, matched in tests)
+
+        return Filter(f"{field} words {text!r} (scan)", keep, self.columns["txn"], cost=3)
+
+    def _payee(self, text: str) -> Step:
+        return self._words("payee", text)
+
+    def _note(self, text: str) -> Step:
+        return self._words("note", text)
+
+    def _text(self, text: str) -> Step:
+        return self._words("text", text)
+
+    def _tag(self, name: str) -> Step:
+        if self.index is not None:
+            return TextLookup(self.index, "tag", name)
+        tag_rows = self.ledger.tag_rows.columns
+        wanted = {ident for ident, value in enumerate(self.ledger.tags.names()) if value.casefold() == name.casefold()}
+        tagged = {txn for txn, tag in zip(tag_rows["txn"], tag_rows["tag"]) if tag in wanted}
+        return Filter(
+            f"tag {name!r} (scan, {len(tagged)} transactions)", tagged.__contains__, self.columns["txn"], cost=2
+        )
+
+
+def compile_query(ledger: Ledger, query: str, index: TextIndex | None = None) -> Plan:
+    """Compile *query* into a plan over the date-sorted *ledger*.
+
+    With a text *index* (kept up to date with the ledger), payee, note
+    and tag terms are index lookups; without one they scan the interned
+    names.
+    """
+    if not ledger.is_sorted:
+        raise ValueError("ledger is not in date order; call sort() first")
+    ledger.order_accounts()
+    return Plan(ledger, query, _Compiler(ledger, index).compile(parse_query(query)))
+
+
+def select(ledger: Ledger, query: str, index: TextIndex | None = None) -> array:
+    """Rows of the postings of *ledger* matching *query*."""
+    return compile_query(ledger, query, index).rows()
@@ -0,0 +1,203 @@
+"""Account registers, evaluated one page at a time.
+
+A :class:`Register` lists the postings of an account and its subaccounts
+with the running balance after each, like a bank statement.  Showing rows
+*N* to *N + 200* of a long statement does not add up the thousands of
+postings before them: the balance at the end of the previous day comes
+from a :class:`~valedger.balances.BalanceIndex` (or the nearest
+:class:`~valedger.checkpoints.Checkpoints`), and only the register's
+postings of that same day are added to it before the page itself is
+walked.
+
+The rows of the register come from the posting rows a balance index keeps
+for every (account, commodity) pair: the pairs of the register's accounts
+are a few sorted arrays, and the posting at position *N* is found by a
+binary search over ledger rows that counts the postings before a row in
+each array.  A page then merges its own stretch of those arrays, so
+neither a page nor :meth:`Register.seek` touches the postings outside of
+it.  :class:`~valedger.checkpoints.Checkpoints` keep no rows; with them,
+the account column of the window is scanned once, with
+:func:`itertools.compress`, and the rows kept.
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+from itertools import compress, islice
+from typing import NamedTuple
+
+from valedger.balances import BalanceIndex
+from valedger.checkpoints import Checkpoints
+from valedger.ledger import Day, Ledger, to_day
+
+
+class Line(NamedTuple):
+    """A posting of a register and the balance right after it.
+
+    *balance* is the balance of the register's accounts in the posting's
+    commodity, scaled like *amount*.
+    """
+
+    row: int
+    day: int
+    txn: int
+    account: int
+    commodity: int
+    amount: int
+    balance: int
+
+
+class Register:
+    """Postings of *accounts* dated in ``[start, end)`` with running balances.
+
+    *accounts* is an account name, an account id or a range of ids; a name
+    or id stands for the account and its subaccounts.  *index* must be up
+    to date with the date-sorted *ledger*; a :class:`BalanceIndex` is
+    built if none is given.
+    """
+
+    __slots__ = ("ledger", "accounts", "start", "end", "_index", "_series")
+
+    def __init__(
+        self,
+        ledger: Ledger,
+        accounts: str | int | range,
+        start: Day | None = None,
+        end: Day | None = None,
+        index: BalanceIndex | Checkpoints | None = None,
+    ) -> None:
+        if not ledger.is_sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        if isinstance(accounts, str):
+            accounts = ledger.account_range(accounts)
+        elif isinstance(accounts, int):
+            ledger.order_accounts()
+            accounts = ledger.accounts.subtree(accounts)
+        self.ledger = ledger
+        self.accounts = accounts
+        self.start = None if start is None else to_day(start)
+        self.end = None if end is None else to_day(end)
+        self._index = BalanceIndex(ledger) if index is None else index
+        # Sorted posting rows per pair, with the bounds of the window in each.
+        self._series: list[tuple[array, int, int]] | None = None
+
+    def __repr__(self) -> str:
+        return f"Register({len(self)} postings)"
+
+    def _postings(self) -> list[tuple[array, int, int]]:
+        if self._series is None:
+            lo, hi = self.ledger.rows_between(self.start, self.end)
+            if isinstance(self._index, BalanceIndex):
+                found = self._index.postings(self.accounts)
+            else:
+                accounts = self.ledger.postings.columns["account"][lo:hi]
+                found = [array("i", compress(range(lo, hi), map(self.accounts.__contains__, accounts)))]
+            self._series = []
+            for rows in found:
+                first = bisect_left(rows, lo)
+                last = bisect_left(rows, hi, first)
+                if first < last:
+                    self._series.append((rows, first, last))
+        return self._series
+
+    def _between(self, lo: int, hi: int, limit: int | None = None) -> Iterator[int]:
+        """Rows of the register in ``[lo, hi)``, in order; at most *limit* of them."""
+        stretches = []
+        for rows, first, last in self._postings():
+            first = bisect_left(rows, lo, first, last)
+            last = bisect_left(rows, hi, first, last)
+            if limit is not None:
+                last = min(last, first + limit)
+            if first < last:
+                stretches.append(rows[first:last])
+        rows = stretches[0] if len(stretches) == 1 else heapq.merge(*stretches)
+        return iter(rows) if limit is None else islice(rows, limit)
+
+    def _count(self, row: int) -> int:
+        """Number of postings of the register before ledger row *row*."""
+        return sum(bisect_left(rows, row, first, last) - first for rows, first, last in self._postings())
+
+    def _row(self, position: int) -> int:
+        """Ledger row of the posting at *position*, which must be in range."""
+        series = self._postings()
+        lo = min(rows[first] for rows, first, _ in series)
+        hi = max(rows[last - 1] for rows, _, last in series)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self._count(middle + 1) > position:
+                hi = middle
+            else:
+                lo = middle + 1
+        return lo
+
+    @property
+    def rows(self) -> array:
+        """Posting rows of the register, in date order."""
+        return array("i", self._between(0, len(self.ledger)))
+
+    def __len__(self) -> int:
+        return sum(last - first for _, first, last in self._postings())
+
+    def seek(self, day: Day) -> int:
+        """Position of the first posting of the register dated *day* or later."""
+        return self._count(self.ledger.rows_between(None, day)[1])
+
+    def balances(self, position: int) -> dict[int, int]:
+        """Balances by commodity before the posting at *position*.
+
+        At ``len(self)`` these are the balances at the end of the register.
+        """
+        if position < len(self):
+            row = self._row(position)
+        else:
+            row = self.ledger.rows_between(None, self.end)[1]
+        if isinstance(self._index, Checkpoints):
+            return self._index.before(self.ledger, self.accounts, row)
+        columns = self.ledger.postings.columns
+        dates = columns["date"]
+        if not row:
+            return {}
+        day = dates[row] if row < len(dates) else dates[-1] + 1
+        result = self._index.balances(self.accounts, day - 1)
+        # Postings of the same day before *position* are in the register too.
+        for earlier in self._between(self.ledger.rows_between(day)[0], row):
+            commodity = columns["commodity"][earlier]
+            result[commodity] = result.get(commodity, 0) + columns["amount"][earlier]
+        return result
+
+    def lines(self, start: int = 0, stop: int | None = None) -> Iterator[Line]:
+        """The postings at positions ``[start, stop)`` and their running balances."""
+        length = len(self)
+        stop = length if stop is None else min(stop, length)
+        if start >= stop:
+            return
+        running = self.balances(start)
+        columns = self.ledger.postings.columns
+        dates, txns, accounts = columns["date"], columns["txn"], columns["account"]
+        commodities, amounts = columns["commodity"], columns["amount"]
+        for row in self._between(self._row(start), len(self.ledger), stop - start):
+            commodity, amount = commodities[row], amounts[row]
+            balance = running[commodity] = running.get(commodity, 0) + amount
+            yield Line(row, dates[row], txns[row], accounts[row], commodity, amount, balance)
+
+    def page(self, number: int, size: int = 200) -> list[Line]:
+        """Lines of page *number*, counting from zero, of *size* postings each."""
+        return list(self.lines(number * size, (number + 1) * size))
+
+    def __getitem__(self, position: int | slice) -> Line | list[Line]:
+        if isinstance(position, slice):
+            positions = range(len(self))[position]
+            if not positions:
+                return []
+            lo = min(positions)
+            lines = list(self.lines(lo, max(positions) + 1))
+            return [lines[index - lo] for index in positions]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("register position out of range")
+        return next(self.lines(position, position + 1))
+
+    def __iter__(self) -> Iterator[Line]:
+        return self.lines()
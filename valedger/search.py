@@ -0,0 +1,306 @@
+"""Full-text index over payees, notes and tags.
+
+A :class:`TextIndex` maps every word of a transaction's payee and note,
+and every tag, to the sorted posting rows of the transactions that have
+it.  Finding where a payee was paid is then a dictionary lookup and
+combining conditions an intersection of sorted row lists, instead of a
+scan over every transaction.  Words are tokenized once per distinct payee
+and note, which are interned, not once per transaction.
+
+The index is saved next to the journal cache (see
+:meth:`~valedger.cache.Cache.index_path`) as a JSON vocabulary followed by
+one ``array('i')`` of all row lists end to end, which is mapped back with
+:mod:`mmap`.  Rows of postings appended to the ledger later are held in
+memory until :meth:`TextIndex.save`.  The saved index keeps a digest of
+the rows it was built from, so an index saved for other or since changed
+postings is built again rather than used.
+"""
+
+import json
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from os import PathLike
+from pathlib import Path
+
+from valedger.ledger import Ledger
+
+MAGIC = b"VLTXT\0"
+FORMAT = 2
+FIELDS = ("payee", "note", "tag")
+
+_WORD = re.compile(r"\w+")
+
+Rows = array | memoryview
+
+
+def tokenize(text: str) -> list[str]:
+    """Case-folded words of *text*."""
+    return _WORD.findall(text.casefold())
+
+
+def _key(field: str, token: str) -> str:
+    return f"{field}:{token}"
+
+
+def _digest(ledger: Ledger, rows: int, tags: int) -> bytes:
+    transactions = ledger.postings.columns["txn"][rows - 1] + 1 if rows else 0
+    return ledger.digest(rows) + ledger.digest(transactions, "transactions") + ledger.digest(tags, "tags")
+
+
+def intersect(lists: Iterable[Sequence[int]]) -> array:
+    """Rows present in every one of the sorted row lists."""
+    ordered = sorted(lists, key=len)
+    if not ordered:
+        return array("i")
+    result = array("i", ordered[0])
+    for rows in ordered[1:]:
+        if not result:
+            break
+        # Binary search from the last position: the lists are sorted, so
+        # each step only looks at the part of *rows* not passed yet.
+        kept = array("i")
+        position = 0
+        size = len(rows)
+        for row in result:
+            position = bisect_left(rows, row, position)
+            if position == size:
+                break
+            if rows[position] == row:
+                kept.append(row)
+        result = kept
+    return result
+
+
+def union(lists: Iterable[Sequence[int]]) -> array:
+    """Rows present in any of the row lists, sorted."""
+    found: set[int] = set()
+    for rows in lists:
+        found.update(rows)
+    return array("i", sorted(found))
+
+
+class TextIndex:
+    """Posting rows by payee word, note word and tag."""
+
+    __slots__ = (
+        "rows",
+        "last_day",
+        "generation",
+        "_digest",
+        "_tags",
+        "_keys",
+        "_offsets",
+        "_data",
+        "_new",
+        "_vocabulary",
+    )
+
+    def __init__(self, ledger: Ledger | None = None) -> None:
+        self.clear()
+        if ledger is not None:
+            self.update(ledger)
+
+    def clear(self) -> None:
+        self.rows = 0
+        self.last_day: int | None = None
+        self.generation = -1
+        self._digest = b""
+        self._tags = 0
+        self._keys: dict[str, int] = {}  # saved key -> position in _offsets
+        self._offsets: Rows = array("q", (0,))
+        self._data: Rows = array("i")
+        self._new: dict[str, array] = {}
+        self._vocabulary: list[str] | None = None
+
+    def __len__(self) -> int:
+        """Number of distinct keys (words and tags per field)."""
+        return len(self._keys.keys() | self._new.keys())
+
+    def __repr__(self) -> str:
+        return f"TextIndex({self.rows} postings, {len(self)} keys)"
+
+    def update(self, ledger: Ledger) -> None:
+        """Index the postings appended to *ledger* since the last update.
+
+        Everything is indexed again if the ledger has fewer postings than
+        were indexed, the new ones are dated before the last indexed day,
+        or the indexed ones changed, for example a back-dated transaction
+        was sorted in among them (a digest of their rows tells, once the
+        ledger's :attr:`~valedger.ledger.Ledger.generation` moved).
+        """
+        if not ledger.is_sorted:
+            raise ValueError("ledger is not in date order; call sort() first")
+        postings = ledger.postings
+        stale = len(postings) < self.rows or len(ledger.tag_rows) < self._tags
+        if not stale and self.last_day is not None and self.rows < len(postings):
+            stale = postings.columns["date"][self.rows] < self.last_day
+        if not stale and self.rows and ledger.generation != self.generation:
+            stale = _digest(ledger, self.rows, self._tags) != self._digest
+        if stale:
+            self.clear()
+        self.generation = ledger.generation
+        if self.rows == len(postings):
+            return
+        transactions = ledger.transactions.columns
+        first_txn = postings.columns["txn"][self.rows]
+        tags: dict[int, list[int]] = {}
+        tag_txns = ledger.tag_rows.columns["txn"]
+        tag_ids = ledger.tag_rows.columns["tag"]
+        # The tags of new transactions come after the ones indexed (the
+        # table is not in transaction order once sorted); only a transaction
+        # indexed in part before can have its tags among those.
+        begin = self._tags if ledger.transaction_rows(first_txn).start >= self.rows else 0
+        for index in range(begin, len(ledger.tag_rows)):
+            if tag_txns[index] >= first_txn:
+                tags.setdefault(tag_txns[index], []).append(tag_ids[index])
+        payee_keys: dict[int, list[str]] = {}
+        note_keys: dict[int, list[str]] = {}
+        tag_keys: dict[int, str] = {}
+        new = self._new
+        for txn in range(first_txn, len(ledger.transactions)):
+            rows = ledger.transaction_rows(txn)
+            payee, note = transactions["payee"][txn], transactions["note"][txn]
+            keys = payee_keys.get(payee)
+            if keys is None:
+                keys = payee_keys[payee] = [_key("payee", word) for word in tokenize(ledger.payees.name(payee))]
+            found = list(keys)
+            keys = note_keys.get(note)
+            if keys is None:
+                keys = note_keys[note] = [_key("note", word) for word in tokenize(ledger.notes.name(note))]
+            found.extend(keys)
+            for tag in tags.get(txn, ()):
+                key = tag_keys.get(tag)
+                if key is None:
+                    key = tag_keys[tag] = _key("tag", ledger.tags.name(tag).casefold())
+                found.append(key)
+            start = max(rows.start, self.rows)
+            for key in dict.fromkeys(found):
+                listed = new.get(key)
+                if listed is None:
+                    listed = new[key] = array("i")
+                    self._vocabulary = None
+                listed.extend(range(start, rows.stop))
+        self.last_day = postings.columns["date"][len(postings) - 1]
+        self.rows = len(postings)
+        self._tags = len(ledger.tag_rows)
+        self._digest = _digest(ledger, self.rows, self._tags)
+
+    def lookup(self, field: str, token: str) -> array | memoryview:
+        """Sorted rows of the postings whose *field* has the word (or tag) *token*."""
+        key = _key(field, token.casefold())
+        position = self._keys.get(key)
+        saved = self._data[self._offsets[position] : self._offsets[position + 1]] if position is not None else None
+        added = self._new.get(key)
+        if saved is None:
+            return added if added is not None else array("i")
+        if added is None:
+            return saved
+        return array("i", saved) + added
+
+    def prefix(self, field: str, stem: str) -> array:
+        """Rows of the postings with a word in *field* starting with *stem*."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._keys.keys() | self._new.keys())
+        vocabulary = self._vocabulary
+        start = _key(field, stem.casefold())
+        lists = []
+        for position in range(bisect_left(vocabulary, start), len(vocabulary)):
+            if not vocabulary[position].startswith(start):
+                break
+            lists.append(self.lookup(*vocabulary[position].split(":", 1)))
+        return union(lists)
+
+    def match(self, field: str, text: str) -> array:
+        """Rows of the postings whose *field* has every word of *text*.
+
+        The last word also matches as a prefix, so ``amaz`` finds Amazon.
+        *field* may also be ``text`` for payee and note together.
+        """
+        fields = ("payee", "note") if field == "text" else (field,)
+        if field == "tag":
+            return array("i", self.lookup("tag", text))
+        words = tokenize(text)
+        if not words:
+            return array("i")
+        lists = []
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            lists.append(union(self.prefix(name, word) if last else self.lookup(name, word) for name in fields))
+        return intersect(lists)
+
+    def save(self, path: str | PathLike[str]) -> None:
+        """Write the index to *path* atomically, merging in-memory additions."""
+        keys = sorted(self._keys.keys() | self._new.keys())
+        offsets = array("q", (0,))
+        data = array("i")
+        for key in keys:
+            data.extend(self.lookup(*key.split(":", 1)))
+            offsets.append(len(data))
+        header = {
+            "format": FORMAT,
+            "rows": self.rows,
+            "last_day": self.last_day,
+            "tags": self._tags,
+            "digest": self._digest.hex(),
+            "keys": keys,
+        }
+        encoded = json.dumps(header, ensure_ascii=False).encode()
+        start = len(MAGIC) + 4 + len(encoded)
+        padding = -start % 8
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "wb") as handle:
+            handle.write(MAGIC)
+            handle.write(len(encoded).to_bytes(4, "little"))
+            handle.write(encoded)
+            handle.write(b"\0" * padding)
+            offsets.tofile(handle)
+            data.tofile(handle)
+        os.replace(temporary, path)
+        self._keys = {key: position for position, key in enumerate(keys)}
+        self._offsets, self._data, self._new = offsets, data, {}
+        self._vocabulary = keys
+
+    @classmethod
+    def load(cls, path: str | PathLike[str], ledger: Ledger | None = None) -> "TextIndex":
+        """Map the index saved at *path*; an empty index if there is none.
+
+        With *ledger*, the index is brought up to date with it, and built
+        again if the postings it was saved from are not the ledger's.
+        """
+        index = cls._load(path)
+        if ledger is not None:
+            index.update(ledger)
+        return index
+
+    @classmethod
+    def _load(cls, path: str | PathLike[str]) -> "TextIndex":
+        index = cls()
+        try:
+            with open(path, "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return index
+        if mapped[: len(MAGIC)] != MAGIC:
+            return index
+        length = int.from_bytes(mapped[len(MAGIC) : len(MAGIC) + 4], "little")
+        header = json.loads(mapped[len(MAGIC) + 4 : len(MAGIC) + 4 + length])
+        if header.get("format") != FORMAT:
+            return index
+        start = len(MAGIC) + 4 + length
+        start += -start % 8
+        keys = header["keys"]
+        end = start + 8 * (len(keys) + 1)
+        index.rows = header["rows"]
+        index.last_day = header["last_day"]
+        index._tags = header["tags"]
+        index._digest = bytes.fromhex(header["digest"])
+        index._keys = {key: position for position, key in enumerate(keys)}
+        index._offsets = memoryview(mapped)[start:end].cast("q")
+        index._data = memoryview(mapped)[end:].cast("i")
+        return index
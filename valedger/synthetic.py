@@ -0,0 +1,172 @@
+"""Deterministic synthetic journals.
+
+:func:`generate` produces a realistic-looking journal from a
+:class:`Profile`: a hierarchy of accounts, salaries and expenses in a
+home currency, foreign currency transfers and share purchases at a price,
+split transactions, elided amounts, monthly market prices and balance
+assertions that hold.  The same profile always yields the same text, so
+benchmark results of different versions are comparable.
+"""
+
+import random
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import date
+from os import PathLike
+from pathlib import Path
+
+from valedger.money import format_number
+
+_CATEGORIES = (
+    "Food",
+    "Housing",
+    "Transport",
+    "Health",
+    "Leisure",
+    "Clothing",
+    "Travel",
+    "Utilities",
+    "Insurance",
+    "Education",
+    "Gifts",
+    "Fees",
+)
+_PAYEES = (
+    "Grocer",
+    "Bakery",
+    "Landlord",
+    "Railways",
+    "Pharmacy",
+    "Cinema",
+    "Outfitters",
+    "Airline",
+    "Power Company",
+    "Insurer",
+    "Bookshop",
+    "Bank",
+)
+_CURRENCIES = (("USD", 92), ("GBP", 116), ("CHF", 104))  # home cents per unit
+_STOCKS = ("ACME", "GLOBEX", "INITECH", "UMBRELLA", "HOOLI")
+
+
+@dataclass(slots=True)
+class Profile:
+    """Shape of a synthetic journal; *postings* is approximate."""
+
+    postings: int = 10_000
+    accounts: int = 200
+    years: int = 10
+    start_year: int = 2015
+    currency: str = "EUR"
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"synthetic-{self.postings}p-{self.accounts}a-{self.years}y-{self.seed}"
+
+
+def _accounts(profile: Profile) -> tuple[list[str], list[str]]:
+    """Return the expense accounts and the funding accounts of *profile*."""
+    funding = ["Assets:Bank:Checking", "Assets:Bank:Savings", "Liabilities:CreditCard"]
+    fixed = len(funding) + len(_CURRENCIES) + len(_STOCKS) + 4
+    count = max(profile.accounts - fixed, len(_CATEGORIES))
+    expenses = []
+    for index in range(count):
+        category = _CATEGORIES[index % len(_CATEGORIES)]
+        number = index // len(_CATEGORIES)
+        expenses.append(f"Expenses:{category}" if number == 0 else f"Expenses:{category}:Sub{number:03d}")
+    return expenses, funding
+
+
+def generate(profile: Profile) -> Iterator[str]:
+    """Yield the journal of *profile* as text blocks, in date order."""
+    rng = random.Random(profile.seed)
+    home = profile.currency
+    expenses, funding = _accounts(profile)
+    first = date(profile.start_year, 1, 1).toordinal()
+    last = date(profile.start_year + profile.years, 1, 1).toordinal() - 1
+    balances: dict[str, int] = {}
+    rates = dict(_CURRENCIES)
+    quotes = {stock: rng.randrange(2_000, 30_000) for stock in _STOCKS}  # home cents per share
+
+    yield f"; {profile.name}\ncommodity 1,000.00 {home}\n"
+    for code, _ in _CURRENCIES:
+        yield f"commodity 1,000.00 {code}\n"
+    yield "\n"
+
+    def post(account: str, value: int, commodity: str = home, assert_balance: bool = False) -> str:
+        balances[account] = balances.get(account, 0) + value
+        line = f"    {account}  {format_number(value, 2)} {commodity}"
+        if assert_balance:
+            line += f" = {format_number(balances[account], 2)} {commodity}"
+        return line
+
+    # Spread transactions evenly; most have two postings, some are split.
+    count = max(profile.postings * 100 // 216, 1)
+    written = 0
+    month = None
+    for number in range(count):
+        if written >= profile.postings:
+            break
+        day = first + (last - first) * number // count
+        when = date.fromordinal(day)
+        if (when.year, when.month) != month:
+            month = (when.year, when.month)
+            lines = []
+            for code in rates:
+                rates[code] = max(rates[code] + rng.randrange(-2, 3), 10)
+                lines.append(f"P {when} {code} {format_number(rates[code], 2)} {home}")
+            for stock in quotes:
+                quotes[stock] = max(quotes[stock] + rng.randrange(-500, 520), 100)
+                lines.append(f"P {when} {stock} {format_number(quotes[stock], 2)} {home}")
+            salary = [post("Assets:Bank:Checking", 350_000), post("Income:Salary", -350_000)]
+            yield "\n".join(lines) + f"\n\n{when} * Employer | salary\n" + "\n".join(salary) + "\n\n"
+            written += 2
+        kind = rng.random()
+        checked = number % 50 == 0
+        if kind < 0.80:
+            source = funding[rng.randrange(len(funding))]
+            split = rng.randrange(1, 4) if rng.random() < 0.2 else 1
+            payee = _PAYEES[rng.randrange(len(_PAYEES))]
+            lines = [f"{when} * {payee} | purchase {number}  ; batch:{number % 7}"]
+            total = 0
+            for _ in range(split):
+                value = rng.randrange(100, 30_000)
+                total += value
+                lines.append(post(expenses[int(rng.paretovariate(1.2)) % len(expenses)], value))
+            if rng.random() < 0.1 and not checked:
+                balances[source] = balances.get(source, 0) - total
+                lines.append(f"    {source}")
+            else:
+                lines.append(post(source, -total, assert_balance=checked))
+            written += split + 1
+        elif kind < 0.93:
+            code = list(rates)[rng.randrange(len(rates))]
+            quantity = rng.randrange(1, 500)
+            rate = rates[code]
+            balances[f"Assets:Bank:{code}"] = balances.get(f"Assets:Bank:{code}", 0) + quantity * 100
+            lines = [
+                f"{when} * Bank | exchange {code}",
+                f"    Assets:Bank:{code}  {quantity}.00 {code} @ {format_number(rate, 2)} {home}",
+                post("Assets:Bank:Checking", -quantity * rate, assert_balance=checked),
+            ]
+            written += 2
+        else:
+            stock = _STOCKS[rng.randrange(len(_STOCKS))]
+            shares = rng.randrange(1, 20)
+            lines = [
+                f"{when} * Broker | buy {stock}  #invest",
+                f"    Assets:Broker:{stock}  {shares} {stock} @ {format_number(quotes[stock], 2)} {home}",
+                post("Assets:Bank:Checking", -shares * quotes[stock]),
+            ]
+            written += 2
+        yield "\n".join(lines) + "\n\n"
+
+
+def write_journal(path: str | PathLike[str], profile: Profile) -> Path:
+    """Write the journal of *profile* to *path* and return the path."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.writelines(generate(profile))
+    return path
@@ -0,0 +1,173 @@
+"""Journal validation: balanced transactions and balance assertions.
+
+:func:`validate` checks a whole ledger at once and returns every problem
+it finds, rather than stopping at the first one.
+
+Transactions are checked in one pass over the posting columns, summing
+the weights of each transaction's postings per commodity: the amount
+itself, or the cost or price of an annotated posting.  Sums involving
+annotations may be off by less than half the last displayed digit, as
+unit costs rarely divide totals exactly.
+
+Assertions are checked against a :class:`~valedger.balances.BalanceIndex`
+instead of by adding up postings for each one:
+
+* a ``balance`` directive compares with the balance of the account and
+  its subaccounts at the end of the previous day, a few binary searches;
+* an assertion on a posting (``= 100 EUR``) holds right after that
+  posting, so the balance at the end of the previous day is taken from
+  the index and only the postings of the posting's own day are added,
+  each day with assertions being scanned once for all of them.
+"""
+
+from collections.abc import Iterator
+from fractions import Fraction
+from itertools import chain
+from typing import NamedTuple
+
+from valedger.balances import BalanceIndex
+from valedger.ledger import Ledger, from_day
+from valedger.money import Money
+
+
+class Problem(NamedTuple):
+    """A transaction that does not balance or an assertion that fails.
+
+    *kind* is ``unbalanced``, ``assertion`` (on a posting) or ``balance``
+    (a balance directive).  *expected* and *actual* are the asserted and
+    actual balance, or zero and the residual of an unbalanced transaction.
+    *path* and *line* locate the transaction or directive, when known.
+    """
+
+    kind: str
+    day: int
+    account: str
+    expected: Money
+    actual: Money
+    path: str | None = None
+    line: int | None = None
+
+    @property
+    def message(self) -> str:
+        if self.kind == "unbalanced":
+            return f"transaction on {from_day(self.day)} does not balance: off by {self.actual}"
+        where = f"{self.account} on {from_day(self.day)}"
+        return f"balance assertion failed for {where}: expected {self.expected}, found {self.actual}"
+
+    def __str__(self) -> str:
+        location = ":".join(str(part) for part in (self.path, self.line) if part is not None)
+        return f"{location}: {self.message}" if location else self.message
+
+
+def validate(ledger: Ledger, index: BalanceIndex | None = None) -> list[Problem]:
+    """Check that every transaction balances and every assertion holds.
+
+    *index* is brought up to date with the date-sorted *ledger* and used
+    for the assertions; a new one is built if none is given.
+    """
+    if not ledger.is_sorted:
+        raise ValueError("ledger is not in date order; call sort() first")
+    ledger.order_accounts()
+    if index is None:
+        index = BalanceIndex()
+    index.update(ledger)
+    problems = list(unbalanced(ledger))
+    problems.extend(failed_assertions(ledger, index))
+    problems.sort(key=lambda problem: problem.day)
+    return problems
+
+
+def _location(ledger: Ledger, txn: int) -> tuple[str | None, int | None]:
+    columns = ledger.transactions.columns
+    return ledger.files.name(columns["file"][txn]) or None, columns["line"][txn] or None
+
+
+def unbalanced(ledger: Ledger) -> Iterator[Problem]:
+    """Problems of the transactions whose weights do not add up to zero."""
+    annotations = ledger.annotations.columns
+    annotated = {row: position for position, row in enumerate(annotations["posting"])}
+    scales = ledger.scales
+    transactions = ledger.transactions.columns
+    columns = ledger.postings.columns
+    current = -1
+    residual: dict[int, int | Fraction] = {}
+    # A sentinel row at the end flushes the last transaction.
+    rows = chain(zip(columns["txn"], columns["commodity"], columns["amount"]), [(-1, 0, 0)])
+    for row, (txn, commodity, amount) in enumerate(rows):
+        if txn != current:
+            for owed, value in residual.items():
+                # Values are in units of the last displayed digit.
+                if value and abs(value) * 2 >= 1:
+                    path, line = _location(ledger, current)
+                    off = ledger.money(owed, round(value))
+                    zero = ledger.money(owed, 0)
+                    yield Problem("unbalanced", transactions["date"][current], "", zero, off, path, line)
+            current = txn
+            residual = {}
+        position = annotated.get(row)
+        if position is None:
+            residual[commodity] = residual.get(commodity, 0) + amount
+            continue
+        prefix = "cost" if annotations["cost_commodity"][position] >= 0 else "price"
+        owed = annotations[f"{prefix}_commodity"][position]
+        scale = annotations[f"{prefix}_scale"][position]
+        weight = Fraction(annotations[prefix][position] * 10 ** scales[owed], 10**scale)
+        residual[owed] = residual.get(owed, 0) + (-weight if amount < 0 else weight)
+
+
+def failed_assertions(ledger: Ledger, index: BalanceIndex) -> Iterator[Problem]:
+    """Problems of the posting assertions and balance directives that fail.
+
+    *index* must be up to date with *ledger*.
+    """
+    accounts = ledger.accounts
+    balances = ledger.balances.columns
+    directives = [balances[name] for name in ("date", "account", "commodity", "amount", "file", "line")]
+    for day, account, commodity, expected, file, line in zip(*directives):
+        actual = index.balances(accounts.subtree(account), day - 1).get(commodity, 0)
+        if actual != expected:
+            yield Problem(
+                "balance",
+                day,
+                accounts.name(account),
+                ledger.money(commodity, expected),
+                ledger.money(commodity, actual),
+                ledger.files.name(file) or None,
+                line or None,
+            )
+    columns = ledger.postings.columns
+    assertions = ledger.assertions.columns
+    by_day: dict[int, list[tuple[int, int, int]]] = {}
+    for row, commodity, expected in zip(assertions["posting"], assertions["commodity"], assertions["amount"]):
+        by_day.setdefault(columns["date"][row], []).append((row, commodity, expected))
+    for day in sorted(by_day):
+        checks = sorted(by_day[day])
+        running = {}
+        for row, commodity, _ in checks:
+            key = (columns["account"][row], commodity)
+            if key not in running:
+                running[key] = index.balance(key[0], commodity, day - 1)
+        start, stop = ledger.rows_between(day, day + 1)
+        pending = iter(checks)
+        check = next(pending, None)
+        for row in range(start, stop):
+            key = (columns["account"][row], columns["commodity"][row])
+            if key in running:
+                running[key] += columns["amount"][row]
+            while check is not None and check[0] == row:
+                _, commodity, expected = check
+                actual = running[(key[0], commodity)]
+                if actual != expected:
+                    path, line = _location(ledger, columns["txn"][row])
+                    yield Problem(
+                        "assertion",
+                        day,
+                        accounts.name(key[0]),
+                        ledger.money(commodity, expected),
+                        ledger.money(commodity, actual),
+                        path,
+                        line,
+                    )
+                check = next(pending, None)
+            if check is None:
+                break